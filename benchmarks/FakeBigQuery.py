@@ -0,0 +1,240 @@
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+## pip module imports
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+from google.cloud.bigquery_storage_v1 import types
+from google.cloud.bigquery_storage_v1 import writer
+from google.cloud.exceptions import NotFound
+import google.api_core
+
+## Local module imports
+from interfaces.BigQueryInterface import BigQueryClients
+from schemas import BigQueryOgdLogRecord_pb2
+
+## @class FakeBigQueryState
+#  Everything the in-process stand-ins for BigQuery know: the tables and how many rows each holds, the write streams,
+#  and running totals of what was appended. The clients and append rows streams installed by Install all share one state.
+class FakeBigQueryState:
+
+    def __init__(self, latencySeconds:float = 0, decodeRows:bool = True):
+        self.latencySeconds : float = latencySeconds
+        self.decodeRows     : bool = decodeRows
+
+        self.tables  : Dict[str, Any] = {}             # table id -> table metadata
+        self.rows    : Dict[str, int] = {}             # table id, or table id with a $YYYYMMDD partition decorator -> committed rows
+        self.streams : Dict[str, "_FakeWriteStream"] = {}
+        self.jobs    : Dict[str, "FakeLoadJob"] = {}
+
+        self.numRequests      : int = 0
+        self.numRowsAppended  : int = 0
+        self.numBytesAppended : int = 0
+        self.numQueries       : int = 0
+        self.lock : threading.Lock = threading.Lock()
+
+## @class FakeBigQueryClient
+#  Stands in for bigquery.Client, with just the table, COUNT(*) query and Parquet load job calls that BigQueryInterface makes
+class FakeBigQueryClient:
+
+    def __init__(self, state:FakeBigQueryState):
+        self._state = state
+
+    def list_tables(self, datasetId:str) -> List[SimpleNamespace]:
+        project, dataset = datasetId.split('.')
+        return [SimpleNamespace(project=project, dataset_id=dataset, table_id=tableId.split('.')[-1])
+                for tableId in list(self._state.tables) if tableId.startswith(datasetId + '.')]
+
+    def get_table(self, fqTableId:str) -> SimpleNamespace:
+        table = self._state.tables.get(fqTableId)
+        if table is None:
+            raise NotFound(f"Not found: Table {fqTableId}")
+        return SimpleNamespace(num_rows=self._state.rows.get(fqTableId, 0), streaming_buffer=None, time_partitioning=table.time_partitioning)
+
+    def create_table(self, table:Any) -> None:
+        fqTableId = f"{table.project}.{table.dataset_id}.{table.table_id}"
+        with self._state.lock:
+            if fqTableId in self._state.tables:
+                raise google.api_core.exceptions.Conflict(f"Already Exists: Table {fqTableId}")
+            self._state.tables[fqTableId] = SimpleNamespace(time_partitioning=table.time_partitioning)
+
+    def delete_table(self, fqTableId:str) -> None:
+        with self._state.lock:
+            self._state.tables.pop(fqTableId, None)
+
+    def query(self, query:str) -> List[Dict[str, int]]:
+        # Only the COUNT(*) queries of BigQueryInterface.GetTableCount, over a whole table or one day's partition
+        match = re.match(r"SELECT COUNT\(\*\) mycount FROM `([^`]+)`(?: WHERE DATE\(\w+\) = '(\d{4})-(\d{2})-(\d{2})')?$", query)
+        if match is None:
+            raise Exception(f"The fake BigQuery client can't run the query: {query}")
+
+        self._state.numQueries += 1
+        fqTableId = match.group(1) if match.group(2) is None else f"{match.group(1)}${match.group(2)}{match.group(3)}{match.group(4)}"
+        return [{"mycount": self._state.rows.get(fqTableId, 0)}]
+
+    def get_job(self, jobId:str) -> "FakeLoadJob":
+        job = self._state.jobs.get(jobId)
+        if job is None:
+            raise NotFound(f"Not found: Job {jobId}")
+        return job
+
+    def load_table_from_file(self, file:Any, destination:str, job_id:str, job_config:Any) -> "FakeLoadJob":
+        # The whole file is read as the real client would upload it, and each column decoded unless decodeRows is off
+        data = file.read()
+        parquetFile = pyarrow.parquet.ParquetFile(pyarrow.BufferReader(data))
+        if self._state.decodeRows:
+            parquetFile.read()
+        numRows = parquetFile.metadata.num_rows
+
+        time.sleep(self._state.latencySeconds)
+        with self._state.lock:
+            if job_id in self._state.jobs:
+                raise google.api_core.exceptions.Conflict(f"Already Exists: Job {job_id}")
+            self._addRows(destination, numRows)
+            self._state.numRequests += 1
+            self._state.numRowsAppended += numRows
+            self._state.numBytesAppended += len(data)
+            job = FakeLoadJob(job_id, numRows)
+            self._state.jobs[job_id] = job
+        return job
+
+    def _addRows(self, fqTableId:str, numRows:int) -> None:
+        # Rows go to the table, and also to the partition if they were loaded through a partition decorator
+        self._state.rows[fqTableId] = self._state.rows.get(fqTableId, 0) + numRows
+        if '$' in fqTableId:
+            baseTableId = fqTableId.split('$')[0]
+            self._state.rows[baseTableId] = self._state.rows.get(baseTableId, 0) + numRows
+
+## @class FakeLoadJob
+#  Stands in for a bigquery.LoadJob, which the fake client finishes before returning it
+class FakeLoadJob:
+
+    def __init__(self, jobId:str, numRows:int):
+        self.job_id       : str = jobId
+        self.output_rows  : int = numRows
+        self.error_result : Optional[Dict[str, str]] = None
+
+    def result(self) -> "FakeLoadJob":
+        return self
+
+## @class FakeBigQueryWriteClient
+#  Stands in for BigQueryWriteClient, keeping PENDING write streams in memory until they're finalized and committed
+class FakeBigQueryWriteClient:
+
+    def __init__(self, state:FakeBigQueryState):
+        self._state = state
+
+    @staticmethod
+    def table_path(project:str, dataset:str, table:str) -> str:
+        return f"projects/{project}/datasets/{dataset}/tables/{table}"
+
+    def create_write_stream(self, parent:str, write_stream:types.WriteStream) -> types.WriteStream:
+        with self._state.lock:
+            name = f"{parent}/streams/{len(self._state.streams) + 1}"
+            self._state.streams[name] = _FakeWriteStream(parent)
+        return types.WriteStream(name=name, type_=write_stream.type_)
+
+    def get_write_stream(self, name:str) -> types.WriteStream:
+        stream = self._state.streams.get(name)
+        if stream is None:
+            raise google.api_core.exceptions.NotFound(f"Not found: Stream {name}")
+        if stream.commitTime is not None:
+            return types.WriteStream(name=name, commit_time=stream.commitTime)
+        return types.WriteStream(name=name)
+
+    def finalize_write_stream(self, name:str) -> types.FinalizeWriteStreamResponse:
+        stream = self._state.streams[name]
+        stream.finalized = True
+        return types.FinalizeWriteStreamResponse(row_count=stream.numRows)
+
+    def batch_commit_write_streams(self, request:types.BatchCommitWriteStreamsRequest) -> types.BatchCommitWriteStreamsResponse:
+        commitTime = datetime.now(timezone.utc)
+        with self._state.lock:
+            for name in request.write_streams:
+                stream = self._state.streams[name]
+                if not stream.finalized:
+                    raise google.api_core.exceptions.FailedPrecondition(f"Stream {name} is not finalized")
+                if stream.commitTime is None:
+                    stream.commitTime = commitTime
+                    # Rows go to the table, and also to the partition if the stream was written through a partition decorator
+                    _, project, _, dataset, _, table = stream.parent.split('/')
+                    self._state.rows[f"{project}.{dataset}.{table}"] = self._state.rows.get(f"{project}.{dataset}.{table}", 0) + stream.numRows
+                    if '$' in table:
+                        baseTableId = f"{project}.{dataset}.{table.split('$')[0]}"
+                        self._state.rows[baseTableId] = self._state.rows.get(baseTableId, 0) + stream.numRows
+        return types.BatchCommitWriteStreamsResponse(commit_time=commitTime, stream_errors=[])
+
+## @class FakeAppendRowsStream
+#  Stands in for writer.AppendRowsStream. Requests are handled in order on a thread of the stream's own, each answered latencySeconds
+#  after it was sent, so several requests can be in flight at once as with the real stream. Each row is decoded as a LogRecord,
+#  unless decodeRows is off, and offsets are checked the way BigQuery checks them.
+class FakeAppendRowsStream:
+
+    def __init__(self, client:FakeBigQueryWriteClient, initial_request_template:types.AppendRowsRequest, metadata:Any = ()):
+        self._state    : FakeBigQueryState = client._state
+        self._stream   : "_FakeWriteStream" = self._state.streams[initial_request_template.write_stream]
+        self._executor : ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="FakeAppendRows")
+        self._closed   : bool = False
+
+    def send(self, request:types.AppendRowsRequest) -> Future:
+        if self._closed:
+            raise Exception("This manager has been closed and can not be used.")
+        return self._executor.submit(self._append, request, time.monotonic() + self._state.latencySeconds)
+
+    def close(self, reason:Optional[Exception] = None) -> None:
+        self._closed = True
+        self._executor.shutdown(wait=True)
+
+    def _append(self, request:types.AppendRowsRequest, respondAt:float) -> types.AppendRowsResponse:
+        serializedRows = list(request.proto_rows.rows.serialized_rows)
+        if self._state.decodeRows:
+            for serializedRow in serializedRows:
+                BigQueryOgdLogRecord_pb2.LogRecord.FromString(serializedRow)
+
+        delay = respondAt - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        offset = request.offset
+        if self._stream.finalized:
+            raise google.api_core.exceptions.FailedPrecondition("Stream is finalized")
+        if offset < self._stream.numRows:
+            raise google.api_core.exceptions.AlreadyExists(f"The offset {offset} is within the stream")
+        if offset > self._stream.numRows:
+            raise google.api_core.exceptions.OutOfRange(f"The offset {offset} is beyond the end of the stream")
+
+        self._stream.numRows += len(serializedRows)
+        with self._state.lock:
+            self._state.numRequests += 1
+            self._state.numRowsAppended += len(serializedRows)
+            self._state.numBytesAppended += sum(len(serializedRow) for serializedRow in serializedRows)
+
+        return types.AppendRowsResponse(append_result=types.AppendRowsResponse.AppendResult(offset=offset))
+
+## @class _FakeWriteStream
+#  Dumb struct for a PENDING write stream held by the fake write client
+class _FakeWriteStream:
+    def __init__(self, parent:str):
+        self.parent     : str = parent
+        self.numRows    : int = 0
+        self.finalized  : bool = False
+        self.commitTime : Optional[datetime] = None
+
+def Install(config:Dict[str, Any], state:FakeBigQueryState) -> None:
+    """Route every BigQuery call made with the given BIGQUERY_CONFIG to in-process stand-ins sharing the given state,
+    for the rest of the process.
+
+    :param config: The BIGQUERY_CONFIG that interfaces will be created with
+    :type config: Dict[str, Any]
+    :param state: The state of the stand-in BigQuery
+    :type state: FakeBigQueryState
+    """
+    BigQueryClients.Register(config, FakeBigQueryClient(state), FakeBigQueryWriteClient(state))
+    writer.AppendRowsStream = FakeAppendRowsStream
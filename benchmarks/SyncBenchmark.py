@@ -0,0 +1,267 @@
+## Measures the throughput of syncing one day of log entries, from a generated SQLite log table to an in-process stand-in for BigQuery.
+#  Each day size is synced in a fresh process, so peak RSS is measured for that size alone.
+#  Run from the repository root, with a config/config.py present:
+#      python -m benchmarks.SyncBenchmark --rows 10000 100000 1000000 --json results.json
+#  and to fail if any size is more than 20% slower than an earlier run:
+#      python -m benchmarks.SyncBenchmark --rows 10000 100000 1000000 --baseline results.json --tolerance 0.2
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser, Namespace, SUPPRESS
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+## Local module imports
+import interfaces.MySQLInterface
+from benchmarks import FakeBigQuery
+from benchmarks.SyntheticLogSource import SQLiteLogSource, SyntheticLogGenerator
+from config.config import settings as script_settings
+from services.OpenGameDataLogSyncer import OpenGameDataLogSyncer
+from services.SerializerProcessPool import SerializerProcessPool
+from utils import Logger
+
+## @class StageCPUSampler
+#  Adds up the CPU time of each stage of the sync, by the names of the threads running it, from the per-thread counters in /proc.
+#  Threads are sampled every interval, so the last moments of a thread that exits between samples are missed.
+#  On a system without /proc, every stage reports zero and only the process's total CPU time is available.
+class StageCPUSampler:
+
+    # Thread name prefixes, and the stage each one's CPU time is counted towards
+    STAGES = [("LogEntryChunkReader", "read"), ("LogSyncReader", "read"), ("LogSyncStagedReader", "read"), ("LogSyncSerializer", "serialize"),
+              ("FakeAppendRows", "bigquery_fake"), ("MainThread", "send")]
+
+    def __init__(self, interval:float = 0.05):
+        self._interval   : float = interval
+        self._ticks      : Dict[int, Any] = {} # native thread id -> (stage, cpu ticks when last sampled)
+        self._startTicks : Dict[int, int] = {} # native thread id -> cpu ticks at Start, for threads that were already running
+        self._stopEvent  : threading.Event = threading.Event()
+        self._thread     : Optional[threading.Thread] = None
+        self._ticksPerSecond : int = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def Start(self) -> None:
+        self._sample()
+        self._startTicks = {nativeId : ticks for nativeId, (_, ticks) in self._ticks.items()}
+        self._thread = threading.Thread(target=self._run, name="StageCPUSampler", daemon=True)
+        self._thread.start()
+
+    def Stop(self) -> Dict[str, float]:
+        """Stop sampling, and get the CPU seconds used by each stage since Start
+
+        :return: The CPU seconds of each stage
+        :rtype: Dict[str, float]
+        """
+        self._stopEvent.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._sample()
+
+        cpuSeconds : Dict[str, float] = {stage : 0.0 for _, stage in StageCPUSampler.STAGES}
+        cpuSeconds["other"] = 0.0
+        for nativeId, (stage, ticks) in self._ticks.items():
+            cpuSeconds[stage] += (ticks - self._startTicks.get(nativeId, 0)) / self._ticksPerSecond
+        return cpuSeconds
+
+    def _run(self) -> None:
+        while not self._stopEvent.wait(self._interval):
+            self._sample()
+
+    def _sample(self) -> None:
+        for thread in threading.enumerate():
+            if thread.native_id is None or thread is self._thread:
+                continue
+            try:
+                with open(f"/proc/self/task/{thread.native_id}/stat") as statFile:
+                    # The thread's name is in parentheses and may contain spaces, so count fields from after it. utime and stime are the 12th and 13th.
+                    fields = statFile.read().rsplit(')', 1)[1].split()
+            except OSError:
+                continue
+            self._ticks[thread.native_id] = (StageCPUSampler._stageOf(thread.name), int(fields[11]) + int(fields[12]))
+
+    @staticmethod
+    def _stageOf(threadName:str) -> str:
+        for prefix, stage in StageCPUSampler.STAGES:
+            if threadName.startswith(prefix):
+                return stage
+        return "other"
+
+def GetBenchmarkConfig(args:Namespace, sqlitePath:str) -> Dict[str, Any]:
+    """Get a config that syncs the generated log table to the stand-in BigQuery, with the sync options given on the command line
+    and the rest of SYNC_CONFIG taken from config.py.
+    """
+    syncConfig = {**script_settings.get("SYNC_CONFIG", {}), "CHECKPOINT_JOURNAL_PATH": ""}
+    for key, value in [("WRITE_STREAMS_PER_DAY", args.write_streams), ("SERIALIZER_WORKERS", args.serializers), ("SERIALIZER_PROCESSES", args.serializer_processes), ("MAX_IN_FLIGHT_REQUESTS", args.in_flight),
+                       ("FETCH_BATCH_SIZE", args.fetch_batch_size), ("READ_CHUNK_ID_SPAN", args.chunk_span), ("READER_CONNECTIONS", args.reader_connections),
+                       ("SINK", args.sink), ("MAX_MEMORY", args.max_memory)]:
+        if value is not None:
+            syncConfig[key] = value
+    if args.autotune:
+        # Each day size starts from the config, rather than from what an earlier size tuned
+        syncConfig["AUTOTUNE"] = True
+        syncConfig["AUTOTUNE_STATE_DIR"] = ""
+    if args.stage_locally:
+        syncConfig["STAGE_LOCALLY"] = True
+        syncConfig["STAGING_DIR"] = args.data_dir
+    if args.journal:
+        syncConfig["CHECKPOINT_JOURNAL_PATH"] = os.path.join(args.data_dir, "benchmark_journal.sqlite")
+
+    return {**script_settings,
+            "MYSQL_CONFIG": {"DB_NAME": "benchmark", "DB_TABLE": "logs", "SOURCE_TYPE": "OPEN_GAME_DATA", "SQLITE_PATH": sqlitePath},
+            "BIGQUERY_CONFIG": {"PROJECT_ID": "benchmark", "DATASET_ID": "benchmark", "TABLE_BASENAME": "logs", "CREDENTIALS_FILEPATH": "",
+                                "PARTITIONED_TABLE": args.partitioned},
+            "SYNC_CONFIG": syncConfig}
+
+def GetSQLitePath(args:Namespace, numRows:int) -> str:
+    return os.path.join(args.data_dir, f"logs_{numRows}_{args.date}_{args.seed}.sqlite")
+
+def RunDay(args:Namespace, numRows:int) -> Dict[str, Any]:
+    """Sync one generated day of numRows log entries, and measure it. This runs in the child process for that day size.
+    """
+    sqlitePath = GetSQLitePath(args, numRows)
+    config = GetBenchmarkConfig(args, sqlitePath)
+    dateToSync = date.fromisoformat(args.date)
+
+    state = FakeBigQuery.FakeBigQueryState(latencySeconds=args.latency_ms / 1000, decodeRows=not args.no_decode)
+    FakeBigQuery.Install(config["BIGQUERY_CONFIG"], state)
+    # The chunked reader opens its own connections through MySQLInterface, so point it at the SQLite table too
+    interfaces.MySQLInterface.MySQLInterface = SQLiteLogSource
+
+    source = SQLiteLogSource(config)
+    source.ResetSynced()
+    if args.journal and os.path.exists(config["SYNC_CONFIG"]["CHECKPOINT_JOURNAL_PATH"]):
+        os.remove(config["SYNC_CONFIG"]["CHECKPOINT_JOURNAL_PATH"])
+
+    syncer = OpenGameDataLogSyncer(config)
+    sampler = StageCPUSampler()
+    # Serializer processes are forked before the sync starts, as SyncAll does
+    SerializerProcessPool.ForConfig(config)
+
+    sampler.Start()
+    startTimes = os.times()
+    start = time.perf_counter()
+    syncer.SyncDate(dateToSync, source)
+    seconds = time.perf_counter() - start
+    # Serializer processes' CPU time is only counted in the children's times once they've exited
+    SerializerProcessPool.CloseAll()
+    endTimes = os.times()
+    stageCPUSeconds = sampler.Stop()
+    source.Close()
+
+    if state.numRowsAppended != numRows:
+        raise Exception(f"Expected {numRows} rows to be appended, but {state.numRowsAppended} were")
+
+    return {
+        "rows": numRows,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(numRows / seconds, 1),
+        "bytes": state.numBytesAppended,
+        "bytes_per_sec": round(state.numBytesAppended / seconds, 1),
+        "requests": state.numRequests,
+        "cpu_seconds": round((endTimes.user - startTimes.user) + (endTimes.system - startTimes.system)
+                             + (endTimes.children_user - startTimes.children_user) + (endTimes.children_system - startTimes.children_system), 3),
+        "stage_cpu_seconds": {stage : round(cpuSeconds, 3) for stage, cpuSeconds in stageCPUSeconds.items()},
+        # ru_maxrss is in kilobytes on Linux, and bytes on macOS
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    }
+
+def RunAll(args:Namespace, passthroughArgs:List[str]) -> List[Dict[str, Any]]:
+    results : List[Dict[str, Any]] = []
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    for numRows in args.rows:
+        # Generating the table isn't part of the measurement, and a table is reused by later runs with the same size, date and seed
+        sqlitePath = GetSQLitePath(args, numRows)
+        if not os.path.exists(sqlitePath):
+            SQLiteLogSource.Populate(sqlitePath, "logs", date.fromisoformat(args.date), numRows, SyntheticLogGenerator(args.seed))
+
+        with tempfile.NamedTemporaryFile(mode="r", suffix=".json") as resultFile:
+            subprocess.run([sys.executable, "-m", "benchmarks.SyncBenchmark", "--child", resultFile.name, "--rows", str(numRows)] + passthroughArgs, check=True)
+            result = json.load(resultFile)
+
+        results.append(result)
+        PrintResult(result)
+
+    return results
+
+def PrintResult(result:Dict[str, Any]) -> None:
+    stages = ", ".join(f"{stage} {cpuSeconds:.2f}s" for stage, cpuSeconds in result["stage_cpu_seconds"].items())
+    print(f"{result['rows']:>10} rows in {result['seconds']:>8.2f}s: {result['rows_per_sec']:>10.0f} rows/s, {result['bytes_per_sec'] / 1000000:>7.2f} MB/s, "
+          f"{result['requests']} requests, {result['cpu_seconds']:.2f}s CPU ({stages}), peak RSS {result['peak_rss_mb']:.1f} MB")
+
+def CompareToBaseline(results:List[Dict[str, Any]], baselinePath:str, tolerance:float) -> bool:
+    """Check each day size's rows/sec against an earlier run's, returning False if any is slower by more than the tolerance
+    """
+    with open(baselinePath) as baselineFile:
+        baseline = {result["rows"] : result for result in json.load(baselineFile)}
+
+    passed = True
+    for result in results:
+        baselineResult = baseline.get(result["rows"])
+        if baselineResult is None:
+            continue
+        ratio = result["rows_per_sec"] / baselineResult["rows_per_sec"]
+        if ratio < 1 - tolerance:
+            print(f"REGRESSION: {result['rows']} rows at {result['rows_per_sec']:.0f} rows/s, {(1 - ratio) * 100:.0f}% slower than the baseline's {baselineResult['rows_per_sec']:.0f} rows/s")
+            passed = False
+    return passed
+
+parser = ArgumentParser(description="Benchmark syncing a generated day of log entries to an in-process stand-in for BigQuery.")
+parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000], help="The sizes of day to sync, in log entries.")
+parser.add_argument("--date", type=str, default="2024-01-15", help="The date of the generated log entries.")
+parser.add_argument("--seed", type=int, default=0, help="The seed for generating log entries.")
+parser.add_argument("--data-dir", dest="data_dir", type=str, default="./benchmark_data", help="Where to keep the generated SQLite log tables.")
+parser.add_argument("--write-streams", dest="write_streams", type=int, help="WRITE_STREAMS_PER_DAY, defaults to config.py's value.")
+parser.add_argument("--serializers", type=int, help="SERIALIZER_WORKERS, defaults to config.py's value.")
+parser.add_argument("--serializer-processes", dest="serializer_processes", type=int, help="SERIALIZER_PROCESSES, defaults to config.py's value.")
+parser.add_argument("--in-flight", dest="in_flight", type=int, help="MAX_IN_FLIGHT_REQUESTS, defaults to config.py's value.")
+parser.add_argument("--fetch-batch-size", dest="fetch_batch_size", type=int, help="FETCH_BATCH_SIZE, defaults to config.py's value.")
+parser.add_argument("--chunk-span", dest="chunk_span", type=int, help="READ_CHUNK_ID_SPAN, defaults to config.py's value.")
+parser.add_argument("--reader-connections", dest="reader_connections", type=int, help="READER_CONNECTIONS, defaults to config.py's value.")
+parser.add_argument("--sink", type=str, choices=["WRITE_API", "LOAD_JOB"], help="SINK, defaults to config.py's value.")
+parser.add_argument("--max-memory", dest="max_memory", type=str, help="MAX_MEMORY, e.g. 64M, defaults to config.py's value.")
+parser.add_argument("--autotune", action="store_true", help="Tune the request size, send window and fetch batch size as the day syncs, as with AUTOTUNE.")
+parser.add_argument("--stage-locally", dest="stage_locally", action="store_true", help="Stage each day in a local file before uploading it, as with STAGE_LOCALLY.")
+parser.add_argument("--latency-ms", dest="latency_ms", type=float, default=0, help="How long the stand-in BigQuery takes to answer each append rows request, or load job.")
+parser.add_argument("--no-decode", dest="no_decode", action="store_true", help="Don't decode each appended row in the stand-in BigQuery.")
+parser.add_argument("--partitioned", action="store_true", help="Sync into a partitioned table, as with PARTITIONED_TABLE.")
+parser.add_argument("--journal", action="store_true", help="Record the day's progress in a checkpoint journal, as with CHECKPOINT_JOURNAL_PATH.")
+parser.add_argument("--json", type=str, help="Write the results to this JSON file.")
+parser.add_argument("--baseline", type=str, help="Compare rows/sec with the results in this JSON file from an earlier run, and exit with 1 on a regression.")
+parser.add_argument("--tolerance", type=float, default=0.1, help="How much slower than the baseline a size may be before it counts as a regression.")
+parser.add_argument("--child", type=str, help=SUPPRESS)
+
+if __name__ == "__main__":
+    args : Namespace = parser.parse_args()
+
+    if args.child:
+        # Measure a single size, and hand the result back to the parent through the given file
+        result = RunDay(args, args.rows[0])
+        with open(args.child, "w") as resultFile:
+            json.dump(result, resultFile)
+        sys.exit(0)
+
+    # Each child syncs with the same options, apart from the size of day and what to do with the results
+    passthroughArgs : List[str] = ["--date", args.date, "--seed", str(args.seed), "--data-dir", args.data_dir, "--latency-ms", str(args.latency_ms)]
+    for option, value in [("--write-streams", args.write_streams), ("--serializers", args.serializers), ("--in-flight", args.in_flight),
+                          ("--fetch-batch-size", args.fetch_batch_size), ("--chunk-span", args.chunk_span), ("--reader-connections", args.reader_connections),
+                          ("--sink", args.sink)]:
+        if value is not None:
+            passthroughArgs += [option, str(value)]
+    for option, enabled in [("--no-decode", args.no_decode), ("--partitioned", args.partitioned), ("--journal", args.journal)]:
+        if enabled:
+            passthroughArgs.append(option)
+
+    Logger.Log(f"Benchmarking days of {', '.join(str(numRows) for numRows in args.rows)} log entries", logging.INFO)
+    results = RunAll(args, passthroughArgs)
+
+    if args.json:
+        with open(args.json, "w") as jsonFile:
+            json.dump(results, jsonFile, indent=2)
+
+    if args.baseline and not CompareToBaseline(results, args.baseline, args.tolerance):
+        sys.exit(1)
@@ -0,0 +1,218 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+## Local module imports
+from interfaces.BigQueryInterface import SourceDataRowFormatType
+from interfaces.IdRangeSet import IdRangeSet
+from interfaces.MySQLInterface import LogEntryStream, MySQLInterface
+from utils import Logger
+
+# sqlite3 hands back TIMESTAMP columns as datetimes, like the MySQL connector does. client_offset is stored as seconds and read as a timedelta.
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("OFFSET", lambda value: timedelta(seconds=int(value)))
+
+## @class SyntheticLogGenerator
+#  Generates OGD log entries with the columns selected by MySQLInterface.GetLogEntryColumns, in the same order.
+#  Sessions, event names and payload sizes are drawn from a seeded random generator, so the same seed always gives the same day of logs.
+#  The JSON columns vary in size the way real games' do: most events carry a small event_data, a few carry a large one, and game_state is often empty.
+class SyntheticLogGenerator:
+
+    EVENT_NAMES = ["session_start", "click_button", "open_menu", "close_menu", "begin_level", "complete_level", "select_item",
+                   "place_item", "hover_object", "dialog_advance", "task_complete", "game_state_snapshot"]
+    USER_AGENTS = ["Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
+                   "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15",
+                   "Mozilla/5.0 (X11; CrOS x86_64 14541.0.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36"]
+
+    def __init__(self, seed:int = 0, eventsPerSession:int = 400):
+        self._random = random.Random(seed)
+        self._eventsPerSession : int = max(1, eventsPerSession)
+
+    def GenerateDay(self, dateToSync:date, numRows:int, firstId:int = 1) -> Iterator[Tuple]:
+        """Generate numRows log entries spread across the given day, with consecutive ids starting at firstId.
+
+        :param dateToSync: The day the log entries' server_time falls on
+        :type dateToSync: date
+        :param numRows: The number of log entries
+        :type numRows: int
+        :param firstId: The id of the first log entry, defaults to 1
+        :type firstId: int, optional
+        :return: The log entries, as tuples in the order of MySQLInterface.GetLogEntryColumns
+        :rtype: Iterator[Tuple]
+        """
+        dayStart = datetime.combine(dateToSync, time.min)
+        secondsPerRow = 86399 / max(1, numRows)
+
+        for i in range(numRows):
+            sessionNumber, eventIndex = divmod(i, self._eventsPerSession)
+            serverTime = dayStart + timedelta(seconds=int(i * secondsPerRow))
+            eventName = self._random.choice(SyntheticLogGenerator.EVENT_NAMES)
+
+            yield (firstId + i,                                                 # id
+                   f"{dateToSync.strftime('%y%m%d')}{sessionNumber:09d}",        # session_id
+                   f"Player{sessionNumber % 5000}" if sessionNumber % 3 else "", # user_id
+                   '{"classroom":"c%d"}' % (sessionNumber % 40) if sessionNumber % 4 == 0 else None, # user_data
+                   serverTime - timedelta(seconds=2),                           # client_time
+                   self._random.randrange(1000),                                # client_time_ms
+                   timedelta(hours=-5 - sessionNumber % 4),                     # client_offset
+                   serverTime,                                                  # server_time
+                   eventName,                                                   # event_name
+                   self._eventData(eventName, eventIndex),                      # event_data
+                   "GAME",                                                      # event_source
+                   self._gameState(eventIndex) if eventName != "session_start" else None, # game_state
+                   20 + sessionNumber % 3,                                      # app_version
+                   "main" if sessionNumber % 10 else None,                      # app_branch
+                   4,                                                           # log_version
+                   eventIndex,                                                  # event_sequence_index
+                   f"10.{sessionNumber % 256}.{(sessionNumber // 256) % 256}.{sessionNumber % 97}", # remote_addr
+                   SyntheticLogGenerator.USER_AGENTS[sessionNumber % len(SyntheticLogGenerator.USER_AGENTS)]) # http_user_agent
+
+    def _eventData(self, eventName:str, eventIndex:int) -> str:
+        eventData : Dict[str, Any] = {"object_id": f"obj_{self._random.randrange(500)}", "position": [self._random.randrange(1920), self._random.randrange(1080)]}
+        if eventName == "game_state_snapshot" or self._random.random() < 0.05:
+            # A few events carry a large payload, e.g. a snapshot of the game's inventory
+            eventData["inventory"] = [{"item": f"item_{n}", "count": self._random.randrange(20)} for n in range(self._random.randrange(20, 60))]
+        return json.dumps(eventData)
+
+    def _gameState(self, eventIndex:int) -> str:
+        return '{"level":%d,"score":%d}' % (eventIndex // 50, eventIndex * 10) if eventIndex % 2 else ""
+
+## @class SQLiteLogSource
+#  A stand-in for MySQLInterface that reads a log table from a local SQLite file, for running the sync without a MySQL server.
+#  The file is named by SQLITE_PATH in the MYSQL_CONFIG, and holds a table named DB_TABLE with the OGD columns plus synced.
+#  Only the queries used to sync a single day are implemented.
+class SQLiteLogSource(MySQLInterface):
+
+    # *** IMPLEMENT ABSTRACT FUNCTIONS ***
+
+    def _open(self, force_reopen:bool = False) -> bool:
+        if force_reopen:
+            self.Close()
+        if not self._is_open:
+            # The log entry stream of a day is read on the sync pipeline's reader thread
+            self._db = sqlite3.connect(self._config["MYSQL_CONFIG"]["SQLITE_PATH"], detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+            self._is_open = True
+        return True
+
+    def _close(self) -> bool:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        self._is_open = False
+        return True
+
+    # *** PUBLIC STATICS ***
+
+    @staticmethod
+    def Populate(path:str, dbTable:str, dateToSync:date, numRows:int, generator:SyntheticLogGenerator, insertBatchSize:int = 10000) -> None:
+        """Create the given SQLite file, holding one day of generated log entries, all of them unsynced.
+
+        :param path: The path of the SQLite file, which is replaced if it already exists
+        :type path: str
+        :param dbTable: The name of the log table
+        :type dbTable: str
+        :param dateToSync: The day of the log entries
+        :type dateToSync: date
+        :param numRows: The number of log entries
+        :type numRows: int
+        :param generator: Generates the log entries
+        :type generator: SyntheticLogGenerator
+        """
+        if os.path.exists(path):
+            os.remove(path)
+
+        columns = MySQLInterface.GetLogEntryColumns(SourceDataRowFormatType.OPEN_GAME_DATA)
+        db = sqlite3.connect(path)
+        try:
+            db.execute(f"""CREATE TABLE `{dbTable}` (
+                id INTEGER PRIMARY KEY, session_id TEXT NOT NULL, user_id TEXT, user_data TEXT, client_time TIMESTAMP, client_time_ms INTEGER,
+                client_offset OFFSET, server_time TIMESTAMP NOT NULL, event_name TEXT NOT NULL, event_data TEXT, event_source TEXT NOT NULL,
+                game_state TEXT, app_version INTEGER, app_branch TEXT, log_version INTEGER, event_sequence_index INTEGER, remote_addr TEXT,
+                http_user_agent TEXT, synced INTEGER NOT NULL DEFAULT 0)""")
+            db.execute(f"CREATE INDEX `{dbTable}_synced_server_time` ON `{dbTable}` (synced, server_time)")
+
+            insertQuery = f"INSERT INTO `{dbTable}` ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+            batch : List[Tuple] = []
+            for row in generator.GenerateDay(dateToSync, numRows):
+                # client_offset is stored as seconds
+                batch.append(row[:6] + (int(row[6].total_seconds()),) + row[7:])
+                if len(batch) >= insertBatchSize:
+                    db.executemany(insertQuery, batch)
+                    batch = []
+            if len(batch) > 0:
+                db.executemany(insertQuery, batch)
+            db.commit()
+        finally:
+            db.close()
+
+        Logger.Log(f"Generated {numRows} log entries for {str(dateToSync)} in {path}", logging.INFO)
+
+    # *** PUBLIC METHODS ***
+
+    def SetSessionVariables(self) -> None:
+        pass
+
+    # Mark every log entry as unsynced again, so the same day can be synced once more
+    def ResetSynced(self) -> None:
+        self._db.execute(f"UPDATE `{self._table}` SET synced = 0")
+        self._db.commit()
+
+    def GetMigrationStatusCountsByDate(self, dateToSync: datetime) -> List[int]:
+        result = self._db.execute(f"SELECT SUM(synced = 0), SUM(synced = 1) FROM `{self._table}` WHERE server_time BETWEEN ? AND ?",
+                                  self._dayBounds(dateToSync)).fetchone()
+        numUnsynced, numSynced = (result[0] or 0, result[1] or 0)
+        return [numUnsynced, numSynced, numUnsynced + numSynced]
+
+    def GetLogEntriesByDate(self, dateToSync: datetime, rowFormatType: SourceDataRowFormatType, fetchBatchSize: int = 1000) -> LogEntryStream:
+        query = f"SELECT {self._selectColumns(rowFormatType)} FROM `{self._table}` WHERE synced = 0 AND server_time BETWEEN ? AND ?"
+        return LogEntryStream(_SQLiteCursor(self._db.execute(query, self._dayBounds(dateToSync))), fetchBatchSize)
+
+    def GetLogEntryIdRangeByDate(self, dateToSync: datetime) -> Optional[Tuple[int, int]]:
+        result = self._db.execute(f"SELECT MIN(id), MAX(id) FROM `{self._table}` WHERE synced = 0 AND server_time BETWEEN ? AND ?",
+                                  self._dayBounds(dateToSync)).fetchone()
+        return None if result[0] is None else (int(result[0]), int(result[1]))
+
+    def GetLogEntriesByIdRange(self, dateToSync: datetime, rowFormatType: SourceDataRowFormatType, startId: int, endId: int, fetchBatchSize: int = 1000) -> LogEntryStream:
+        query = f"SELECT {self._selectColumns(rowFormatType)} FROM `{self._table}` WHERE id BETWEEN ? AND ? AND synced = 0 AND server_time BETWEEN ? AND ? ORDER BY id"
+        return LogEntryStream(_SQLiteCursor(self._db.execute(query, (int(startId), int(endId)) + self._dayBounds(dateToSync))), fetchBatchSize)
+
+    def MarkLogEntriesAsSyncedByIds(self, ids: IdRangeSet, maxIdsPerUpdate: int = 10000) -> int:
+        numMarked = 0
+        for startId, endId in ids.Intervals:
+            numMarked += self._db.execute(f"UPDATE `{self._table}` SET synced = 1 WHERE id BETWEEN ? AND ? AND synced = 0", (startId, endId)).rowcount
+        self._db.commit()
+        return numMarked
+
+    # *** PROPERTIES ***
+
+    @property
+    def _table(self) -> str:
+        return self._config["MYSQL_CONFIG"]["DB_TABLE"]
+
+    # *** PRIVATE METHODS ***
+
+    def _dayBounds(self, dateToSync: date) -> Tuple[datetime, datetime]:
+        return (datetime.combine(dateToSync, time.min), datetime.combine(dateToSync, time.max))
+
+    def _selectColumns(self, rowFormatType: SourceDataRowFormatType) -> str:
+        # Declared types are what sqlite3 picks converters by, so the columns are selected by name rather than as expressions
+        return ", ".join(MySQLInterface.GetLogEntryColumns(rowFormatType))
+
+## @class _SQLiteCursor
+#  Gives a sqlite3 cursor the column_names attribute of a MySQL cursor, which LogEntryStream uses to build its column index
+class _SQLiteCursor:
+
+    def __init__(self, db_cursor:sqlite3.Cursor):
+        self._db_cursor = db_cursor
+        self.column_names : List[str] = [column[0] for column in db_cursor.description]
+
+    def fetchmany(self, size:int) -> List[Tuple]:
+        return self._db_cursor.fetchmany(size)
+
+    def close(self) -> None:
+        self._db_cursor.close()
@@ -0,0 +1 @@
+settings={"DEBUG_LEVEL":"ERROR"}
@@ -0,0 +1,250 @@
+import asyncio
+import functools
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, List, Optional
+
+## pip module imports
+from google.cloud import bigquery
+from google.cloud.bigquery_storage_v1 import types
+from google.cloud.bigquery_storage_v1.services.big_query_write import BigQueryWriteAsyncClient
+import google.api_core
+
+## Local module imports
+from interfaces.BigQueryInterface import AppendRowsSendWindow, BigQueryClients, BigQueryInterface, BigQueryWriteInterface
+from utils import Logger
+
+# Marker placed on a stream's request queue to end its AppendRows call
+_END_OF_REQUESTS = object()
+
+## @class AsyncAppendRowsStream
+#  The asyncio counterpart of writer.AppendRowsStream: a single bidirectional AppendRows call on the gRPC aio channel, for one write stream.
+#  Requests are queued as they're sent, and the write stream name and writer schema of the template are merged into the first one.
+#  A task reads the responses, which arrive in the order the requests were sent, and settles each request's future in turn,
+#  turning an error status in a response into the matching google.api_core exception, as the AppendRowsStream does.
+class AsyncAppendRowsStream:
+
+    def __init__(self, client: BigQueryWriteAsyncClient, initial_request_template: types.AppendRowsRequest):
+        self._client   : BigQueryWriteAsyncClient = client
+        self._template : types.AppendRowsRequest = initial_request_template
+        self._requests : asyncio.Queue = asyncio.Queue()
+        self._pending  : Deque[asyncio.Future] = deque()
+        self._reader   : Optional[asyncio.Task] = None
+        self._error    : Optional[BaseException] = None
+        self._closed   : bool = False
+
+    async def Send(self, request: types.AppendRowsRequest) -> asyncio.Future:
+        """Queue a request on the stream, opening the AppendRows call with the first one.
+
+        :raises Exception: If the stream was closed, or its call has already failed
+        :return: A future holding the request's AppendRowsResponse once it has been acknowledged
+        :rtype: asyncio.Future
+        """
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            raise Exception("This stream has been closed and can not be used.")
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(future)
+        self._requests.put_nowait(request)
+
+        # The request is queued before the call is opened, since opening it waits on the server, which may not answer until it has a request
+        if self._reader is None:
+            responses = await self._client.append_rows(requests=self._iterRequests())
+            self._reader = asyncio.ensure_future(self._readResponses(responses))
+
+        return future
+
+    async def Close(self) -> None:
+        """End the AppendRows call once every queued request has been sent, and wait for the rest of the responses.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._reader is not None:
+            self._requests.put_nowait(_END_OF_REQUESTS)
+            await asyncio.wait([self._reader])
+
+    async def _iterRequests(self) -> AsyncIterator[types.AppendRowsRequest]:
+        request = await self._requests.get()
+        if request is _END_OF_REQUESTS:
+            return
+
+        # The first request carries the stream name and writer schema, as the AppendRowsStream does it
+        initialRequest = types.AppendRowsRequest()
+        types.AppendRowsRequest.copy_from(initialRequest, self._template)
+        types.AppendRowsRequest.pb(initialRequest).MergeFrom(types.AppendRowsRequest.pb(request))
+        yield initialRequest
+
+        while True:
+            request = await self._requests.get()
+            if request is _END_OF_REQUESTS:
+                return
+            yield request
+
+    async def _readResponses(self, responses: Any) -> None:
+        try:
+            async for response in responses:
+                future = self._pending.popleft()
+                if response.error.code:
+                    future.set_exception(google.api_core.exceptions.from_grpc_status(response.error.code, response.error.message, response=response))
+                else:
+                    future.set_result(response)
+        except Exception as err:
+            self._error = err
+        finally:
+            # Requests still waiting will never be answered
+            error = self._error if self._error is not None else Exception("The AppendRows call ended before every request was acknowledged")
+            while len(self._pending) > 0:
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_exception(error)
+
+## @class AsyncAppendRowsSendWindow
+#  An AppendRowsSendWindow for the futures of an AsyncAppendRowsStream. Rather than blocking on the oldest request, Add and Drain
+#  await it, so other days on the event loop carry on while this one waits. Responses are checked the same way as the AppendRowsSendWindow.
+class AsyncAppendRowsSendWindow(AppendRowsSendWindow):
+
+    async def Add(self, requestNumber:int, offset:int, numRows:int, future:Any, streamIndex:int = 0) -> None:
+        while len(self._inFlight) >= self.maxInFlight:
+            Logger.Log(f"Send window full with {len(self._inFlight)} requests in flight, waiting for an acknowledgement", logging.DEBUG)
+            await self._awaitOldest()
+        self._inFlight.append((streamIndex, requestNumber, offset, numRows, future))
+
+    async def Drain(self) -> None:
+        while len(self._inFlight) > 0:
+            await self._awaitOldest()
+
+    async def _awaitOldest(self) -> None:
+        # Once the oldest future is done, the synchronous acknowledgement doesn't block
+        await asyncio.wait([self._inFlight[0][4]])
+        self._acknowledgeOldest()
+
+## @class AsyncBigQueryWriteInterface
+#  The asyncio counterpart of BigQueryWriteInterface, splitting a table's rows across one or more PENDING write streams,
+#  which are created, appended to, finalized and committed through the BigQueryWriteAsyncClient.
+class AsyncBigQueryWriteInterface:
+
+    def __init__(self, config, fq_table_id: str, num_streams: int = 1):
+
+        self._config = config
+
+        self.fq_table_id  = fq_table_id
+        self.write_client : BigQueryWriteAsyncClient = BigQueryClients.GetWriteAsyncClient(self._config)
+
+        self.num_streams         : int = max(1, num_streams)
+        self.write_streams       : List[Optional[types.WriteStream]] = [None] * self.num_streams
+        self.append_rows_streams : List[Optional[AsyncAppendRowsStream]] = [None] * self.num_streams
+        self.numReconnects       : int = 0 # Number of times an append rows stream was recreated after its first request failed
+
+    async def SendAppendRowsRequest(self, numPreviousRequests: int, appendRowsRequest: types.AppendRowsRequest, streamIndex: int = 0) -> asyncio.Future:
+        """Send the given request on the given one of our parallel streams, creating the write stream with the first request.
+
+        The first request on a stream waits for its acknowledgement before returning, since the initial connection fails with some frequency,
+        and is retried on a new write stream if it does. Later requests return as soon as they're queued.
+
+        :return: A future holding the request's AppendRowsResponse once it has been acknowledged
+        :rtype: asyncio.Future
+        """
+        if numPreviousRequests > 0:
+            return await self.append_rows_streams[streamIndex].Send(appendRowsRequest)
+
+        numRetries = 0
+        maximumRetries = 100
+
+        while True:
+            if self.append_rows_streams[streamIndex] is None:
+                await self._initAppendRowsStream(streamIndex)
+            try:
+                future = await self.append_rows_streams[streamIndex].Send(appendRowsRequest)
+                await asyncio.wait([future])
+                # A failed first request raises here, leaving the future's exception retrieved
+                future.result()
+                return future
+            # Unknown is the exception type for a "404 Requested entity was not found" response
+            except google.api_core.exceptions.Unknown as ex:
+                numRetries += 1
+                if numRetries >= maximumRetries:
+                    raise
+                Logger.Log(f"Initial BQ append rows stream connection failed with {type(ex)}, creating new stream, reattempt number {str(numRetries)} of {str(maximumRetries)}", logging.WARN)
+                await self.append_rows_streams[streamIndex].Close()
+                self.append_rows_streams[streamIndex] = None
+                self.numReconnects += 1
+                await asyncio.sleep(5)
+
+    def GetWriteStreamNames(self) -> List[str]:
+        return [writeStream.name for writeStream in self.write_streams if writeStream is not None]
+
+    # Close the append rows streams, finalize the write streams, commit all the write streams in a single batch
+    # Returns the number of rows committed, as counted by BigQuery when the streams were finalized
+    async def CloseFinalizeAndCommit(self) -> int:
+        await self.CloseAppendRowsStreams()
+        writeStreamNames = self.GetWriteStreamNames()
+
+        numRowsFinalized = 0
+        for writeStreamName in writeStreamNames:
+            finalizeResponse = await self.write_client.finalize_write_stream(name=writeStreamName)
+            numRowsFinalized += finalizeResponse.row_count
+
+        batch_commit_write_streams_request = types.BatchCommitWriteStreamsRequest()
+        batch_commit_write_streams_request.parent = self._getParentStringForFqTableId(self.fq_table_id)
+        batch_commit_write_streams_request.write_streams = writeStreamNames
+        commitResponse = await self.write_client.batch_commit_write_streams(batch_commit_write_streams_request)
+
+        if len(commitResponse.stream_errors) > 0:
+            raise Exception(f"Failed to commit write streams for {self.fq_table_id}: {str(commitResponse.stream_errors)}")
+
+        return numRowsFinalized
+
+    # End the append rows streams' AppendRows calls, once every request sent to them has been answered
+    async def CloseAppendRowsStreams(self) -> None:
+        for streamIndex in range(self.num_streams):
+            if self.append_rows_streams[streamIndex] is not None:
+                await self.append_rows_streams[streamIndex].Close()
+                self.append_rows_streams[streamIndex] = None
+
+    async def _initAppendRowsStream(self, streamIndex: int) -> None:
+        # When creating the stream, choose the type. Use the PENDING type to wait until the stream is committed before it is visible.
+        writeStream = types.WriteStream()
+        writeStream.type_ = types.WriteStream.Type.PENDING
+        self.write_streams[streamIndex] = await self.write_client.create_write_stream(parent=self._getParentStringForFqTableId(self.fq_table_id), write_stream=writeStream)
+        Logger.Log(f"New BQ write stream {streamIndex + 1} of {self.num_streams} created with name: " + self.write_streams[streamIndex].name, logging.INFO)
+
+        requestTemplate = BigQueryWriteInterface.GetAppendRowsRequestTemplate(self.write_streams[streamIndex].name)
+        self.append_rows_streams[streamIndex] = AsyncAppendRowsStream(self.write_client, requestTemplate)
+
+    def _getParentStringForFqTableId(self, fqTableId: str) -> str:
+        tablePathChunks = fqTableId.split('.')
+
+        if len(tablePathChunks) != 3:
+            raise Exception("Unexpected format of fully qualified table id. Expected format is project_id.dataset_id.table_id")
+
+        # parent is a string in the format of projects/{project}/datasets/{dataset}/tables/{table}
+        return self.write_client.table_path(tablePathChunks[0], tablePathChunks[1], tablePathChunks[2])
+
+## @class AsyncBigQueryInterface
+#  Awaitable versions of BigQueryInterface's table calls. google-cloud-bigquery has no asyncio client, so each call is made by the
+#  wrapped BigQueryInterface on the event loop's default executor, keeping the loop free while it waits on the API.
+class AsyncBigQueryInterface:
+
+    def __init__(self, config):
+        self.bqInterface : BigQueryInterface = BigQueryInterface(config)
+
+    async def TableExists(self, fqTableId: str) -> bool:
+        return await self._run(self.bqInterface.TableExists, fqTableId)
+
+    async def GetTable(self, fqTableId: str) -> Optional[bigquery.Table]:
+        return await self._run(self.bqInterface.GetTable, fqTableId)
+
+    async def CreateTable(self, fqTableId: str, schema: Any, partitionField: Optional[str] = None, clusteringFields: Optional[List[str]] = None) -> bool:
+        return await self._run(self.bqInterface.CreateTable, fqTableId, schema, partitionField, clusteringFields)
+
+    async def GetTableRowCount(self, fqTableId: str, table: Optional[bigquery.Table] = None) -> int:
+        return await self._run(self.bqInterface.GetTableRowCount, fqTableId, table)
+
+    async def GetTableCount(self, fqTableId: str) -> int:
+        return await self._run(self.bqInterface.GetTableCount, fqTableId)
+
+    async def _run(self, call: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(call, *args))
@@ -0,0 +1,230 @@
+# import libraries
+import asyncio
+import logging
+import sshtunnel
+from datetime import datetime, date, time
+from typing import Any, Dict, List, Optional, Tuple
+
+# aiomysql is an optional dependency, only needed by the asyncio sync engine
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+
+# import locals
+from interfaces.BigQueryInterface import SourceDataRowFormatType
+from interfaces.IdRangeSet import IdRangeSet
+from interfaces.MySQLInterface import ChunkedLogEntryStream, MySQLInterface, SQL, SQLLogin, SSHLogin
+from utils import Logger
+
+## @class AsyncLogEntryStream
+#  The asyncio counterpart of LogEntryStream: streams the rows of an open, unbuffered query in batches of tuples, with async for.
+#  The stream holds one of its interface's pooled connections until it is closed.
+class AsyncLogEntryStream:
+
+    def __init__(self, pool:Any, db_conn:Any, db_cursor:Any, batch_size:int = 1000):
+        self._pool       = pool
+        self._db_conn    = db_conn
+        self._db_cursor  = db_cursor
+        self._exhausted  : bool = False
+        self.batch_size  : int = max(1, batch_size)
+        self.columnIndex : Dict[str, int] = {column[0] : i for i, column in enumerate(db_cursor.description)}
+
+    def __aiter__(self) -> "AsyncLogEntryStream":
+        return self
+
+    async def __anext__(self) -> List[Tuple]:
+        rows = await self._db_cursor.fetchmany(self.batch_size)
+        if not rows:
+            self._exhausted = True
+            raise StopAsyncIteration
+        return list(rows)
+
+    async def Close(self) -> None:
+        if self._db_conn is None:
+            return
+        try:
+            if self._exhausted:
+                await self._db_cursor.close()
+            else:
+                # Closing an unbuffered cursor part way through would read the rest of its rows, so drop the connection instead
+                self._db_conn.close()
+        except Exception as err:
+            Logger.Log(f"Error while closing log entry cursor: {type(err)} {str(err)}", logging.WARNING)
+        finally:
+            self._pool.release(self._db_conn)
+            self._db_conn = None
+
+## @class AsyncMySQLInterface
+#  The asyncio counterpart of MySQLInterface, with the queries needed to sync a day: the unsynced days, a day's migration status counts,
+#  a stream of a day's log entries, and marking log entries as synced by id. The queries are the same as MySQLInterface's.
+#  Queries run on a pool of up to poolSize aiomysql connections, so many days, and many games, can be read at once from a single event loop.
+#  Every connection in the pool has the same long net_read_timeout and net_write_timeout that SetSessionVariables sets.
+#  Interfaces for other log tables can share the pool through ForTable.
+class AsyncMySQLInterface:
+
+    def __init__(self, config:Dict[str,Any], poolSize:int = 4):
+        if aiomysql is None:
+            raise Exception("The asyncio sync engine needs aiomysql, which is not installed. Install it with: pip3 install aiomysql")
+
+        self._config   : Dict[str,Any] = config
+        self._poolSize : int = max(1, poolSize)
+        self._tunnel   : Optional[sshtunnel.SSHTunnelForwarder] = None
+        self._pool     : Optional[Any] = None
+        self._ownsPool : bool = True
+
+    # *** PUBLIC METHODS ***
+
+    async def Open(self) -> bool:
+        """Open the connection pool, through an SSH tunnel if the config has one.
+
+        :return: True if the pool was opened, otherwise False
+        :rtype: bool
+        """
+        if self._pool is not None:
+            return True
+
+        _sql_cfg = self._config["MYSQL_CONFIG"]
+        _ssh_cfg = _sql_cfg.get("SSH_CONFIG")
+        sql_login = SQLLogin(host=_sql_cfg['DB_HOST'], port=int(_sql_cfg['DB_PORT']), db_name=_sql_cfg['DB_NAME'], user=_sql_cfg['DB_USER'], pword=_sql_cfg['DB_PW'])
+        port = sql_login.port
+
+        if _ssh_cfg is not None and _ssh_cfg['SSH_HOST'] != "" and _ssh_cfg['SSH_USER'] != "" and _ssh_cfg['SSH_PW'] != "":
+            ssh_login = SSHLogin(host=_ssh_cfg['SSH_HOST'], port=_ssh_cfg['SSH_PORT'], user=_ssh_cfg['SSH_USER'], pword=_ssh_cfg['SSH_PW'])
+            # sshtunnel blocks while it connects, so the tunnel is started off the event loop
+            self._tunnel = await asyncio.get_running_loop().run_in_executor(None, SQL._startSSHTunnel, sql_login, ssh_login)
+            if self._tunnel is None:
+                Logger.Log(f"Unable to open MySQL connection pool, the SSH tunnel could not be started.", logging.ERROR)
+                return False
+            port = self._tunnel.local_bind_port
+
+        start = datetime.now()
+        try:
+            self._pool = await aiomysql.create_pool(host=sql_login.host, port=port, user=sql_login.user, password=sql_login.pword, db=sql_login.db_name,
+                                                    charset='utf8', minsize=1, maxsize=self._poolSize,
+                                                    # The default net_write_timeout is 60 seconds, which is exceeded if a day's cursor is open
+                                                    # while we're waiting on BigQuery
+                                                    init_command="SET SESSION net_read_timeout = 1000, net_write_timeout = 1000")
+        except Exception as err:
+            Logger.Log(f"Could not open a MySQL connection pool to {sql_login.host}:{port}/{sql_login.db_name}, {sql_login.user}: {type(err)} {str(err)}", logging.ERROR)
+            if self._tunnel is not None:
+                self._tunnel.stop()
+                self._tunnel = None
+            return False
+
+        Logger.Log(f"Database Connection Pool Time: {datetime.now() - start}, up to {self._poolSize} connections", logging.INFO)
+        return True
+
+    async def Close(self) -> None:
+        """Close every connection in the pool, and the SSH tunnel. Does nothing for an interface made by ForTable.
+        """
+        if self._ownsPool and self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            Logger.Log("Closed MySQL connection pool.", logging.DEBUG)
+        self._pool = None
+        if self._tunnel is not None:
+            self._tunnel.stop()
+            self._tunnel = None
+            Logger.Log("Stopped MySQL tunnel connection", logging.DEBUG)
+
+    def ForTable(self, dbTable:str) -> "AsyncMySQLInterface":
+        """Get an interface for another log table in the same database, sharing this interface's open connection pool.
+        The pool stays open until this interface is closed.
+
+        :param dbTable: The name of the log table
+        :type dbTable: str
+        :return: An interface whose queries go to the given table
+        :rtype: AsyncMySQLInterface
+        """
+        if self._pool is None:
+            raise Exception("The MySQL connection pool must be open before it can be shared")
+
+        tableInterface = AsyncMySQLInterface({**self._config, "MYSQL_CONFIG": {**self._config["MYSQL_CONFIG"], "DB_TABLE": dbTable}}, self._poolSize)
+        tableInterface._pool = self._pool
+        tableInterface._ownsPool = False
+        return tableInterface
+
+    # Get every date with log entries we're allowed to sync, along with its number of unsynced entries, oldest date first
+    async def GetUnmigratedDateCounts(self, maxDates:int = -1) -> List[Tuple[date, int]]:
+
+        maximumDatetimeToSync = MySQLInterface.GetMaximumDatetimeToSync(await self._fetchMaxServerTime())
+
+        query = SQL.BuildSELECT(self._config["MYSQL_CONFIG"]["DB_NAME"], self._config["MYSQL_CONFIG"]["DB_TABLE"],
+                                ["DATE(server_time)", "COUNT(*)"],
+                                "synced = 0 AND server_time != '0000-00-00 00:00:00' AND server_time <= '" + maximumDatetimeToSync.isoformat() + "'",
+                                ["DATE(server_time)"], "ASC", "DATE(server_time)", False, 0, maxDates)
+        result = await self._fetchAll(query)
+
+        return [(row[0], int(row[1])) for row in result]
+
+    # Get the number of log entries categorized [unsynced, synced, both synced + unsynced] for the given date
+    async def GetMigrationStatusCountsByDate(self, dateToSync: date) -> List[int]:
+
+        query = SQL.BuildSELECT(self._config["MYSQL_CONFIG"]["DB_NAME"], self._config["MYSQL_CONFIG"]["DB_TABLE"],
+                                ["COUNT(synced)", "synced"], AsyncMySQLInterface._dayFilter(dateToSync), ["synced"], "ASC", "synced")
+        result = await self._fetchAll(query)
+
+        counts = {int(synced) : int(count) for count, synced in result}
+        return [counts.get(0, 0), counts.get(1, 0), sum(counts.values())] # unsynced, synced, either/all
+
+    # Get a stream of all the unsynced log entries for the given date, read from the server in batches of fetchBatchSize rows
+    async def GetLogEntriesByDate(self, dateToSync: date, rowFormatType: SourceDataRowFormatType, fetchBatchSize: int = 1000) -> AsyncLogEntryStream:
+
+        query = SQL.BuildSELECT(self._config["MYSQL_CONFIG"]["DB_NAME"], self._config["MYSQL_CONFIG"]["DB_TABLE"],
+                                MySQLInterface.GetLogEntryColumns(rowFormatType), "`synced` = 0 AND " + AsyncMySQLInterface._dayFilter(dateToSync))
+
+        db_conn = await self._pool.acquire()
+        try:
+            # An unbuffered cursor streams rows from the server as we fetch them, rather than holding the whole day in memory
+            db_cursor = await db_conn.cursor(aiomysql.SSCursor)
+            Logger.Log(f"Running query: {query}", logging.DEBUG)
+            await db_cursor.execute(query)
+        except BaseException:
+            db_conn.close()
+            self._pool.release(db_conn)
+            raise
+
+        return AsyncLogEntryStream(self._pool, db_conn, db_cursor, fetchBatchSize)
+
+    # Mark exactly the log entries with the given ids as synced, in chunks of at most maxIdsPerUpdate ids, each committed on its own.
+    # Returns the number of log entries marked.
+    async def MarkLogEntriesAsSyncedByIds(self, ids: IdRangeSet, maxIdsPerUpdate: int = 10000) -> int:
+
+        updateQuery = "UPDATE `" + self._config["MYSQL_CONFIG"]["DB_NAME"] + "`.`" + self._config["MYSQL_CONFIG"]["DB_TABLE"] + "`"\
+        + " SET `synced` = %s WHERE `id` BETWEEN %s AND %s AND `synced` = %s"
+
+        numMarked = 0
+
+        async with self._pool.acquire() as db_conn:
+            async with db_conn.cursor() as db_cursor:
+                for startId, endId in ids.Intervals:
+                    for chunkStartId, chunkEndId in ChunkedLogEntryStream.SplitIdRange(startId, endId, maxIdsPerUpdate):
+                        await db_cursor.execute(updateQuery, (1, chunkStartId, chunkEndId, 0))
+                        await db_conn.commit()
+                        numMarked += db_cursor.rowcount
+
+        return numMarked
+
+    # *** PRIVATE STATICS ***
+
+    @staticmethod
+    def _dayFilter(dateToSync: date) -> str:
+        return "`server_time` BETWEEN '" + datetime.combine(dateToSync, time.min).isoformat() + "' AND '" + datetime.combine(dateToSync, time.max).isoformat() + "'"
+
+    # *** PRIVATE METHODS ***
+
+    async def _fetchAll(self, query:str) -> List[Tuple]:
+        Logger.Log(f"Running query: {query}", logging.DEBUG)
+        start = datetime.now()
+        async with self._pool.acquire() as db_conn:
+            async with db_conn.cursor() as db_cursor:
+                await db_cursor.execute(query)
+                result = await db_cursor.fetchall()
+        Logger.Log(f"Query completed, total query time: {datetime.now() - start} to get {len(result)} rows", logging.DEBUG)
+        return list(result)
+
+    async def _fetchMaxServerTime(self) -> Optional[datetime]:
+        result = await self._fetchAll(SQL.BuildSELECT(self._config["MYSQL_CONFIG"]["DB_NAME"], self._config["MYSQL_CONFIG"]["DB_TABLE"],
+                                                      ["MAX(server_time)"], "server_time != '0000-00-00 00:00:00'"))
+        return result[0][0] if len(result) > 0 else None
@@ -1,61 +1,118 @@
 import logging
 import os
+import threading
 import time
 import json
+from collections import deque
+from datetime import timezone
 from enum import Enum
-from typing import Any, Dict
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
 
 ## pip module imports
 from google.cloud import bigquery
 from google.cloud import bigquery_storage_v1
 from google.cloud.bigquery_storage_v1 import types
 from google.cloud.bigquery_storage_v1 import writer
+from google.cloud.bigquery_storage_v1.services.big_query_write import BigQueryWriteAsyncClient
 from google.cloud.exceptions import NotFound
 from google.protobuf import descriptor_pb2
 import google.api_core
 
 ## Local module imports
 from schemas import BigQueryOgdLogRecord_pb2 # ProtoBuf 2 schema for our destination BigQuery table(s)
+from schemas.BigQueryOgdLogRecordEncoder import OgdLogRecordEncoder
+from schemas.JsonValidator import JsonValidator
 from utils import Logger
 from interfaces import DataInterface
 
+## @class BigQueryClients
+#  Process-wide registry of BigQuery API clients, one of each kind per credentials file.
+#  Setting up a client loads its credentials and, for the write client, opens a gRPC channel, so every interface in the process
+#  shares the same clients instead of setting up new ones for each day. The bigquery and write clients are safe to share between threads.
+class BigQueryClients:
+
+    _clients : Dict[Tuple[str, str], Any] = {}
+    _lock    : threading.Lock = threading.Lock()
+
+    @staticmethod
+    def GetClient(config) -> bigquery.Client:
+        return BigQueryClients._get(config, "bigquery", bigquery.Client)
+
+    @staticmethod
+    def GetWriteClient(config) -> bigquery_storage_v1.BigQueryWriteClient:
+        return BigQueryClients._get(config, "write", bigquery_storage_v1.BigQueryWriteClient)
+
+    # The asyncio write client's gRPC channel belongs to the event loop it was created on, so it should only be used from that one loop
+    @staticmethod
+    def GetWriteAsyncClient(config) -> BigQueryWriteAsyncClient:
+        return BigQueryClients._get(config, "write_async", BigQueryWriteAsyncClient)
+
+    # Use the given clients for the config's credentials file from now on, in place of creating real ones, e.g. in-process stand-ins for benchmarking
+    @staticmethod
+    def Register(config, client: Any, writeClient: Any) -> None:
+        credentialsPath = config.get("CREDENTIALS_FILEPATH", "")
+        with BigQueryClients._lock:
+            BigQueryClients._clients[("bigquery", credentialsPath)] = client
+            BigQueryClients._clients[("write", credentialsPath)] = writeClient
+
+    @staticmethod
+    def _get(config, kind: str, createClient: Callable[[], Any]) -> Any:
+        key = (kind, config.get("CREDENTIALS_FILEPATH", ""))
+
+        with BigQueryClients._lock:
+            client = BigQueryClients._clients.get(key)
+            if client is None:
+                if "GITHUB_ACTIONS" not in os.environ:
+                    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = config["CREDENTIALS_FILEPATH"]
+                client = createClient()
+                BigQueryClients._clients[key] = client
+                Logger.Log(f"Created {kind} client", logging.DEBUG)
+            return client
+
 class BigQueryWriteInterface:
 
-    def __init__(self, config, fq_table_id: str):
+    # The writer schema is the same for every stream, so its descriptor is only built once
+    _writerSchema : Optional[types.ProtoSchema] = None
+
+    def __init__(self, config, fq_table_id: str, num_streams: int = 1):
         
         self._config = config
 
-        if "GITHUB_ACTIONS" not in os.environ:
-            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = self._config["CREDENTIALS_FILEPATH"]
-
         self.fq_table_id    = fq_table_id
-        self.write_client: bigquery_storage_v1.BigQueryWriteClient = bigquery_storage_v1.BigQueryWriteClient()
-        self.write_stream = None
-        self.row_request_template = None
-        self.append_rows_stream = None
+        self.write_client: bigquery_storage_v1.BigQueryWriteClient = BigQueryClients.GetWriteClient(self._config)
+
+        # One PENDING write stream, request template and append rows stream for each of our parallel streams.
+        # All of them are committed together, in a single batch, by CloseFinalizeAndCommit
+        self.num_streams          : int = max(1, num_streams)
+        self.write_streams        : List[Optional[types.WriteStream]] = [None] * self.num_streams
+        self.row_request_templates: List[Optional[types.AppendRowsRequest]] = [None] * self.num_streams
+        self.append_rows_streams  : List[Optional[writer.AppendRowsStream]] = [None] * self.num_streams
+        self.numReconnects        : int = 0 # Number of times an append rows stream was recreated after its first request failed
 
     # Initialize an Append Rows Stream, along with the required Write Stream and request template for data rows
-    def initAppendRowsStream(self, forceNewStream: bool = False) -> None:
+    def initAppendRowsStream(self, forceNewStream: bool = False, streamIndex: int = 0) -> None:
         """
         :param forceNewStream: If we have an existing write stream, request template, or append rows stream, create a new instance of them (use this if the stream cannot be revived)
         :type forceNewStream: bool, optional
+        :param streamIndex: Which of our parallel streams to initialize, defaults to 0
+        :type streamIndex: int, optional
         """
-        if forceNewStream or self.write_stream is None:
-            self.write_stream = self.GetWriteStream()
-            Logger.Log("New BQ write stream created with name: " + self.write_stream.name, logging.INFO)
+        if forceNewStream or self.write_streams[streamIndex] is None:
+            self.write_streams[streamIndex] = self.GetWriteStream()
+            Logger.Log(f"New BQ write stream {streamIndex + 1} of {self.num_streams} created with name: " + self.write_streams[streamIndex].name, logging.INFO)
 
-        if forceNewStream or self.row_request_template is None:
-            self.row_request_template = BigQueryWriteInterface.GetAppendRowsRequestTemplate(self.write_stream.name)
+        if forceNewStream or self.row_request_templates[streamIndex] is None:
+            self.row_request_templates[streamIndex] = BigQueryWriteInterface.GetAppendRowsRequestTemplate(self.write_streams[streamIndex].name)
 
-        if forceNewStream or self.append_rows_stream is None:
-            self.append_rows_stream = writer.AppendRowsStream(self.write_client, self.row_request_template)
+        if forceNewStream or self.append_rows_streams[streamIndex] is None:
+            self.append_rows_streams[streamIndex] = writer.AppendRowsStream(self.write_client, self.row_request_templates[streamIndex])
 
-    # Send the given appendRowsRequest to BigQuery
-    def SendAppendRowsRequest(self, numPreviousRequests: int, appendRowsRequest: google.cloud.bigquery_storage_v1.types.storage.AppendRowsRequest)\
+    # Send the given appendRowsRequest to BigQuery, on the given one of our parallel streams
+    def SendAppendRowsRequest(self, numPreviousRequests: int, appendRowsRequest: google.cloud.bigquery_storage_v1.types.storage.AppendRowsRequest, streamIndex: int = 0)\
          -> bigquery_storage_v1.types.AppendRowsResponse.AppendResult:
 
         # Initializes an Append Rows Stream, if it hasn't already been done
-        self.initAppendRowsStream()
+        self.initAppendRowsStream(streamIndex=streamIndex)
         
         # If this is the first request we're sending to the stream 
         # The stream will attempt an initial connection, 
@@ -77,7 +134,7 @@ class BigQueryWriteInterface:
                     # https://cloud.google.com/python/docs/reference/bigquerystorage/latest/google.cloud.bigquery_storage_v1.types.AppendRowsResponse.AppendResult
                     # { offset { value: 12345 } }
                     # value property will not be returned if the given offset in the request was zero
-                    response = self.append_rows_stream.send(appendRowsRequest)
+                    response = self.append_rows_streams[streamIndex].send(appendRowsRequest)
                     return response
 
                 # Unknown is the exception type for a "404 Requested entity was not found" response
@@ -87,7 +144,8 @@ class BigQueryWriteInterface:
                     Logger.Log("Creating new stream", logging.WARN)
 
                     # Force a re-initialization of an append rows stream
-                    self.initAppendRowsStream(True)
+                    self.initAppendRowsStream(True, streamIndex)
+                    self.numReconnects += 1
 
                     numRetries += 1
                     time.sleep(5)
@@ -99,37 +157,103 @@ class BigQueryWriteInterface:
                     Logger.Log("Creating new stream", logging.WARN)
 
                     # Force a re-initialization of an append rows stream
-                    self.initAppendRowsStream(True)
+                    self.initAppendRowsStream(True, streamIndex)
+                    self.numReconnects += 1
 
                     numRetries += 1
                     time.sleep(5)
         
-        return self.append_rows_stream.send(appendRowsRequest)
+        return self.append_rows_streams[streamIndex].send(appendRowsRequest)
 
-    # Close the append rows stream, finalize the write stream, commit the write stream
-    def CloseFinalizeAndCommit(self) -> None:
+    # Pick up an existing PENDING write stream, e.g. one recorded in the sync journal by an earlier run, as one of our parallel streams.
+    # Returns False if the stream no longer exists or has already been committed, in which case a new stream will be created when needed.
+    def ResumeWriteStream(self, streamIndex: int, streamName: str) -> bool:
+        writeStream = self.GetExistingWriteStream(streamName)
+        if writeStream is None or writeStream.commit_time:
+            return False
 
-        # Shutdown background threads and close the streaming connection.
-        self.append_rows_stream.close()
+        self.write_streams[streamIndex] = writeStream
+        self.row_request_templates[streamIndex] = None
+        self.append_rows_streams[streamIndex] = None
+        Logger.Log(f"Resuming BQ write stream {streamIndex + 1} of {self.num_streams} with name: " + streamName, logging.INFO)
+        return True
 
-        # A PENDING type stream must be "finalized" before being committed. No new
-        # records can be written to the stream after this method has been called.
-        self.write_client.finalize_write_stream(name=self.write_stream.name)
+    # Get the current state of the named write stream, or None if it doesn't exist
+    def GetExistingWriteStream(self, streamName: str) -> Optional[types.WriteStream]:
+        try:
+            return self.write_client.get_write_stream(name=streamName)
+        except google.api_core.exceptions.NotFound:
+            return None
+
+    # Get the names of the write streams that have been created, in stream order
+    def GetWriteStreamNames(self) -> List[str]:
+        return [writeStream.name for writeStream in self.write_streams if writeStream is not None]
+
+    # Close the append rows streams, finalize the write streams, commit all the write streams in a single batch
+    # Returns the number of rows committed, as counted by BigQuery when the streams were finalized
+    def CloseFinalizeAndCommit(self) -> int:
+        writeStreamNames, numRowsFinalized = self.CloseAndFinalize()
+        self.CommitWriteStreams(writeStreamNames)
+        return numRowsFinalized
+
+    # Close the append rows streams and finalize the write streams, so no more rows can be appended to them
+    # Returns the names of the write streams, and the total number of rows they hold
+    def CloseAndFinalize(self) -> Tuple[List[str], int]:
+        self.CloseAppendRowsStreams()
+        writeStreamNames = self.GetWriteStreamNames()
+        numRowsFinalized = self.FinalizeWriteStreams(writeStreamNames)
+        return (writeStreamNames, numRowsFinalized)
+
+    # Shutdown the append rows streams' background threads and close their streaming connections
+    def CloseAppendRowsStreams(self) -> None:
+        for streamIndex in range(self.num_streams):
+            # Streams that never had a request sent to them never opened a connection
+            if self.append_rows_streams[streamIndex] is not None:
+                self.append_rows_streams[streamIndex].close()
+                self.append_rows_streams[streamIndex] = None
+
+    # A PENDING type stream must be "finalized" before being committed. No new
+    # records can be written to the stream after this method has been called.
+    # Returns the total number of rows in the finalized streams
+    def FinalizeWriteStreams(self, writeStreamNames: List[str]) -> int:
+        numRowsFinalized = 0
+        for writeStreamName in writeStreamNames:
+            finalizeResponse = self.write_client.finalize_write_stream(name=writeStreamName)
+            numRowsFinalized += finalizeResponse.row_count
+        return numRowsFinalized
+
+    # Commit the given write streams. The commit is atomic, so either all of the streams' rows become visible, or none do.
+    def CommitWriteStreams(self, writeStreamNames: List[str]) -> None:
 
-        # Commit the write stream
         batch_commit_write_streams_request = types.BatchCommitWriteStreamsRequest()
         batch_commit_write_streams_request.parent = self.getParentStringForFqTableId(self.fq_table_id)
-        batch_commit_write_streams_request.write_streams = [self.write_stream.name]
-        self.write_client.batch_commit_write_streams(batch_commit_write_streams_request)
+        batch_commit_write_streams_request.write_streams = writeStreamNames
+        commitResponse = self.write_client.batch_commit_write_streams(batch_commit_write_streams_request)
+
+        if len(commitResponse.stream_errors) > 0:
+            raise Exception(f"Failed to commit write streams for {self.fq_table_id}: {str(commitResponse.stream_errors)}")
 
     @staticmethod
     # Return a data row for inserting into a BigQuery table
-    def AssembleSerializedRowData(mysqlRow: Dict[str, Any], formatType) -> None:
+    # mysqlRow is a tuple, and columnIndex maps each column name to its position in the tuple
+    def AssembleSerializedRowData(mysqlRow: Tuple, columnIndex: Dict[str, int], formatType) -> bytes:
    
         if formatType == SourceDataRowFormatType.LOGGER_LOG:
-            return BigQueryWriteInterface._assembleSerializedRowDataForLoggerLog(mysqlRow)
+            return BigQueryWriteInterface._assembleSerializedRowDataForLoggerLog(dict(zip(columnIndex.keys(), mysqlRow)))
         elif formatType == SourceDataRowFormatType.OPEN_GAME_DATA:
-            return BigQueryWriteInterface._assembleSerializedRowDataForOgd(mysqlRow)
+            return BigQueryWriteInterface._assembleSerializedRowDataForOgd(mysqlRow, columnIndex)
+
+        raise Exception("Unsupported source data format type: " + str(formatType))
+
+    @staticmethod
+    # Return an encoder that serializes whole batches of data rows at a time for inserting into a BigQuery table
+    # Encoders keep per-batch caches, so each thread serializing rows should get its own encoder
+    def GetRowBatchEncoder(columnIndex: Dict[str, int], formatType, jsonValidator: Optional[JsonValidator] = None) -> OgdLogRecordEncoder:
+
+        if formatType == SourceDataRowFormatType.OPEN_GAME_DATA:
+            return OgdLogRecordEncoder(columnIndex, jsonValidator)
+        elif formatType == SourceDataRowFormatType.LOGGER_LOG:
+            raise Exception("The logger.log data format is not yet supported")
 
         raise Exception("Unsupported source data format type: " + str(formatType))
 
@@ -149,11 +273,11 @@ class BigQueryWriteInterface:
          # Convert from MySQL timestamps in seconds to BigQuery timestamp in microseconds
         
         # We'll add in the milliseconds column (client_time_ms) from MySQL
-        row.client_time = int(round(mysqlRow['client_time'].timestamp())) * 1000000 + mysqlRow['client_time_ms'] * 1000
+        row.client_time = int(round(mysqlRow['client_time'].replace(tzinfo=timezone.utc).timestamp())) * 1000000 + mysqlRow['client_time_ms'] * 1000
 
         # server_time in MySQL is not UTC, it's local America/Chicago, but in the future might be logged as UTC
         # When we send this to BigQuery, BigQuery always assumes the timestamp is UTC
-        row.server_time = int(round(mysqlRow['server_time'].timestamp())) * 1000000
+        row.server_time = int(round(mysqlRow['server_time'].replace(tzinfo=timezone.utc).timestamp())) * 1000000
 
         row.event_name = mysqlRow['event'] # event
 
@@ -181,80 +305,90 @@ class BigQueryWriteInterface:
         return row.SerializeToString()
 
     @staticmethod
-    def _assembleSerializedRowDataForOgd(mysqlRow: Dict[str, Any]) -> None:
+    def _assembleSerializedRowDataForOgd(mysqlRow: Tuple, columnIndex: Dict[str, int]) -> bytes:
 
         row = BigQueryOgdLogRecord_pb2.LogRecord()
 
+        session_id  = mysqlRow[columnIndex['session_id']]
+        user_data   = mysqlRow[columnIndex['user_data']]
+        client_time = mysqlRow[columnIndex['client_time']]
+        event_data  = mysqlRow[columnIndex['event_data']]
+        game_state  = mysqlRow[columnIndex['game_state']]
+        event_sequence_index = mysqlRow[columnIndex['event_sequence_index']]
+
         # Skipping the auto_increment primary key in mysqlRow[0] since it isn't useful
-        row.session_id = mysqlRow['session_id']
-        row.user_id = mysqlRow['user_id']
+        row.session_id = session_id
+        row.user_id = mysqlRow[columnIndex['user_id']]
 
-        if mysqlRow['user_data'] is None or mysqlRow['user_data'] == "":
+        if user_data is None or user_data == "":
             pass
             #row.user_data = None
         else:
             try:
-                user_data_obj = json.loads(mysqlRow['user_data'])
-                row.user_data = mysqlRow['user_data']
+                user_data_obj = json.loads(user_data)
+                row.user_data = user_data
             except json.JSONDecodeError:
                 #row.user_data = None
-                Logger.Log("Unable to decode user_data json string: " + str(mysqlRow['user_data']) + " for sesson_id: " + str(mysqlRow['session_id']) + " event_sequence_index: "\
-                     + str(mysqlRow['event_sequence_index']) + " id: " + str(mysqlRow['id']), logging.WARN)
+                Logger.Log("Unable to decode user_data json string: " + str(user_data) + " for sesson_id: " + str(session_id) + " event_sequence_index: "\
+                     + str(event_sequence_index) + " id: " + str(mysqlRow[columnIndex['id']]), logging.WARN)
 
         # client_time is NOT NULL in MySQL, however it can be 0000-00-00 which is cast to None
         # so we have to check it here
-        if not mysqlRow['client_time'] is None:
+        if not client_time is None:
             # Convert from MySQL timestamps in seconds to BigQuery timestamp in microseconds
             # We'll add in the milliseconds column (client_time_ms) from MySQL
-            row.client_time = int(round(mysqlRow['client_time'].timestamp())) * 1000000 + mysqlRow['client_time_ms'] * 1000
+            row.client_time = int(round(client_time.replace(tzinfo=timezone.utc).timestamp())) * 1000000 + mysqlRow[columnIndex['client_time_ms']] * 1000
 
-        if not mysqlRow['client_offset'] is None:
+        client_offset = mysqlRow[columnIndex['client_offset']]
+        if not client_offset is None:
             # casting datetime.timedelta type to integer number of seconds because
             # BigQuery's TIME type cannot store negative values
             # and casting to string produces day-based offsets for negative values e.g. "-1 day, 19:00:00" for "-06:00:00"
-            row.client_offset = round(mysqlRow['client_offset'].total_seconds())
+            row.client_offset = round(client_offset.total_seconds())
 
         # server_time in MySQL is not UTC, it's local America/Chicago, but in the future might be logged as UTC
-        # When we send this to BigQuery, BigQuery always assumes the timestamp is UTC
-        row.server_time = int(round(mysqlRow['server_time'].timestamp())) * 1000000
+        # When we send this to BigQuery, BigQuery always assumes the timestamp is UTC, so the naive value is read as UTC whatever the runner's time zone
+        row.server_time = int(round(mysqlRow[columnIndex['server_time']].replace(tzinfo=timezone.utc).timestamp())) * 1000000
 
-        row.event_name = mysqlRow['event_name']
+        row.event_name = mysqlRow[columnIndex['event_name']]
 
-        if mysqlRow['event_data'] is None:
+        if event_data is None:
             row.event_data = "{}"
         else:
             try:
-                event_obj = json.loads(mysqlRow['event_data'])
-                row.event_data = mysqlRow['event_data']
+                event_obj = json.loads(event_data)
+                row.event_data = event_data
             except json.JSONDecodeError:
                 row.event_data = "{}"
-                Logger.Log("Unable to decode event_data json string: " + str(mysqlRow['event_data']) + " for sesson_id: " + str(mysqlRow['session_id'])\
-                     + " event_sequence_index: " + str(mysqlRow['event_sequence_index']) + " id: " + str(mysqlRow['id']), logging.WARN)
+                Logger.Log("Unable to decode event_data json string: " + str(event_data) + " for sesson_id: " + str(session_id)\
+                     + " event_sequence_index: " + str(event_sequence_index) + " id: " + str(mysqlRow[columnIndex['id']]), logging.WARN)
 
-        row.event_source = mysqlRow['event_source']
+        row.event_source = mysqlRow[columnIndex['event_source']]
 
-        if mysqlRow['game_state'] is None or mysqlRow['game_state'] == "":
+        if game_state is None or game_state == "":
             # row.game_state = None
             pass
         else:
             try:
-                game_state_obj = json.loads(mysqlRow['game_state'])
-                row.game_state = mysqlRow['game_state']
+                game_state_obj = json.loads(game_state)
+                row.game_state = game_state
             except json.JSONDecodeError:
                 # row.game_state = None
-                Logger.Log("Unable to decode game_state json string: " + str(mysqlRow['game_state']) + " for sesson_id: " + str(mysqlRow['session_id'])\
-                     + " event_sequence_index: " + str(mysqlRow['event_sequence_index']) + " id: " + str(mysqlRow['id']), logging.WARN)
+                Logger.Log("Unable to decode game_state json string: " + str(game_state) + " for sesson_id: " + str(session_id)\
+                     + " event_sequence_index: " + str(event_sequence_index) + " id: " + str(mysqlRow[columnIndex['id']]), logging.WARN)
 
-        row.app_version = mysqlRow['app_version']
+        row.app_version = mysqlRow[columnIndex['app_version']]
 
-        if mysqlRow['app_branch'] is not None:
-            row.app_branch = mysqlRow['app_branch']
-        row.log_version = mysqlRow['log_version']
-        row.event_sequence_index = mysqlRow['event_sequence_index']
-        row.remote_addr = mysqlRow['remote_addr']
+        app_branch = mysqlRow[columnIndex['app_branch']]
+        if app_branch is not None:
+            row.app_branch = app_branch
+        row.log_version = mysqlRow[columnIndex['log_version']]
+        row.event_sequence_index = event_sequence_index
+        row.remote_addr = mysqlRow[columnIndex['remote_addr']]
 
-        if mysqlRow['http_user_agent'] is not None:
-            row.http_user_agent = mysqlRow['http_user_agent']
+        http_user_agent = mysqlRow[columnIndex['http_user_agent']]
+        if http_user_agent is not None:
+            row.http_user_agent = http_user_agent
 
         return row.SerializeToString()
 
@@ -300,17 +434,26 @@ class BigQueryWriteInterface:
         # The initial request must contain the stream name.
         request_template.write_stream = stream_name
 
-        # So that BigQuery knows how to parse the serialized_rows, generate a
-        # protocol buffer representation of your message descriptor.
-        proto_schema = types.ProtoSchema()
-        proto_descriptor = descriptor_pb2.DescriptorProto()
-        BigQueryOgdLogRecord_pb2.LogRecord.DESCRIPTOR.CopyToProto(proto_descriptor)
-        proto_schema.proto_descriptor = proto_descriptor
+        # So that BigQuery knows how to parse the serialized_rows, include a
+        # protocol buffer representation of our message descriptor.
         proto_data = types.AppendRowsRequest.ProtoData()
-        proto_data.writer_schema = proto_schema
+        proto_data.writer_schema = BigQueryWriteInterface.GetWriterSchema()
         request_template.proto_rows = proto_data
 
         return request_template
+
+    @staticmethod
+    # Return the writer schema for our LogRecord proto, generating it the first time it's needed
+    def GetWriterSchema() -> types.ProtoSchema:
+
+        if BigQueryWriteInterface._writerSchema is None:
+            proto_schema = types.ProtoSchema()
+            proto_descriptor = descriptor_pb2.DescriptorProto()
+            BigQueryOgdLogRecord_pb2.LogRecord.DESCRIPTOR.CopyToProto(proto_descriptor)
+            proto_schema.proto_descriptor = proto_descriptor
+            BigQueryWriteInterface._writerSchema = proto_schema
+
+        return BigQueryWriteInterface._writerSchema
     
     @staticmethod
     def GetAppendRowsRequest(protoRows, offset):
@@ -329,6 +472,204 @@ class BigQueryWriteInterface:
 
         return request
 
+## @class AppendRowsRequestBuilder
+#  Packs serialized rows into append rows requests, tracking the encoded size of the request as each row is added.
+#  Every row costs its own length plus the tag and length prefix of the serialized_rows field, and the ProtoRows,
+#  ProtoData and offset framing around the rows is added on top, so batches can be packed right up to the size limit.
+class AppendRowsRequestBuilder:
+
+    # Room for the write stream name and writer schema, which the AppendRowsStream merges into the first request from its template,
+    # plus the offset field
+    REQUEST_HEADROOM_BYTES : int = 2048
+
+    def __init__(self, maxRequestSizeInBytes:int = 10000000, reservedBytes:Optional[int] = None):
+        self.maxRequestSizeInBytes : int = maxRequestSizeInBytes
+        self.reservedBytes         : int = reservedBytes if reservedBytes is not None else AppendRowsRequestBuilder.REQUEST_HEADROOM_BYTES
+        self._rows        : List[bytes] = []
+        self._rowsInBytes : int = 0
+
+    @property
+    def NumRows(self) -> int:
+        return len(self._rows)
+
+    @property
+    def SizeInBytes(self) -> int:
+        """The encoded size of the request that Build would currently return, including the reserved headroom"""
+        return self._requestSizeFor(self._rowsInBytes)
+
+    def TryAdd(self, serializedRow:bytes) -> bool:
+        """Add a serialized row to the request, unless doing so would push the request over the size limit.
+
+        :param serializedRow: A proto2 serialized LogRecord
+        :type serializedRow: bytes
+        :raises Exception: If the row is too large to fit in a request on its own
+        :return: True if the row was added, False if the request is full and should be built and sent first
+        :rtype: bool
+        """
+        rowsInBytes = self._rowsInBytes + AppendRowsRequestBuilder._fieldSize(len(serializedRow))
+
+        if self._requestSizeFor(rowsInBytes) > self.maxRequestSizeInBytes:
+            if len(self._rows) == 0:
+                raise Exception(f"Serialized row of {len(serializedRow)} bytes cannot fit in an append rows request of at most {self.maxRequestSizeInBytes} bytes")
+            return False
+
+        self._rows.append(serializedRow)
+        self._rowsInBytes = rowsInBytes
+        return True
+
+    def Build(self, offset:int) -> types.AppendRowsRequest:
+        """Create an append rows request with every row added so far, and start a new, empty request.
+
+        :param offset: The offset of the first row of the request within the write stream
+        :type offset: int
+        :return: The append rows request
+        :rtype: types.AppendRowsRequest
+        """
+        protoRows = types.ProtoRows(serialized_rows=self._rows)
+        self._rows = []
+        self._rowsInBytes = 0
+
+        return BigQueryWriteInterface.GetAppendRowsRequest(protoRows, offset)
+
+    def _requestSizeFor(self, rowsInBytes:int) -> int:
+        # serialized_rows inside ProtoRows, which is the rows field of ProtoData, which is the proto_rows field of the request
+        protoDataInBytes = AppendRowsRequestBuilder._fieldSize(rowsInBytes)
+        return AppendRowsRequestBuilder._fieldSize(protoDataInBytes) + self.reservedBytes
+
+    @staticmethod
+    def _fieldSize(lengthInBytes:int) -> int:
+        # One byte for the field tag, a varint for the length, then the bytes themselves
+        return 1 + AppendRowsRequestBuilder._varintSize(lengthInBytes) + lengthInBytes
+
+    @staticmethod
+    def _varintSize(value:int) -> int:
+        size = 1
+        while value >= 0x80:
+            value >>= 7
+            size += 1
+        return size
+
+## @class AppendRowsSendWindow
+#  Tracks the append rows requests that have been sent to a stream but not yet acknowledged, and bounds how many there can be.
+#  If given, onAcknowledged is called with the stream index, offset and number of rows of each request as it is acknowledged.
+class AppendRowsSendWindow:
+
+    def __init__(self, maxInFlight:int = 4, onAcknowledged:Optional[Callable[[int, int, int], None]] = None):
+        self.maxInFlight      : int = max(1, maxInFlight)
+        self.onAcknowledged   : Optional[Callable[[int, int, int], None]] = onAcknowledged
+        self.numAcknowledged  : int = 0
+        self.numRowsAcknowledged : int = 0
+        self.numAlreadyExists    : int = 0 # Requests whose rows turned out to be appended already
+        self._inFlight : Deque[Tuple[int, int, int, int, Any]] = deque() # (stream index, request number, offset, number of rows, future)
+
+    @property
+    def NumInFlight(self) -> int:
+        return len(self._inFlight)
+
+    def Add(self, requestNumber:int, offset:int, numRows:int, future:Any, streamIndex:int = 0) -> None:
+        """Start tracking a request that has just been sent.
+        If the window is already full, this blocks until the oldest request is acknowledged, so the sender backs off
+        rather than queueing up an unbounded number of requests in memory.
+
+        :param requestNumber: The zero-based number of the request within its stream, used for logging
+        :type requestNumber: int
+        :param offset: The offset the request was sent with
+        :type offset: int
+        :param numRows: The number of rows in the request
+        :type numRows: int
+        :param future: The future returned by sending the request
+        :type future: AppendRowsFuture
+        :param streamIndex: Which of the write interface's parallel streams the request was sent on, defaults to 0
+        :type streamIndex: int, optional
+        :raises Exception: If any request acknowledged while waiting failed, or was acknowledged at the wrong offset
+        """
+        while len(self._inFlight) >= self.maxInFlight:
+            Logger.Log(f"Send window full with {len(self._inFlight)} requests in flight, waiting for an acknowledgement", logging.DEBUG)
+            self._acknowledgeOldest()
+        self._inFlight.append((streamIndex, requestNumber, offset, numRows, future))
+
+    def Drain(self) -> None:
+        """Wait for every request in the window to be acknowledged.
+
+        :raises Exception: If any request failed, or was acknowledged at the wrong offset
+        """
+        while len(self._inFlight) > 0:
+            self._acknowledgeOldest()
+
+    def _acknowledgeOldest(self) -> None:
+        streamIndex, requestNumber, offset, numRows, future = self._inFlight.popleft()
+
+        try:
+            response = future.result()
+        except google.api_core.exceptions.AlreadyExists:
+            # The rows at this offset were already appended, e.g. by a request that was resent after a dropped connection
+            Logger.Log(f"For stream: {str(streamIndex + 1)} request number: {str(requestNumber + 1)} rows at offset: {str(offset)} were already appended", logging.WARNING)
+            self.numAlreadyExists += 1
+        else:
+            # The offset is not returned if the request's offset was zero
+            acknowledgedOffset = response.append_result.offset or 0
+            if acknowledgedOffset != offset:
+                raise Exception(f"Stream: {str(streamIndex + 1)} request number: {str(requestNumber + 1)} was sent with offset: {str(offset)}, but acknowledged at offset: {str(acknowledgedOffset)}")
+            if len(getattr(response, "row_errors", [])) > 0:
+                raise Exception(f"Stream: {str(streamIndex + 1)} request number: {str(requestNumber + 1)} with offset: {str(offset)} had row errors: {str(response.row_errors)}")
+            Logger.Log(f"For stream: {str(streamIndex + 1)} request number: {str(requestNumber + 1)} with offset: {str(offset)} Request response result: {str(response)}", logging.DEBUG)
+
+        self.numAcknowledged += 1
+        self.numRowsAcknowledged += numRows
+
+        if self.onAcknowledged is not None:
+            self.onAcknowledged(streamIndex, offset, numRows)
+
+## @class DatasetTableCache
+#  The ids of the tables in one BigQuery dataset, fetched with a single list_tables call instead of a get_table call for each daily shard.
+#  Tables created or deleted through a BigQueryInterface are added or removed as that happens. The listing is fetched again once
+#  it is older than maxAgeInSeconds, so tables created or deleted by other processes are picked up before long.
+class DatasetTableCache:
+
+    _caches     : Dict[str, "DatasetTableCache"] = {}
+    _cachesLock : threading.Lock = threading.Lock()
+
+    def __init__(self, datasetId: str, maxAgeInSeconds: float):
+        self.datasetId       : str = datasetId
+        self.maxAgeInSeconds : float = maxAgeInSeconds
+        self._tableIds : Optional[Set[str]] = None
+        self._listedAt : float = 0
+        self._lock     : threading.Lock = threading.Lock()
+
+    # Get the process-wide cache for the dataset holding the given table
+    @staticmethod
+    def ForTable(fqTableId: str, maxAgeInSeconds: float) -> "DatasetTableCache":
+        datasetId = fqTableId.rsplit('.', 1)[0]
+        with DatasetTableCache._cachesLock:
+            cache = DatasetTableCache._caches.get(datasetId)
+            if cache is None:
+                cache = DatasetTableCache(datasetId, maxAgeInSeconds)
+                DatasetTableCache._caches[datasetId] = cache
+            return cache
+
+    def Contains(self, client: bigquery.Client, fqTableId: str) -> bool:
+        with self._lock:
+            if self._tableIds is None or time.monotonic() - self._listedAt > self.maxAgeInSeconds:
+                self._tableIds = {f"{table.project}.{table.dataset_id}.{table.table_id}" for table in client.list_tables(self.datasetId)}
+                self._listedAt = time.monotonic()
+                Logger.Log(f"Listed {len(self._tableIds)} tables in dataset {self.datasetId}", logging.DEBUG)
+            return fqTableId in self._tableIds
+
+    def Add(self, fqTableId: str) -> None:
+        with self._lock:
+            if self._tableIds is not None:
+                self._tableIds.add(fqTableId)
+
+    def Remove(self, fqTableId: str) -> None:
+        with self._lock:
+            if self._tableIds is not None:
+                self._tableIds.discard(fqTableId)
+
+    # Forget the listing, so it's fetched again on the next lookup
+    def Invalidate(self) -> None:
+        with self._lock:
+            self._tableIds = None
+
 # Enum representing the different source database schemas we might pulling from
 class SourceDataRowFormatType(Enum):
     LOGGER_LOG = 'LOGGER_LOG'
@@ -340,30 +681,165 @@ class BigQueryInterface:
     def __init__(self, config):
 
         self._config = config
+        self._client: bigquery.Client = BigQueryClients.GetClient(self._config)
 
-        if "GITHUB_ACTIONS" not in os.environ:
-            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = self._config["CREDENTIALS_FILEPATH"]
+        # How long a listing of a dataset's tables is trusted for. At 0, every lookup asks BigQuery for the table itself.
+        self._tableCacheMaxAge : float = float(self._config.get("TABLE_CACHE_SECONDS", 600))
 
-        self._client: bigquery.Client = bigquery.Client()
+    @staticmethod
+    # Split a table id like project.dataset.table$20240131 into the id of the table and its partition's date, formatted as 2024-01-31.
+    # The date is None for a table id without a partition decorator.
+    def SplitPartitionDecorator(fqTableId: str) -> Tuple[str, Optional[str]]:
+        baseTableId, _, partition = fqTableId.partition('$')
+        if partition == "":
+            return (baseTableId, None)
+        return (baseTableId, f"{partition[0:4]}-{partition[4:6]}-{partition[6:8]}")
 
     def TableExists(self, fqTableId: str) -> bool:
+        if self._tableCacheMaxAge > 0:
+            return DatasetTableCache.ForTable(fqTableId, self._tableCacheMaxAge).Contains(self._client, fqTableId)
+        return self.GetTable(fqTableId) is not None
+
+    # Get the table's metadata, or None if the table doesn't exist
+    def GetTable(self, fqTableId: str) -> Optional[bigquery.Table]:
+        # A table missing from the dataset's listing doesn't exist, so there's no need to ask for it
+        if self._tableCacheMaxAge > 0 and not self.TableExists(fqTableId):
+            return None
+
         try:
-            self._client.get_table(fqTableId)
-            return True
+            return self._client.get_table(fqTableId)
         except NotFound:
-            return False
+            if self._tableCacheMaxAge > 0:
+                DatasetTableCache.ForTable(fqTableId, self._tableCacheMaxAge).Remove(fqTableId)
+            return None
 
     def DeleteTable(self, fqTableId: str) -> None:
         self._client.delete_table(fqTableId)
+        if self._tableCacheMaxAge > 0:
+            DatasetTableCache.ForTable(fqTableId, self._tableCacheMaxAge).Remove(fqTableId)
         Logger.Log("Deleted table: " + fqTableId, logging.INFO)
 
-    def CreateTable(self, fqTableId: str, schema: Any) -> None:
+    def CreateTable(self, fqTableId: str, schema: Any, partitionField: Optional[str] = None, clusteringFields: Optional[List[str]] = None) -> bool:
+        """Create a table with the given schema, optionally partitioned by day on a timestamp column and clustered on other columns.
+        If the table already exists, e.g. because another process created it since it was looked up, it is left as it is,
+        and may already hold rows.
+
+        :param fqTableId: The fully qualified id of the table
+        :type fqTableId: str
+        :param schema: The table's columns
+        :type schema: List[bigquery.SchemaField]
+        :param partitionField: A TIMESTAMP or DATE column to partition the table by, one partition per day, defaults to no partitioning
+        :type partitionField: Optional[str], optional
+        :param clusteringFields: Up to four columns to cluster the table's rows by, defaults to no clustering
+        :type clusteringFields: Optional[List[str]], optional
+        :return: True if the table was created, or False if it already existed
+        :rtype: bool
+        """
         bigquery_table = bigquery.Table(fqTableId, schema)
-        self._client.create_table(bigquery_table)
+        if partitionField is not None:
+            bigquery_table.time_partitioning = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field=partitionField)
+        if clusteringFields is not None:
+            bigquery_table.clustering_fields = clusteringFields
+        try:
+            self._client.create_table(bigquery_table)
+        except google.api_core.exceptions.Conflict:
+            # Someone else created the table since the dataset was listed, e.g. a parallel day creating the same partitioned table,
+            # so the table we wanted is already there
+            if self._tableCacheMaxAge > 0:
+                DatasetTableCache.ForTable(fqTableId, self._tableCacheMaxAge).Add(fqTableId)
+            Logger.Log("Table: " + fqTableId + " was already created", logging.INFO)
+            return False
+        if self._tableCacheMaxAge > 0:
+            DatasetTableCache.ForTable(fqTableId, self._tableCacheMaxAge).Add(fqTableId)
         Logger.Log("Created table: " + fqTableId, logging.INFO)
+        return True
+
+    def StartParquetLoadJob(self, fqTableId: str, filePath: str, jobIdPrefix: str) -> bigquery.LoadJob:
+        """Upload a Parquet file and start a load job appending its rows to a table, or to one of its partitions.
+
+        The job's id is made from the given prefix, which should identify exactly the rows in the file. If a job with that id was already
+        started, e.g. by a run that died before marking the rows as synced, that job is picked up instead of loading the rows a second time.
+        Only if the earlier job failed is the file loaded again, under the next id.
+
+        :param fqTableId: The fully qualified id of the table, or of one of its partitions, with a $YYYYMMDD partition decorator
+        :type fqTableId: str
+        :param filePath: The Parquet file to load, with the columns of the table's schema
+        :type filePath: str
+        :param jobIdPrefix: Letters, numbers and underscores identifying the rows in the file
+        :type jobIdPrefix: str
+        :return: The running, or finished, load job
+        :rtype: bigquery.LoadJob
+        """
+        jobConfig = bigquery.LoadJobConfig(source_format=bigquery.SourceFormat.PARQUET, write_disposition=bigquery.WriteDisposition.WRITE_APPEND)
+
+        for attempt in range(100):
+            jobId = f"{jobIdPrefix}_{attempt}"
+            try:
+                job = self._client.get_job(jobId)
+            except NotFound:
+                with open(filePath, "rb") as file:
+                    job = self._client.load_table_from_file(file, fqTableId, job_id=jobId, job_config=jobConfig)
+                Logger.Log(f"Started load job {jobId} into: {fqTableId}", logging.INFO)
+                return job
+
+            if job.error_result is None:
+                Logger.Log(f"Load job {jobId} into: {fqTableId} was already started, waiting for it instead of loading the rows again", logging.WARNING)
+                return job
+            Logger.Log(f"Earlier load job {jobId} into: {fqTableId} failed with {str(job.error_result)}, loading the rows again", logging.WARNING)
+
+        raise Exception(f"Too many failed load jobs into {fqTableId} with id prefix {jobIdPrefix}")
+
+    def WaitForLoadJob(self, job: bigquery.LoadJob) -> int:
+        """Wait for a load job to finish.
+
+        :raises google.api_core.exceptions.GoogleAPICallError: If the load job failed
+        :return: The number of rows the job loaded
+        :rtype: int
+        """
+        job.result()
+        return job.output_rows or 0
+
+    def GetTableRowCount(self, fqTableId: str, table: Optional[bigquery.Table] = None) -> int:
+        """Get the number of rows in a table, from the table's metadata if possible, which doesn't need a query job.
+
+        The metadata's num_rows leaves out rows that are still in the streaming buffer, so if the table has one,
+        the rows are counted with a COUNT(*) query instead.
+
+        The metadata only has the number of rows in the whole table, so the rows of a single partition are always counted with a query.
+
+        :param fqTableId: The fully qualified id of the table, or of one of its partitions, with a $YYYYMMDD partition decorator
+        :type fqTableId: str
+        :param table: The table's metadata, if it was already fetched, defaults to fetching it
+        :type table: Optional[bigquery.Table], optional
+        :return: The number of rows in the table
+        :rtype: int
+        """
+        if BigQueryInterface.SplitPartitionDecorator(fqTableId)[1] is not None:
+            return self.GetTableCount(fqTableId)
+
+        if table is None:
+            table = self.GetTable(fqTableId)
+            if table is None:
+                raise Exception(f"Table {fqTableId} does not exist")
+
+        if table.streaming_buffer is None and table.num_rows is not None:
+            return table.num_rows
+
+        Logger.Log(f"Table {fqTableId} has rows in its streaming buffer, counting them with a query", logging.DEBUG)
+        return self.GetTableCount(fqTableId)
 
     def GetTableCount(self, fqTableId: str) -> int:
-        query = "SELECT COUNT(*) mycount FROM `" + fqTableId + "`"
+        baseTableId, partitionDate = BigQueryInterface.SplitPartitionDecorator(fqTableId)
+
+        if partitionDate is None:
+            query = "SELECT COUNT(*) mycount FROM `" + fqTableId + "`"
+        else:
+            # A decorator can't be used in a query, so filter on the partitioning column instead, which scans just that partition
+            table = self.GetTable(baseTableId)
+            if table is None or table.time_partitioning is None:
+                raise Exception(f"Table {baseTableId} does not exist, or is not partitioned")
+            partitionField = table.time_partitioning.field or "_PARTITIONTIME"
+            query = "SELECT COUNT(*) mycount FROM `" + baseTableId + "` WHERE DATE(" + partitionField + ") = '" + partitionDate + "'"
         job = self._client.query(query)
 
         for row in job:
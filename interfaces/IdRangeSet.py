@@ -0,0 +1,80 @@
+## Standard module imports
+from typing import Iterable, List, Optional, Tuple
+
+class IdRangeSet:
+    """A set of integer ids, stored as sorted, non-overlapping inclusive intervals rather than as individual ids.
+
+    Log entry ids are handed out by an auto_increment column, so the ids of a day's rows are almost entirely consecutive,
+    and millions of them collapse into a handful of intervals. Only ids that are actually in the set are covered by an interval,
+    so an interval can be used directly as a primary key range.
+    """
+
+    def __init__(self, intervals:Optional[Iterable[Tuple[int, int]]] = None):
+        self._intervals : List[Tuple[int, int]] = IdRangeSet._merge(intervals) if intervals is not None else []
+
+    @staticmethod
+    def FromIds(ids:Iterable[int]) -> "IdRangeSet":
+        intervals : List[Tuple[int, int]] = []
+        for entryId in sorted(ids):
+            if len(intervals) > 0 and entryId <= intervals[-1][1] + 1:
+                if entryId > intervals[-1][1]:
+                    intervals[-1] = (intervals[-1][0], entryId)
+            else:
+                intervals.append((entryId, entryId))
+        result = IdRangeSet()
+        result._intervals = intervals
+        return result
+
+    @staticmethod
+    def FromString(text:str) -> "IdRangeSet":
+        """Parse a set written by ToString, e.g. "1-5,7-7,9-12"
+        """
+        intervals : List[Tuple[int, int]] = []
+        for interval in text.split(","):
+            if interval != "":
+                startId, endId = interval.split("-")
+                intervals.append((int(startId), int(endId)))
+        return IdRangeSet(intervals)
+
+    def ToString(self) -> str:
+        return ",".join(f"{startId}-{endId}" for startId, endId in self._intervals)
+
+    @property
+    def Intervals(self) -> List[Tuple[int, int]]:
+        return list(self._intervals)
+
+    def __len__(self) -> int:
+        return sum(endId - startId + 1 for startId, endId in self._intervals)
+
+    def Union(self, other:"IdRangeSet") -> "IdRangeSet":
+        return IdRangeSet(self._intervals + other._intervals)
+
+    def Complement(self, minId:int, maxId:int) -> "IdRangeSet":
+        """Get the ids between minId and maxId, inclusive, that are not in this set
+        """
+        intervals : List[Tuple[int, int]] = []
+        nextId = minId
+        for startId, endId in self._intervals:
+            if endId < nextId:
+                continue
+            if startId > maxId:
+                break
+            if startId > nextId:
+                intervals.append((nextId, startId - 1))
+            nextId = endId + 1
+        if nextId <= maxId:
+            intervals.append((nextId, maxId))
+        result = IdRangeSet()
+        result._intervals = intervals
+        return result
+
+    @staticmethod
+    def _merge(intervals:Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        merged : List[Tuple[int, int]] = []
+        for startId, endId in sorted(intervals):
+            if len(merged) > 0 and startId <= merged[-1][1] + 1:
+                if endId > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], endId)
+            else:
+                merged.append((startId, endId))
+        return merged
@@ -1,15 +1,19 @@
 # import libraries
-from mysql.connector import connection, cursor
+from mysql.connector import connection, cursor, errors
 import logging
+import queue
 import sshtunnel
 import sys
+import threading
 import traceback
 from datetime import datetime, date, time, timedelta
-from typing import Any, Dict, List, Tuple, Optional
+from time import sleep
+from typing import Any, Dict, Iterator, List, Tuple, Optional
 
 # import locals
 from interfaces.DataInterface import DataInterface
 from interfaces.BigQueryInterface import SourceDataRowFormatType
+from interfaces.IdRangeSet import IdRangeSet
 from utils import Logger
 
 
@@ -117,29 +121,10 @@ class SQL:
         """
         tunnel    : Optional[sshtunnel.SSHTunnelForwarder] = None
         db_conn   : Optional[connection.MySQLConnection] = None
-        MAX_TRIES : int = 5
-        tries : int = 0
-        connected_ssh : bool = False
 
         # First, connect to SSH
-        while connected_ssh == False and tries < MAX_TRIES:
-            if tries > 0:
-                Logger.Log("Re-attempting to connect to SSH.", logging.INFO)
-            try:
-                tunnel = sshtunnel.SSHTunnelForwarder(
-                    (ssh.host, ssh.port), ssh_username=ssh.user, ssh_password=ssh.pword,
-                    remote_bind_address=(sql.host, sql.port), logger=Logger.std_logger
-                )
-                tunnel.start()
-                connected_ssh = True
-                Logger.Log(f"Connected to SSH at {ssh.host}:{ssh.port}, {ssh.user}", logging.DEBUG)
-            except Exception as err:
-                msg = f"Could not connect to the SSH: {type(err)} {str(err)}"
-                Logger.Log(msg, logging.ERROR)
-                Logger.Print(msg, logging.ERROR)
-                traceback.print_tb(err.__traceback__)
-                tries = tries + 1
-        if connected_ssh == True and tunnel is not None:
+        tunnel = SQL._startSSHTunnel(sql=sql, ssh=ssh)
+        if tunnel is not None:
             # Then, connect to MySQL
             try:
                 db_conn = connection.MySQLConnection(host     = sql.host,    port    = tunnel.local_bind_port,
@@ -158,6 +143,41 @@ class SQL:
         else:
             return (None, None)
 
+    ## Function to open an SSH tunnel to the MySQL server, retrying a few times if the connection fails.
+    @staticmethod
+    def _startSSHTunnel(sql:SQLLogin, ssh:SSHLogin) -> Optional[sshtunnel.SSHTunnelForwarder]:
+        """Function to open an SSH tunnel to the MySQL server, retrying a few times if the connection fails.
+
+        :param sql: A SQLLogin object with the host and port of the MySQL server, as seen from the SSH host.
+        :type sql: SQLLogin
+        :param ssh: An SSHLogin object with the data needed to log into the SSH host.
+        :type ssh: SSHLogin
+        :return: The started tunnel if successful, otherwise None.
+        :rtype: Optional[sshtunnel.SSHTunnelForwarder]
+        """
+        MAX_TRIES : int = 5
+        tries : int = 0
+
+        while tries < MAX_TRIES:
+            if tries > 0:
+                Logger.Log("Re-attempting to connect to SSH.", logging.INFO)
+            try:
+                tunnel = sshtunnel.SSHTunnelForwarder(
+                    (ssh.host, ssh.port), ssh_username=ssh.user, ssh_password=ssh.pword,
+                    remote_bind_address=(sql.host, sql.port), logger=Logger.std_logger
+                )
+                tunnel.start()
+                Logger.Log(f"Connected to SSH at {ssh.host}:{ssh.port}, {ssh.user}", logging.DEBUG)
+                return tunnel
+            except Exception as err:
+                msg = f"Could not connect to the SSH: {type(err)} {str(err)}"
+                Logger.Log(msg, logging.ERROR)
+                Logger.Print(msg, logging.ERROR)
+                traceback.print_tb(err.__traceback__)
+                tries = tries + 1
+
+        return None
+
     @staticmethod
     def disconnectMySQL(db:Optional[connection.MySQLConnection], tunnel:Optional[sshtunnel.SSHTunnelForwarder]=None) -> None:
         if db is not None:
@@ -205,20 +225,34 @@ class SQL:
         :return: A collection of all rows from the selection, if fetch_results is true, otherwise None.
         :rtype: Optional[List[Tuple]]
         """
+        query = SQL.BuildSELECT(db_name=db_name, table=table, columns=columns, filter=filter, sort_columns=sort_columns,
+                                sort_direction=sort_direction, grouping=grouping, distinct=distinct, offset=offset, limit=limit)
+
+        return SQL.Query(cursor=cursor, query=query, params=None, fetch_results=fetch_results)
+
+    # Function to build the text of a SELECT statement, without executing it.
+    @staticmethod
+    def BuildSELECT(db_name       :str,                        table          : str,
+                    columns       :List[str]           = [],    filter         : Optional[str] = None,
+                    sort_columns  :Optional[List[str]] = None,  sort_direction : str           = "ASC", grouping : Optional[str] = None,
+                    distinct      :bool                = False, offset         : int           = 0,     limit    : int           = -1) -> str:
+        """Function to build the text of a SELECT statement, without executing it.
+        Takes the same parameters as SELECT, other than the cursor and fetch_results.
+
+        :return: The SELECT statement
+        :rtype: str
+        """
         d          = "DISTINCT" if distinct else ""
         cols = ",".join(columns) if columns is not None and len(columns) > 0 else "*"
         sort_cols  = ",".join(sort_columns) if sort_columns is not None and len(sort_columns) > 0 else None
         table_path = db_name + "." + str(table)
-        params = []
 
         sel_clause = f"SELECT {d} {cols} FROM {table_path}"
         where_clause = "" if filter    is None else f"WHERE {filter}"
         group_clause = "" if grouping  is None else f"GROUP BY {grouping}"
         sort_clause  = "" if sort_cols is None else f"ORDER BY {sort_cols} {sort_direction} "
         lim_clause   = "" if limit < 0         else f"LIMIT {str(max(offset, 0))}, {str(limit)}" # don't use a negative for offset
-        query = f"{sel_clause} {where_clause} {group_clause} {sort_clause} {lim_clause};"
-
-        return SQL.Query(cursor=cursor, query=query, params=None, fetch_results=fetch_results)
+        return f"{sel_clause} {where_clause} {group_clause} {sort_clause} {lim_clause};"
 
     @staticmethod
     def Query(cursor:cursor.MySQLCursor, query:str, params:Optional[Tuple], fetch_results: bool = True) -> Optional[List[Tuple]]:
@@ -236,6 +270,233 @@ class SQL:
             Logger.Log(f"Query fetch completed, total query time:    {time_delta} to get {len(result) if result is not None else 0:d} rows", logging.DEBUG)
         return result
 
+## @class MySQLConnectionPool
+#  One SSH tunnel, if the config has SSH settings, carrying a pool of MySQL connections.
+#  Every MySQLInterface in the process with the same connection settings shares the same pool, so parallel readers, parallel days
+#  and the sync scheduler borrow already-open connections instead of each opening a tunnel and connection of their own.
+#  At most pool_size connections are open at once, counting both those borrowed and those idle in the pool. Once they're all borrowed,
+#  Acquire waits up to timeout seconds for one to be given back, so the pool should hold enough for every reader that runs at once.
+#  Idle connections are pinged before they're handed out, and replaced if they have dropped, e.g. after a net_read_timeout.
+#  If the tunnel itself has gone down, it is restarted before any new connection is made.
+class MySQLConnectionPool:
+
+    _pools     : Dict[Tuple, "MySQLConnectionPool"] = {}
+    _poolsLock : threading.Lock = threading.Lock()
+
+    def __init__(self, db_settings:Dict[str,Any], ssh_settings:Optional[Dict[str,Any]], pool_size:int, timeout:float = 300):
+        self._sql_login = SQLLogin(host=db_settings['DB_HOST'], port=int(db_settings['DB_PORT']), db_name=db_settings['DB_NAME'],
+                                   user=db_settings['DB_USER'], pword=db_settings['DB_PW'])
+        self._ssh_login : Optional[SSHLogin] = None
+        if ssh_settings is not None and ssh_settings['SSH_HOST'] != "" and ssh_settings['SSH_USER'] != "" and ssh_settings['SSH_PW'] != "":
+            self._ssh_login = SSHLogin(host=ssh_settings['SSH_HOST'], port=ssh_settings['SSH_PORT'], user=ssh_settings['SSH_USER'], pword=ssh_settings['SSH_PW'])
+
+        self._pool_size : int = max(1, pool_size)
+        self._timeout   : float = timeout
+        self._num_open  : int = 0 # Connections borrowed from the pool or idle in it
+        self._idle      : List[connection.MySQLConnection] = []
+        self._tunnel    : Optional[sshtunnel.SSHTunnelForwarder] = None
+        self._lock      : threading.Lock = threading.Lock()
+        self._available : threading.Condition = threading.Condition(self._lock)
+
+    # Get the pool shared by every interface with the same connection settings as the given config, creating it if needed
+    @staticmethod
+    def ForConfig(config:Dict[str,Any]) -> "MySQLConnectionPool":
+        _sql_cfg = config["MYSQL_CONFIG"]
+        _ssh_cfg = _sql_cfg.get("SSH_CONFIG")
+        key = (_sql_cfg['DB_HOST'], _sql_cfg['DB_PORT'], _sql_cfg['DB_NAME'], _sql_cfg['DB_USER'],
+               _ssh_cfg['SSH_HOST'] if _ssh_cfg else None, _ssh_cfg['SSH_PORT'] if _ssh_cfg else None, _ssh_cfg['SSH_USER'] if _ssh_cfg else None)
+
+        with MySQLConnectionPool._poolsLock:
+            pool = MySQLConnectionPool._pools.get(key)
+            if pool is None:
+                pool = MySQLConnectionPool(_sql_cfg, _ssh_cfg, int(_sql_cfg.get("POOL_SIZE", 0)), float(_sql_cfg.get("POOL_TIMEOUT_SECONDS", 300)))
+                MySQLConnectionPool._pools[key] = pool
+            return pool
+
+    # The most pooled connections a run can hold at once: one for each day being synced, plus its chunk readers' own when reading in chunks
+    @staticmethod
+    def ConnectionsNeeded(config:Dict[str,Any], numParallelDays:int) -> int:
+        _sync_config = config.get("SYNC_CONFIG", {})
+        numReaders = int(_sync_config.get("READER_CONNECTIONS", 2)) if int(_sync_config.get("READ_CHUNK_ID_SPAN", 0)) > 0 else 0
+        return max(1, numParallelDays) * (1 + max(0, numReaders))
+
+    # Warn if the config's POOL_SIZE is too small for the given number of days synced at once, since readers would wait on each other
+    @staticmethod
+    def CheckPoolSize(config:Dict[str,Any], numParallelDays:int) -> None:
+        poolSize = int(config["MYSQL_CONFIG"].get("POOL_SIZE", 0))
+        numNeeded = MySQLConnectionPool.ConnectionsNeeded(config, numParallelDays)
+        if 0 < poolSize < numNeeded:
+            Logger.Log(f"MYSQL_CONFIG's POOL_SIZE of {poolSize} is less than the {numNeeded} connections needed to sync {numParallelDays} days at once, "\
+                       f"so days will wait for connections and may time out after POOL_TIMEOUT_SECONDS", logging.WARNING)
+
+    # Close every pool in the process, along with their tunnels
+    @staticmethod
+    def CloseAll() -> None:
+        with MySQLConnectionPool._poolsLock:
+            pools = list(MySQLConnectionPool._pools.values())
+            MySQLConnectionPool._pools = {}
+        for pool in pools:
+            pool.Close()
+
+    def Acquire(self) -> Optional[connection.MySQLConnection]:
+        """Borrow a connection from the pool, or open a new one if there are no healthy idle connections.
+        If the pool already has pool_size connections open, this waits for one of them to be given back.
+
+        :return: An open connection, or None if a new connection was needed and couldn't be made, or none was given back in time
+        :rtype: Optional[connection.MySQLConnection]
+        """
+        while True:
+            with self._available:
+                if len(self._idle) == 0 and self._num_open >= self._pool_size:
+                    Logger.Log(f"All {self._pool_size} pooled MySQL connections are in use, waiting for one to be returned", logging.DEBUG)
+                    if not self._available.wait_for(lambda: len(self._idle) > 0 or self._num_open < self._pool_size, self._timeout):
+                        Logger.Log(f"Timed out after {self._timeout} seconds waiting for one of the {self._pool_size} pooled MySQL connections, "\
+                                   "the MYSQL_CONFIG's POOL_SIZE may be too small for the number of readers", logging.ERROR)
+                        return None
+                if len(self._idle) == 0:
+                    # Hold the new connection's place in the pool while it's opened
+                    self._num_open += 1
+                    break
+                db_conn = self._idle.pop()
+
+            if MySQLConnectionPool._isHealthy(db_conn):
+                Logger.Log("Reusing pooled MySQL connection", logging.DEBUG)
+                return db_conn
+
+            Logger.Log("Discarding pooled MySQL connection that failed its health check", logging.INFO)
+            self._discardOpen(db_conn)
+
+        db_conn = None
+        try:
+            db_conn = self._connect()
+        finally:
+            if db_conn is None:
+                self._discardOpen(None)
+        return db_conn
+
+    def Release(self, db_conn:Optional[connection.MySQLConnection]) -> None:
+        """Return a borrowed connection to the pool, or close it if the connection can't be reused.
+
+        :param db_conn: The connection, as returned by Acquire
+        :type db_conn: Optional[connection.MySQLConnection]
+        """
+        if db_conn is None:
+            return
+
+        # A connection left part way through an unbuffered result, e.g. by a failed read, can't run another query
+        reusable = False
+        try:
+            if not db_conn.unread_result:
+                if db_conn.in_transaction:
+                    db_conn.rollback()
+                reusable = True
+        except (errors.Error, OSError):
+            pass
+
+        if reusable:
+            with self._available:
+                self._idle.append(db_conn)
+                self._available.notify()
+                return
+
+        self._discardOpen(db_conn)
+
+    def Close(self) -> None:
+        with self._available:
+            idle = self._idle
+            self._idle = []
+            self._num_open -= len(idle)
+            tunnel = self._tunnel
+            self._tunnel = None
+            self._available.notify_all()
+
+        for db_conn in idle:
+            MySQLConnectionPool._discard(db_conn)
+        if tunnel is not None:
+            tunnel.stop()
+            Logger.Log("Stopped pooled MySQL tunnel connection", logging.DEBUG)
+
+    def _connect(self) -> Optional[connection.MySQLConnection]:
+        port = self._sql_login.port
+
+        if self._ssh_login is not None:
+            # Only one thread at a time checks the tunnel, so a dropped tunnel is restarted once
+            with self._lock:
+                if self._tunnel is not None and not self._tunnel.is_active:
+                    Logger.Log("Pooled MySQL tunnel is down, restarting it", logging.WARNING)
+                    try:
+                        self._tunnel.stop()
+                    except Exception:
+                        pass
+                    self._tunnel = None
+                if self._tunnel is None:
+                    self._tunnel = SQL._startSSHTunnel(sql=self._sql_login, ssh=self._ssh_login)
+                    if self._tunnel is None:
+                        return None
+                port = self._tunnel.local_bind_port
+
+        return SQL._connectToMySQL(login=SQLLogin(host=self._sql_login.host, port=port, db_name=self._sql_login.db_name,
+                                                  user=self._sql_login.user, pword=self._sql_login.pword))
+
+    # Close a connection that was counted as open, making room in the pool for another
+    def _discardOpen(self, db_conn:Optional[connection.MySQLConnection]) -> None:
+        if db_conn is not None:
+            MySQLConnectionPool._discard(db_conn)
+        with self._available:
+            self._num_open -= 1
+            self._available.notify()
+
+    @staticmethod
+    def _isHealthy(db_conn:connection.MySQLConnection) -> bool:
+        try:
+            db_conn.ping(reconnect=False)
+            return True
+        except (errors.Error, OSError):
+            return False
+
+    @staticmethod
+    def _discard(db_conn:connection.MySQLConnection) -> None:
+        try:
+            db_conn.close()
+        except (errors.Error, OSError):
+            pass
+
+## @class LogEntryStream
+#  Streams the rows of an open, unbuffered query in batches of tuples.
+#  Rather than building a dictionary for every row, a single map from column name to tuple index is shared across all rows.
+#  If given the cursor's connection, closing the stream part way through reads and drops the rest of the result,
+#  so the connection can run another query, e.g. the next day on the same worker after this one failed.
+class LogEntryStream:
+
+    def __init__(self, db_cursor:cursor.MySQLCursor, batch_size:int = 1000, db_conn:Optional[connection.MySQLConnection] = None):
+        self._db_cursor  : cursor.MySQLCursor = db_cursor
+        self._db_conn    : Optional[connection.MySQLConnection] = db_conn
+        self.batch_size  : int = max(1, batch_size)
+        self.columnIndex : Dict[str, int] = {name : i for i, name in enumerate(db_cursor.column_names)}
+
+    def __iter__(self) -> Iterator[List[Tuple]]:
+        return self
+
+    def __next__(self) -> List[Tuple]:
+        rows = self._db_cursor.fetchmany(self.batch_size)
+        if not rows:
+            raise StopIteration
+        return rows
+
+    def Close(self) -> None:
+        if self._db_conn is not None:
+            try:
+                if self._db_conn.unread_result:
+                    Logger.Log("Discarding the unread rows of an abandoned log entry query", logging.INFO)
+                    self._db_conn.consume_results()
+            except Exception as err:
+                Logger.Log(f"Error while discarding unread log entry rows: {type(err)} {str(err)}", logging.WARNING)
+        try:
+            self._db_cursor.close()
+        except Exception as err:
+            # An unbuffered cursor that was abandoned part way through can complain about unread results
+            Logger.Log(f"Error while closing log entry cursor: {type(err)} {str(err)}", logging.WARNING)
+
 class MySQLInterface(DataInterface):
 
     # *** BUILT-INS ***
@@ -243,6 +504,8 @@ class MySQLInterface(DataInterface):
         self._tunnel    : Optional[sshtunnel.SSHTunnelForwarder] = None
         self._db        : Optional[connection.MySQLConnection] = None
         self._db_cursor : Optional[cursor.MySQLCursor] = None
+        # With a POOL_SIZE, connections are borrowed from the process's shared pool rather than opened for this interface alone
+        self._pool      : Optional[MySQLConnectionPool] = MySQLConnectionPool.ForConfig(config) if int(config["MYSQL_CONFIG"].get("POOL_SIZE", 0)) > 0 else None
         super().__init__(config=config)
         self.Open()
 
@@ -255,9 +518,15 @@ class MySQLInterface(DataInterface):
         if not self._is_open:
             start = datetime.now()
             
-            _sql_cfg = self._config["MYSQL_CONFIG"]
-            _ssh_cfg = self._config["MYSQL_CONFIG"]["SSH_CONFIG"]
-            self._tunnel, self._db = SQL.ConnectDB(db_settings=_sql_cfg, ssh_settings=_ssh_cfg)
+            if self._pool is not None:
+                self._tunnel, self._db = None, self._pool.Acquire()
+                if self._db is None:
+                    # Rather than carrying on without a connection, and failing on the first query
+                    raise errors.InterfaceError("Unable to get a connection from the MySQL pool, check the MYSQL_CONFIG's POOL_SIZE and POOL_TIMEOUT_SECONDS")
+            else:
+                _sql_cfg = self._config["MYSQL_CONFIG"]
+                _ssh_cfg = self._config["MYSQL_CONFIG"]["SSH_CONFIG"]
+                self._tunnel, self._db = SQL.ConnectDB(db_settings=_sql_cfg, ssh_settings=_ssh_cfg)
             if self._db is not None:
                 self._db_cursor = self._db.cursor()
                 self._is_open = True
@@ -266,13 +535,19 @@ class MySQLInterface(DataInterface):
                 return True
             else:
                 Logger.Log(f"Unable to open MySQL interface.", logging.ERROR)
-                SQL.disconnectMySQL(tunnel=self._tunnel, db=self._db)
+                if self._pool is None:
+                    SQL.disconnectMySQL(tunnel=self._tunnel, db=self._db)
                 return False
         else:
             return True
 
     def _close(self) -> bool:
-        if SQL is not None:
+        if self._pool is not None:
+            self._pool.Release(self._db)
+            self._db = None
+            Logger.Log("Returned connection to the MySQL pool.", logging.DEBUG)
+            self._is_open = False
+        elif SQL is not None:
             SQL.disconnectMySQL(tunnel=self._tunnel, db=self._db)
             Logger.Log("Closed connection to MySQL.", logging.DEBUG)
             self._is_open = False
@@ -285,7 +560,11 @@ class MySQLInterface(DataInterface):
     def TestConnection(settings:Dict[str,Any]) -> None:
         
         Logger.Log("Testing connection to MySQL", logging.INFO)
-        mysqlInterface = MySQLInterface(settings)
+        try:
+            mysqlInterface = MySQLInterface(settings)
+        except errors.Error as err:
+            Logger.Log(f"MySQL connection unsuccessful: {str(err)}", logging.ERROR)
+            sys.exit(1)
 
         # If connection was successful
         if not mysqlInterface._is_open:
@@ -295,7 +574,46 @@ class MySQLInterface(DataInterface):
         Logger.Log("MySQL connection successful", logging.INFO)
         sys.exit(0)
 
+    # Get the list of columns selected for each log entry of the given format, in the order they appear in each row
+    @staticmethod
+    def GetLogEntryColumns(rowFormatType: SourceDataRowFormatType) -> List[str]:
+
+        if rowFormatType == SourceDataRowFormatType.LOGGER_LOG:
+            raise Exception("The logger.log data format is not yet supported as it does not have a synced column, and has not been fully mapped to the BigQuery schema")
+            return ['id','app_id','app_id_fast','app_version','session_id','persistent_session_id',
+            'player_id','level','event','event_custom','event_data_simple','event_data_complex','client_time',
+            'client_time_ms','server_time','remote_addr','req_id','session_n','http_user_agent']
+        elif rowFormatType == SourceDataRowFormatType.OPEN_GAME_DATA:
+            return ['id','session_id','user_id','user_data','client_time','client_time_ms','client_offset',
+            'server_time','event_name','event_data','event_source','game_state','app_version','app_branch',
+            'log_version','event_sequence_index','remote_addr','http_user_agent']
+        else:
+            raise Exception("Unsupported source row format type: " + str(rowFormatType))
+
+    # Get the latest server_time we're allowed to sync, given the most recent server_time in the log table
+    @staticmethod
+    def GetMaximumDatetimeToSync(maxServerTime: Optional[datetime]) -> datetime:
+
+        # By default assume we aren't able to sync logs newer than two days ago, since server_time isn't 
+        # guaranteed to be in the same time zone or in UTC it's possible that new entries are being logged
+        # for "yesterday" while this script is running.
+        maximumDateToSync = date.today() - timedelta(days=2) # two days ago
+
+        # If we have a maximum server_time entry for this game
+        if maxServerTime is not None:
+            # if the max server_time entry is today
+            if maxServerTime.date() == date.today():
+                # We'll allow syncing of entries through the end of yesterday
+                maximumDateToSync = date.today() - timedelta(days=1)
+
+        # Append 23:59:59 time component to the date
+        return datetime.combine(maximumDateToSync, time.max)
+
     # *** PUBLIC METHODS ***
+    # Point this interface's queries at another log table in the same database, keeping the current connection open
+    def SetTable(self, dbTable: str) -> None:
+        self._config = {**self._config, "MYSQL_CONFIG": {**self._config["MYSQL_CONFIG"], "DB_TABLE": dbTable}}
+
     # Get the value of a given variable for our current session
     def GetSessionVariable(self, variableName) -> str:
 
@@ -367,35 +685,49 @@ class MySQLInterface(DataInterface):
         self._db.commit() # Required if autcommit is off for the session
         self._db_cursor.close()
 
-    # Get an open cursor for all the log entries for the given date.
-    # The result rows will be a dictionary keyed by column name
-    def GetLogEntriesByDate(self, dateToSync: datetime, rowFormatType: SourceDataRowFormatType) -> cursor.MySQLCursor:
+    # Mark exactly the log entries with the given ids as synced, e.g. the ids that were exported to BigQuery.
+    # Each interval of ids is updated by primary key in chunks of at most maxIdsPerUpdate ids, each committed on its own,
+    # so no single UPDATE holds its row locks for long. Returns the number of log entries marked.
+    def MarkLogEntriesAsSyncedByIds(self, ids: IdRangeSet, maxIdsPerUpdate: int = 10000) -> int:
+
+        # Create new cursor for executing a prepared statement
+        self._db_cursor = self._db.cursor(prepared=True)
+
+        updateQuery = "UPDATE `" + self._config["MYSQL_CONFIG"]["DB_NAME"] + "`.`" + self._config["MYSQL_CONFIG"]["DB_TABLE"] + "`"\
+        + " SET `synced` = %s WHERE `id` BETWEEN %s AND %s AND `synced` = %s"
+
+        numMarked = 0
+
+        for startId, endId in ids.Intervals:
+            for chunkStartId, chunkEndId in ChunkedLogEntryStream.SplitIdRange(startId, endId, maxIdsPerUpdate):
+                self._db_cursor.execute(updateQuery, (1, chunkStartId, chunkEndId, 0))
+                self._db.commit() # Required if autcommit is off for the session
+                numMarked += self._db_cursor.rowcount
+
+        self._db_cursor.close()
+
+        return numMarked
+
+    # Get a stream of all the unsynced log entries for the given date.
+    # The result rows are tuples, read from the server in batches of fetchBatchSize rows; use the stream's columnIndex to look up columns by name
+    def GetLogEntriesByDate(self, dateToSync: datetime, rowFormatType: SourceDataRowFormatType, fetchBatchSize: int = 1000) -> LogEntryStream:
         
         # Get the datetime for the start and end of the day
         dateToSyncStart = datetime.combine(dateToSync, time.min)
         dateToSyncEnd = datetime.combine(dateToSync, time.max)
 
         #whereClause =  "server_time >= '" + dateToSync.strftime('%Y-%m-%d') + " 00:00:00.000000' AND server_time <= '" + dateToSync.strftime('%Y-%m-%d') + " 23:59:59.999999'"
-        whereClause =  "`server_time` BETWEEN '" + dateToSyncStart.isoformat() + "' AND '" + dateToSyncEnd.isoformat() + "'"
+        whereClause =  "`synced` = 0 AND `server_time` BETWEEN '" + dateToSyncStart.isoformat() + "' AND '" + dateToSyncEnd.isoformat() + "'"
 
         offset = 0
 
         # Note, if we are providing a non-zero offset a positive limit is required here. MySQL can't do OFFSET only with it's LIMIT clause
         limitNumberOfRecordsToCopy = -1
         
-        if rowFormatType == SourceDataRowFormatType.LOGGER_LOG:
-            raise Exception("The logger.log data format is not yet supported as it does not have a synced column, and has not been fully mapped to the BigQuery schema")
-            selectColumns = ['id','app_id','app_id_fast','app_version','session_id','persistent_session_id',
-            'player_id','level','event','event_custom','event_data_simple','event_data_complex','client_time',
-            'client_time_ms','server_time','remote_addr','req_id','session_n','http_user_agent']
-        elif rowFormatType == SourceDataRowFormatType.OPEN_GAME_DATA:
-            selectColumns = ['id','session_id','user_id','user_data','client_time','client_time_ms','client_offset',
-            'server_time','event_name','event_data','event_source','game_state','app_version','app_branch',
-            'log_version','event_sequence_index','remote_addr','http_user_agent']
-        else:
-            raise Exception("Unsupported source row format type: " + str(rowFormatType))
+        selectColumns = MySQLInterface.GetLogEntryColumns(rowFormatType)
 
-        self._db_cursor = self._db.cursor(dictionary=True)
+        # An unbuffered cursor streams rows from the server as we fetch them, rather than holding the whole day in memory
+        self._db_cursor = self._db.cursor(buffered=False)
 
         # Execute a query for the cursor, but don't return the results
         SQL.SELECT(self._db_cursor,
@@ -411,39 +743,83 @@ class MySQLInterface(DataInterface):
                     limitNumberOfRecordsToCopy, # Limit
                     False) #return results
 
-        return self._db_cursor
+        return LogEntryStream(self._db_cursor, fetchBatchSize, self._db)
 
-    # Get the date of the oldest log entry we're allowed to sync
-    def GetOldestUnmigratedDate(self) -> Optional[datetime.date]:
+    # Get the smallest and largest id of the unsynced log entries for the given date, or None if there are none
+    def GetLogEntryIdRangeByDate(self, dateToSync: datetime) -> Optional[Tuple[int, int]]:
 
-        # Let's find the most recent server_time entry in the database
-        selectColumns = ["MAX(server_time)"]
-        whereClause = "server_time != '0000-00-00 00:00:00'"
+        # Get the datetime for the start and end of the day
+        dateToSyncStart = datetime.combine(dateToSync, time.min)
+        dateToSyncEnd = datetime.combine(dateToSync, time.max)
+
+        whereClause =  "`synced` = 0 AND `server_time` BETWEEN '" + dateToSyncStart.isoformat() + "' AND '" + dateToSyncEnd.isoformat() + "'"
 
         self._db_cursor = self._db.cursor()
-        
+
         result = SQL.SELECT(self._db_cursor,
                     self._config["MYSQL_CONFIG"]["DB_NAME"], # Database
                     self._config["MYSQL_CONFIG"]["DB_TABLE"], # Table
-                    selectColumns,
-                    whereClause)
+                    ["MIN(id)", "MAX(id)"], # Select columns
+                    whereClause) # Filter
 
         self._db_cursor.close()
 
-        # By default assume we aren't able to sync logs newer than two days ago, since server_time isn't 
-        # guaranteed to be in the same time zone or in UTC it's possible that new entries are being logged
-        # for "yesterday" while this script is running.
-        maximumDateToSync = date.today() - timedelta(days=2) # two days ago
+        if result is None or result[0][0] is None:
+            return None
 
-        # If we have a maximum server_time entry for this game
-        if result is not None and result[0][0] is not None:
-            # if the max server_time entry is today
-            if result[0][0].date() == date.today():
-                # We'll allow syncing of entries through the end of yesterday
-                maximumDateToSync = date.today() - timedelta(days=1)
+        return (int(result[0][0]), int(result[0][1]))
 
-        # Append 23:59:59 time component to the date
-        maximumDatetimeToSync = datetime.combine(maximumDateToSync, time.max)
+    # Get a stream of the unsynced log entries for the given date whose ids fall in the given range (inclusive), in id order.
+    # Reading the day as a series of id ranges lets each range be read on its own connection, and retried on its own.
+    def GetLogEntriesByIdRange(self, dateToSync: datetime, rowFormatType: SourceDataRowFormatType, startId: int, endId: int, fetchBatchSize: int = 1000) -> LogEntryStream:
+
+        # Get the datetime for the start and end of the day
+        dateToSyncStart = datetime.combine(dateToSync, time.min)
+        dateToSyncEnd = datetime.combine(dateToSync, time.max)
+
+        whereClause =  "`id` BETWEEN " + str(int(startId)) + " AND " + str(int(endId))\
+                    + " AND `synced` = 0 AND `server_time` BETWEEN '" + dateToSyncStart.isoformat() + "' AND '" + dateToSyncEnd.isoformat() + "'"
+
+        selectColumns = MySQLInterface.GetLogEntryColumns(rowFormatType)
+
+        # An unbuffered cursor streams rows from the server as we fetch them, rather than holding the whole range in memory
+        self._db_cursor = self._db.cursor(buffered=False)
+
+        # Execute a query for the cursor, but don't return the results
+        SQL.SELECT(self._db_cursor,
+                    self._config["MYSQL_CONFIG"]["DB_NAME"], # Database
+                    self._config["MYSQL_CONFIG"]["DB_TABLE"], # Table
+                    selectColumns, # Select columns
+                    whereClause, # Filter
+                    ["id"], # Sort
+                    'ASC', # Order
+                    None, # Grouping
+                    False, # Distinct
+                    0, # Offset
+                    -1, # Limit
+                    False) #return results
+
+        return LogEntryStream(self._db_cursor, fetchBatchSize, self._db)
+
+    # Get all the unsynced log entries for the given date with the given ids, e.g. to send a request recorded in the sync journal again
+    def GetLogEntriesByIds(self, dateToSync: datetime, rowFormatType: SourceDataRowFormatType, ids: IdRangeSet, fetchBatchSize: int = 1000) -> List[Tuple]:
+
+        rows : List[Tuple] = []
+
+        for startId, endId in ids.Intervals:
+            logEntries = self.GetLogEntriesByIdRange(dateToSync, rowFormatType, startId, endId, fetchBatchSize)
+            try:
+                for batch in logEntries:
+                    rows += batch
+            finally:
+                logEntries.Close()
+
+        return rows
+
+    # Get the date of the oldest log entry we're allowed to sync
+    def GetOldestUnmigratedDate(self) -> Optional[datetime.date]:
+
+        maximumDatetimeToSync = self._getMaximumDatetimeToSync()
 
         # Find the minimum server_time of entries that haven't been synced
         selectColumns = ["MIN(server_time)"]
@@ -465,8 +841,187 @@ class MySQLInterface(DataInterface):
 
         return result[0][0].date()
 
+    # Get every date with log entries we're allowed to sync, along with its number of unsynced entries, oldest date first.
+    # A single GROUP BY query replaces repeated MIN(server_time) scans, so callers can plan a whole run up front.
+    def GetUnmigratedDateCounts(self, maxDates:int = -1) -> List[Tuple[date, int]]:
+
+        maximumDatetimeToSync = self._getMaximumDatetimeToSync()
+
+        selectColumns = ["DATE(server_time)", "COUNT(*)"]
+        whereClause = "synced = 0 AND server_time != '0000-00-00 00:00:00' AND server_time <= '" + maximumDatetimeToSync.isoformat() + "'"
+
+        self._db_cursor = self._db.cursor()
+
+        result = SQL.SELECT(self._db_cursor,
+                    self._config["MYSQL_CONFIG"]["DB_NAME"], # Database
+                    self._config["MYSQL_CONFIG"]["DB_TABLE"], # Table
+                    selectColumns, # Select columns
+                    whereClause, # Filter
+                    ["DATE(server_time)"], # Sort columns
+                    "ASC", # Order
+                    "DATE(server_time)", # Grouping
+                    False, # Distinct
+                    0, # Offset
+                    maxDates) # Limit
+
+        self._db_cursor.close()
+
+        return [(row[0], int(row[1])) for row in result] if result is not None else []
+
     # *** PROPERTIES ***
 
     # *** PRIVATE STATICS ***
 
-    # *** PRIVATE METHODS ***
\ No newline at end of file
+    # *** PRIVATE METHODS ***
+
+    # Get the latest server_time we're allowed to sync
+    def _getMaximumDatetimeToSync(self) -> datetime:
+
+        # Let's find the most recent server_time entry in the database
+        selectColumns = ["MAX(server_time)"]
+        whereClause = "server_time != '0000-00-00 00:00:00'"
+
+        self._db_cursor = self._db.cursor()
+        
+        result = SQL.SELECT(self._db_cursor,
+                    self._config["MYSQL_CONFIG"]["DB_NAME"], # Database
+                    self._config["MYSQL_CONFIG"]["DB_TABLE"], # Table
+                    selectColumns,
+                    whereClause)
+
+        self._db_cursor.close()
+
+        return MySQLInterface.GetMaximumDatetimeToSync(result[0][0] if result is not None else None)
+
+
+## @class ChunkedLogEntryStream
+#  Streams one day's log entries as a series of id-range chunks, read through several MySQL connections in parallel.
+#  Each chunk is read in id order, so if its connection drops part way through, the chunk is retried from just after
+#  the last row already read, instead of re-reading the whole day.
+#  Like LogEntryStream, iterating yields batches of tuple rows, and columnIndex maps column names to tuple positions.
+#  Batches from different chunks arrive interleaved, in whatever order the connections deliver them.
+class ChunkedLogEntryStream:
+
+    def __init__(self, config:Dict[str,Any], dateToSync:date, rowFormatType:SourceDataRowFormatType, idRanges:List[Tuple[int, int]],
+                 numConnections:int = 2, fetchBatchSize:int = 1000, maxRetries:int = 5):
+        self._config         = config
+        self._dateToSync     = dateToSync
+        self._rowFormatType  = rowFormatType
+        self._numConnections : int = max(1, min(numConnections, len(idRanges)))
+        self.batch_size      : int = max(1, fetchBatchSize) # Can be changed while the stream is read, and applies from each chunk's next fetch
+        self._maxRetries     : int = maxRetries
+
+        self.columnIndex : Dict[str, int] = {name : i for i, name in enumerate(MySQLInterface.GetLogEntryColumns(rowFormatType))}
+
+        self._chunkQueue : queue.Queue = queue.Queue()
+        for idRange in idRanges:
+            self._chunkQueue.put(idRange)
+
+        self._batchQueue : queue.Queue = queue.Queue(maxsize=2 * self._numConnections)
+        self._stopEvent  : threading.Event = threading.Event()
+        self._error      : Optional[BaseException] = None
+        self._readers    : List[threading.Thread] = []
+
+        # Total number of times a chunk was retried after its connection dropped, across all readers
+        self.numRetries   : int = 0
+        self._retriesLock : threading.Lock = threading.Lock()
+
+    @property
+    def NumQueuedBatches(self) -> int:
+        return self._batchQueue.qsize()
+
+    # Split the inclusive id range [minId, maxId] into consecutive chunks covering at most idSpan ids each
+    @staticmethod
+    def SplitIdRange(minId:int, maxId:int, idSpan:int) -> List[Tuple[int, int]]:
+        idSpan = max(1, idSpan)
+        return [(startId, min(startId + idSpan - 1, maxId)) for startId in range(minId, maxId + 1, idSpan)]
+
+    def __iter__(self) -> Iterator[List[Tuple]]:
+        self._readers = [threading.Thread(target=self._runReader, name=f"LogEntryChunkReader{i}", daemon=True) for i in range(self._numConnections)]
+        for reader in self._readers:
+            reader.start()
+
+        numReadersDone = 0
+        while numReadersDone < self._numConnections:
+            try:
+                batch = self._batchQueue.get(timeout=0.5)
+            except queue.Empty:
+                if self._stopEvent.is_set():
+                    break
+                continue
+            if batch is None:
+                numReadersDone += 1
+            else:
+                yield batch
+
+        if self._error is not None:
+            raise self._error
+
+    def Close(self) -> None:
+        self._stopEvent.set()
+        for reader in self._readers:
+            reader.join()
+
+    def _put(self, item:Any) -> bool:
+        while not self._stopEvent.is_set():
+            try:
+                self._batchQueue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _runReader(self) -> None:
+        mysqlInterface : Optional[MySQLInterface] = None
+        try:
+            mysqlInterface = MySQLInterface(self._config)
+            mysqlInterface.SetSessionVariables()
+
+            while not self._stopEvent.is_set():
+                try:
+                    startId, endId = self._chunkQueue.get_nowait()
+                except queue.Empty:
+                    break
+                self._readChunk(mysqlInterface, startId, endId)
+        except BaseException as err:
+            Logger.Log(f"Reading log entries by id range failed: {type(err)} {str(err)}", logging.ERROR)
+            if self._error is None:
+                self._error = err
+            self._stopEvent.set()
+        finally:
+            if mysqlInterface is not None:
+                mysqlInterface.Close()
+            self._put(None)
+
+    def _readChunk(self, mysqlInterface:MySQLInterface, startId:int, endId:int) -> None:
+        idIndex = self.columnIndex['id']
+        nextId = startId
+        numRetries = 0
+
+        while True:
+            logEntries : Optional[LogEntryStream] = None
+            try:
+                if not mysqlInterface.IsOpen():
+                    if not mysqlInterface.Open():
+                        raise errors.InterfaceError("Unable to reopen MySQL connection")
+                    mysqlInterface.SetSessionVariables()
+
+                logEntries = mysqlInterface.GetLogEntriesByIdRange(self._dateToSync, self._rowFormatType, nextId, endId, self.batch_size)
+                for batch in logEntries:
+                    if not self._put(batch):
+                        return
+                    nextId = batch[-1][idIndex] + 1
+                    logEntries.batch_size = self.batch_size
+                logEntries.Close()
+                return
+            except (errors.Error, OSError) as err:
+                if logEntries is not None:
+                    logEntries.Close()
+                if numRetries >= self._maxRetries:
+                    raise
+                numRetries += 1
+                with self._retriesLock:
+                    self.numRetries += 1
+                Logger.Log(f"Reading ids {nextId} to {endId} failed with {type(err)} {str(err)}, reconnecting for reattempt number {numRetries} of {self._maxRetries}", logging.WARNING)
+                sleep(min(2 ** numRetries, 30))
+                mysqlInterface.Close()
@@ -0,0 +1,113 @@
+## Standard module imports
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from array import array
+from typing import Iterator, List, Tuple
+
+## Local module imports
+from interfaces.IdRangeSet import IdRangeSet
+
+## @class StagedLogFile
+#  A local file holding a day's log entries as proto2 serialized LogRecords, so they can be read from MySQL at full speed,
+#  the connection given back, and the rows uploaded to BigQuery afterwards, as many times as it takes to commit them.
+#  The file is a short header followed by one block per batch of rows. Each block is a (compressed length, uncompressed length, number of rows) header
+#  and a zlib compressed body holding the rows' ids, then their lengths, then the serialized rows end to end.
+#  Compressing a block at a time means the file can be read back through a memory map, one block in memory at once.
+class StagedLogFile:
+
+    _MAGIC        = b"OGDSTAG1"
+    _BLOCK_HEADER = struct.Struct("<QQI")
+
+    def __init__(self, path:str, compressionLevel:int = 1):
+        self.path             : str = path
+        self.compressionLevel : int = compressionLevel
+        self.numRows          : int = 0
+        self.numBlocks        : int = 0
+        self.exportedIds      : IdRangeSet = IdRangeSet()
+        self._file = open(path, "wb")
+        self._file.write(StagedLogFile._MAGIC)
+
+    # Create an empty staged file in the given directory, or in the system temp directory if it's empty
+    @staticmethod
+    def Create(stagingDir:str = "", compressionLevel:int = 1) -> "StagedLogFile":
+        stagingDir = stagingDir or tempfile.gettempdir()
+        os.makedirs(stagingDir, exist_ok=True)
+        fileHandle, path = tempfile.mkstemp(prefix="ogd_sync_", suffix=".staged", dir=stagingDir)
+        os.close(fileHandle)
+        return StagedLogFile(path, compressionLevel)
+
+    @property
+    def SizeInBytes(self) -> int:
+        if self._file is not None:
+            self._file.flush()
+        return os.path.getsize(self.path)
+
+    def WriteBatch(self, serializedRows:List[bytes], ids:List[int]) -> None:
+        """Compress a batch of serialized rows, and their log entry ids, into a block at the end of the file.
+
+        :param serializedRows: The proto2 serialized LogRecords
+        :type serializedRows: List[bytes]
+        :param ids: The id of each row's log entry, in the same order
+        :type ids: List[int]
+        """
+        if len(serializedRows) == 0:
+            return
+        body = array('q', ids).tobytes() + array('Q', [len(serializedRow) for serializedRow in serializedRows]).tobytes() + b"".join(serializedRows)
+        compressedBody = zlib.compress(body, self.compressionLevel)
+
+        self._file.write(StagedLogFile._BLOCK_HEADER.pack(len(compressedBody), len(body), len(serializedRows)))
+        self._file.write(compressedBody)
+        self.numRows += len(serializedRows)
+        self.numBlocks += 1
+        self.exportedIds = self.exportedIds.Union(IdRangeSet.FromIds(ids))
+
+    # Flush everything written to disk. Nothing more can be written afterwards.
+    def FinishWriting(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def ReadBatches(self) -> Iterator[Tuple[List[bytes], List[int]]]:
+        """Read the file's blocks back through a memory map, in the order they were written.
+
+        :return: The serialized rows and log entry ids of each block
+        :rtype: Iterator[Tuple[List[bytes], List[int]]]
+        """
+        self.FinishWriting()
+        with open(self.path, "rb") as fileHandle:
+            if os.fstat(fileHandle.fileno()).st_size <= len(StagedLogFile._MAGIC):
+                return
+            with mmap.mmap(fileHandle.fileno(), 0, access=mmap.ACCESS_READ) as fileMap, memoryview(fileMap) as fileView:
+                if fileMap[:len(StagedLogFile._MAGIC)] != StagedLogFile._MAGIC:
+                    raise Exception(f"{self.path} is not a staged log entry file")
+
+                position = len(StagedLogFile._MAGIC)
+                while position < len(fileMap):
+                    compressedLength, bodyLength, numRows = StagedLogFile._BLOCK_HEADER.unpack_from(fileMap, position)
+                    position += StagedLogFile._BLOCK_HEADER.size
+                    with fileView[position:position + compressedLength] as compressedBody:
+                        body = zlib.decompress(compressedBody, bufsize=max(1, bodyLength))
+                    position += compressedLength
+                    if len(body) != bodyLength:
+                        raise Exception(f"Block of {numRows} rows in {self.path} is corrupt, expected {bodyLength} bytes but found {len(body)}")
+
+                    ids = array('q')
+                    ids.frombytes(body[:8 * numRows])
+                    lengths = array('Q')
+                    lengths.frombytes(body[8 * numRows:16 * numRows])
+
+                    serializedRows = []
+                    start = 16 * numRows
+                    for length in lengths:
+                        serializedRows.append(body[start:start + length])
+                        start += length
+                    yield (serializedRows, ids.tolist())
+
+    # Delete the file. Safe to call more than once.
+    def Delete(self) -> None:
+        self.FinishWriting()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,150 @@
+import logging
+import sqlite3
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+## Local module imports
+from interfaces.IdRangeSet import IdRangeSet
+from utils import Logger
+
+## @class JournaledRequest
+#  Dumb struct for one append rows request recorded in the journal
+class JournaledRequest:
+    def __init__(self, streamIndex: int, offset: int, numRows: int, ids: IdRangeSet, acknowledged: bool):
+        self.streamIndex  = streamIndex
+        self.offset       = offset
+        self.numRows      = numRows
+        self.ids          = ids
+        self.acknowledged = acknowledged
+
+## @class SyncJournal
+#  A local SQLite file recording the progress of each day being synced, so a sync that dies part way through a day
+#  can pick up where it left off instead of re-reading and re-sending the whole day.
+#  Each SyncDate opens its own journal, since a SQLite connection can't be shared between threads.
+class SyncJournal:
+
+    # The stages a day goes through. A day is removed from the journal once its log entries are marked as synced.
+    STREAMING  = "STREAMING"  # Rows are being appended to the day's PENDING write streams
+    FINALIZING = "FINALIZING" # Every row has been acknowledged, the streams are being finalized and committed
+    COMMITTED  = "COMMITTED"  # The streams are committed, the rows are being verified and marked as synced
+
+    def __init__(self, path: str):
+        self.path = path
+        # Writes are committed as they are made, so the journal is never more than one statement behind
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        # WAL lets several days (each with its own connection) write to the journal at once, and survives the process dying
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS days (
+                date        TEXT PRIMARY KEY,
+                table_id    TEXT NOT NULL,
+                num_streams INTEGER NOT NULL,
+                rows_before INTEGER NOT NULL,
+                stage       TEXT NOT NULL,
+                updated     TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS streams (
+                date         TEXT NOT NULL,
+                stream_index INTEGER NOT NULL,
+                stream_name  TEXT NOT NULL,
+                PRIMARY KEY (date, stream_index)
+            );
+            CREATE TABLE IF NOT EXISTS requests (
+                date         TEXT NOT NULL,
+                stream_index INTEGER NOT NULL,
+                row_offset   INTEGER NOT NULL,
+                num_rows     INTEGER NOT NULL,
+                ids          TEXT NOT NULL,
+                acknowledged INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (date, stream_index, row_offset)
+            );
+        """)
+
+    def Close(self) -> None:
+        self._db.close()
+
+    def GetDay(self, dateToSync: date) -> Optional["DayCheckpoint"]:
+        """Get the checkpoint for the given day, or None if the day isn't in the journal
+
+        :param dateToSync: The day
+        :type dateToSync: date
+        :return: The day's checkpoint, if there is one
+        :rtype: Optional[DayCheckpoint]
+        """
+        row = self._db.execute("SELECT table_id, num_streams, rows_before, stage FROM days WHERE date = ?", (str(dateToSync),)).fetchone()
+        if row is None:
+            return None
+        return DayCheckpoint(self, dateToSync, row[0], row[1], row[2], row[3])
+
+    def StartDay(self, dateToSync: date, tableId: str, numStreams: int, numRowsBefore: int) -> "DayCheckpoint":
+        """Start a new checkpoint for the given day, replacing anything already in the journal for it
+
+        :param dateToSync: The day
+        :type dateToSync: date
+        :param tableId: The fully qualified id of the BigQuery table the day is written to
+        :type tableId: str
+        :param numStreams: The number of write streams the day's rows are split across
+        :type numStreams: int
+        :param numRowsBefore: The number of rows already in the BigQuery table before the day is synced
+        :type numRowsBefore: int
+        :return: The day's checkpoint
+        :rtype: DayCheckpoint
+        """
+        self.ClearDay(dateToSync)
+        self._db.execute("INSERT INTO days (date, table_id, num_streams, rows_before, stage, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                         (str(dateToSync), tableId, numStreams, numRowsBefore, SyncJournal.STREAMING, datetime.now().isoformat()))
+        return DayCheckpoint(self, dateToSync, tableId, numStreams, numRowsBefore, SyncJournal.STREAMING)
+
+    def ClearDay(self, dateToSync: date) -> None:
+        self._db.execute("BEGIN")
+        for table in ["requests", "streams", "days"]:
+            self._db.execute(f"DELETE FROM {table} WHERE date = ?", (str(dateToSync),))
+        self._db.execute("COMMIT")
+
+## @class DayCheckpoint
+#  One day's entry in the sync journal: which stage the day has reached, the name of each of its write streams,
+#  and every append rows request sent for it, with the ids of the log entries in the request, its offset, and whether it was acknowledged.
+#  The ids are kept as intervals rather than a single high-water mark, since the chunked reader delivers ids out of order.
+class DayCheckpoint:
+
+    def __init__(self, journal: SyncJournal, dateToSync: date, tableId: str, numStreams: int, numRowsBefore: int, stage: str):
+        self._journal     = journal
+        self._date        = str(dateToSync)
+        self.tableId       : str = tableId
+        self.numStreams    : int = numStreams
+        self.numRowsBefore : int = numRowsBefore
+        self.stage         : str = stage
+
+    def SetStage(self, stage: str) -> None:
+        self._journal._db.execute("UPDATE days SET stage = ?, updated = ? WHERE date = ?", (stage, datetime.now().isoformat(), self._date))
+        self.stage = stage
+        Logger.Log(f"Checkpoint for {self._date} moved to stage {stage}", logging.DEBUG)
+
+    def GetStreamNames(self) -> Dict[int, str]:
+        rows = self._journal._db.execute("SELECT stream_index, stream_name FROM streams WHERE date = ? ORDER BY stream_index", (self._date,)).fetchall()
+        return {streamIndex : streamName for streamIndex, streamName in rows}
+
+    def RecordStream(self, streamIndex: int, streamName: str) -> None:
+        self._journal._db.execute("INSERT OR REPLACE INTO streams (date, stream_index, stream_name) VALUES (?, ?, ?)", (self._date, streamIndex, streamName))
+
+    def GetRequests(self) -> List[JournaledRequest]:
+        """Get every request recorded for the day, ordered by stream and then offset
+        """
+        rows = self._journal._db.execute("SELECT stream_index, row_offset, num_rows, ids, acknowledged FROM requests WHERE date = ? ORDER BY stream_index, row_offset",
+                                         (self._date,)).fetchall()
+        return [JournaledRequest(streamIndex, offset, numRows, IdRangeSet.FromString(ids), bool(acknowledged)) for streamIndex, offset, numRows, ids, acknowledged in rows]
+
+    def RecordRequest(self, streamIndex: int, offset: int, numRows: int, ids: IdRangeSet) -> None:
+        """Record a request that is about to be sent.
+        This must be done before the request is sent, so that after a crash we never append different rows at an offset
+        the stream may already hold.
+        """
+        self._journal._db.execute("INSERT OR REPLACE INTO requests (date, stream_index, row_offset, num_rows, ids, acknowledged) VALUES (?, ?, ?, ?, ?, 0)",
+                                  (self._date, streamIndex, offset, numRows, ids.ToString()))
+
+    def AcknowledgeRequest(self, streamIndex: int, offset: int) -> None:
+        self._journal._db.execute("UPDATE requests SET acknowledged = 1 WHERE date = ? AND stream_index = ? AND row_offset = ?", (self._date, streamIndex, offset))
+
+    def Clear(self) -> None:
+        self._journal.ClearDay(self._date)
@@ -1,7 +1,12 @@
-__all__ = [ "BigQueryInterface", "Interface", "DataInterface", "MySQLInterface" ]
+__all__ = [ "BigQueryInterface", "Interface", "DataInterface", "MySQLInterface", "SyncJournal", "AsyncBigQueryInterface", "AsyncMySQLInterface", "StagedLogFile", "IdRangeSet" ]
 #
 from . import BigQueryInterface
 from . import Interface
 from . import DataInterface
 from . import MySQLInterface
+from . import SyncJournal
+from . import AsyncBigQueryInterface
+from . import AsyncMySQLInterface
+from . import StagedLogFile
+from . import IdRangeSet
 
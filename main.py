@@ -1,31 +1,82 @@
 # Standard module imports
+import asyncio
 import logging
 import os
 import sys
 from argparse import ArgumentParser, Namespace
 
 # Local module imports
+from interfaces.MySQLInterface import MySQLConnectionPool
+from services.AsyncLogSyncer import AsyncLogSyncer
+from services.AsyncSyncScheduler import AsyncSyncScheduler
+from services.MemoryBudget import MemoryBudget
 from services.OpenGameDataLogSyncer import OpenGameDataLogSyncer 
+from services.SerializerProcessPool import SerializerProcessPool
+from services.SyncScheduler import SyncScheduler
 from utils import Logger
 
 from config.config import settings as script_settings
 
 parser = ArgumentParser(add_help=False)
-parser.add_argument("game", type=str.upper,
-                    help="The game to use with the given command.")
+parser.add_argument("game", type=str.upper, nargs="?", default=None,
+                    help="The game to use with the given command. Not needed with --scheduler.")
 parser.add_argument("-m", "--max_days", type=int, required=False, default=100,
                     help="Tell the program the maximum number of days to sync.")
+parser.add_argument("-p", "--parallel-days", "--parallel_days", dest="parallel_days", type=int, required=False, default=1,
+                    help="Tell the program how many days to sync at the same time.")
+parser.add_argument("-s", "--scheduler", action="store_true",
+                    help="Sync every game in the config's SCHEDULER_CONFIG from this one process, instead of a single game.")
+parser.add_argument("-i", "--interval", type=int, required=False, default=0,
+                    help="With --scheduler, keep running and start a new pass over the games every <interval> minutes. By default, run one pass and exit.")
+parser.add_argument("-a", "--async", dest="use_async", action="store_true",
+                    help="Run every day, and with --scheduler every game, as a task on a single asyncio event loop. Needs aiomysql.")
+parser.add_argument("--max-memory", "--max_memory", dest="max_memory", type=str, required=False, default=None,
+                    help="Limit the log entries held in memory by all days at once to this many bytes, e.g. 512M or 2G. Overrides MAX_MEMORY in the SYNC_CONFIG.")
 
 args : Namespace = parser.parse_args()
 
+if args.max_memory is not None:
+    script_settings["SYNC_CONFIG"] = {**script_settings.get("SYNC_CONFIG", {}), "MAX_MEMORY": args.max_memory}
+
+if args.scheduler:
+    Logger.Log(f"Begin MySQL to BigQuery sync scheduler, up to {args.max_days} days per game.", logging.INFO)
+
+    if args.use_async:
+        scheduler = AsyncSyncScheduler(script_settings)
+        if args.interval > 0:
+            asyncio.run(scheduler.RunForever(maxDaysPerGame=args.max_days, intervalMinutes=args.interval))
+        else:
+            asyncio.run(scheduler.RunOnce(maxDaysPerGame=args.max_days))
+    else:
+        scheduler = SyncScheduler(script_settings)
+        if args.interval > 0:
+            scheduler.RunForever(maxDaysPerGame=args.max_days, intervalMinutes=args.interval)
+        else:
+            scheduler.RunOnce(maxDaysPerGame=args.max_days)
+
+    MySQLConnectionPool.CloseAll()
+    SerializerProcessPool.CloseAll()
+    Logger.Log(f"Peak RSS: {MemoryBudget.PeakRSSBytes() / (1024 * 1024):.1f} MB", logging.INFO)
+    Logger.Log("End MySQL to BigQuery sync scheduler", logging.INFO)
+
+    sys.exit(1 if len(scheduler.failedGames) > 0 else 0)
+
+if args.game is None:
+    parser.error("A game is required, unless running with --scheduler")
+
 Logger.Log(f"Begin MySQL to BigQuery sync job on {args.game}, up to {args.max_days} days.", logging.INFO)
 
-logSyncService = OpenGameDataLogSyncer(script_settings)
-numDaysSynced = logSyncService.SyncAll(maxDaysToSync=args.max_days) 
+if args.use_async:
+    numDaysSynced = asyncio.run(AsyncLogSyncer(script_settings).SyncAll(maxDaysToSync=args.max_days, parallelDays=args.parallel_days))
+else:
+    logSyncService = OpenGameDataLogSyncer(script_settings)
+    numDaysSynced = logSyncService.SyncAll(maxDaysToSync=args.max_days, parallelDays=args.parallel_days)
 
 Logger.Log(f"Successfully synced {numDaysSynced} / {args.max_days} days of logs from MySQL to BigQuery", logging.INFO)
 
-
+MySQLConnectionPool.CloseAll()
+SerializerProcessPool.CloseAll()
+Logger.Log(f"Peak RSS: {MemoryBudget.PeakRSSBytes() / (1024 * 1024):.1f} MB", logging.INFO)
 Logger.Log("End MySQL to BigQuery sync job", logging.INFO)
 
 sys.exit(0)
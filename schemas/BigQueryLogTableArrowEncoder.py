@@ -0,0 +1,148 @@
+## @namespace BigQueryLogTableArrowEncoder
+#  Encodes batches of OGD MySQL rows into Arrow record batches with the columns of BigQueryLogTableSchema,
+#  for writing to Parquet files that are loaded into BigQuery with a load job.
+#  If you update BigQueryLogTableSchema, you'll need to update the Arrow schema and the column conversions below to match.
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+# pyarrow is an optional dependency, only needed to sync through load jobs
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# import locals
+from schemas.JsonValidator import JsonValidator
+from utils import Logger
+
+def GetArrowSchema() -> "pyarrow.Schema":
+    """The Arrow equivalent of BigQueryLogTableSchema. JSON columns are written as strings, which BigQuery parses as it loads them,
+    and timestamps are microseconds since the epoch, in UTC.
+    """
+    timestamp = pyarrow.timestamp('us', tz='UTC')
+    return pyarrow.schema([
+        pyarrow.field("session_id", pyarrow.string(), nullable=False),
+        pyarrow.field("user_id", pyarrow.string()),
+        pyarrow.field("user_data", pyarrow.string()),
+        pyarrow.field("client_time", timestamp),
+        pyarrow.field("client_offset", pyarrow.int64()),
+        pyarrow.field("server_time", timestamp, nullable=False),
+        pyarrow.field("event_name", pyarrow.string(), nullable=False),
+        pyarrow.field("event_data", pyarrow.string(), nullable=False),
+        pyarrow.field("event_source", pyarrow.string(), nullable=False),
+        pyarrow.field("game_state", pyarrow.string()),
+        pyarrow.field("app_version", pyarrow.int64(), nullable=False),
+        pyarrow.field("app_branch", pyarrow.string()),
+        pyarrow.field("log_version", pyarrow.int64(), nullable=False),
+        pyarrow.field("event_sequence_index", pyarrow.int64(), nullable=False),
+        pyarrow.field("remote_addr", pyarrow.string(), nullable=False),
+        pyarrow.field("http_user_agent", pyarrow.string())
+    ])
+
+class OgdArrowBatchEncoder:
+    """Encodes batches of OPEN_GAME_DATA rows into Arrow record batches.
+
+    Produces the same column values as OgdLogRecordEncoder does for the Storage Write API: required columns can't be NULL,
+    timestamps and offsets are converted the same way, and JSON documents the JsonValidator rejects are replaced with "{}" or left NULL.
+    Rows are transposed into columns once per batch, and each column is converted to an Arrow array in a single call.
+    """
+
+    def __init__(self, columnIndex:Dict[str, int], jsonValidator:Optional[JsonValidator] = None):
+        if pyarrow is None:
+            raise Exception("Syncing through load jobs needs pyarrow, which is not installed. Install it with: pip3 install pyarrow")
+
+        self._columnIndex = columnIndex
+        self._jsonValidator : JsonValidator = jsonValidator if jsonValidator is not None else JsonValidator()
+        self.schema : pyarrow.Schema = GetArrowSchema()
+        self._lastServerTime : Optional[datetime] = None
+        self._lastServerTimeValue : int = 0
+        self._clientOffsetValues  : Dict[timedelta, int] = {}
+
+    def EncodeBatch(self, mysqlRows:List[Tuple]) -> "pyarrow.RecordBatch":
+        """Encode a batch of MySQL rows.
+
+        :param mysqlRows: Rows from the log entry stream, as tuples in the order of the encoder's column index
+        :type mysqlRows: List[Tuple]
+        :raises TypeError: If a column for a required field is NULL
+        :return: A record batch with one row per MySQL row
+        :rtype: pyarrow.RecordBatch
+        """
+        c = self._columnIndex
+        columns = list(zip(*mysqlRows)) if len(mysqlRows) > 0 else [()] * len(c)
+        ids = columns[c['id']]
+        sessionIds = columns[c['session_id']]
+        sequenceIndices = columns[c['event_sequence_index']]
+
+        def _describe(i:int) -> str:
+            return " for sesson_id: " + str(sessionIds[i]) + " event_sequence_index: " + str(sequenceIndices[i]) + " id: " + str(ids[i])
+
+        # client_time is NOT NULL in MySQL, however it can be 0000-00-00 which is cast to None.
+        # Seconds to microseconds, adding in the milliseconds column (client_time_ms) from MySQL
+        clientTimes = [int(round(client_time.replace(tzinfo=timezone.utc).timestamp())) * 1000000 + client_time_ms * 1000 if client_time is not None else None
+                       for client_time, client_time_ms in zip(columns[c['client_time']], columns[c['client_time_ms']])]
+
+        # Integer number of seconds, since BigQuery's TIME type cannot store negative values
+        clientOffsets = [self._clientOffsetValue(client_offset) if client_offset is not None else None for client_offset in columns[c['client_offset']]]
+
+        # server_time in MySQL is not UTC, it's local America/Chicago, but BigQuery always assumes the timestamp is UTC
+        # The naive value is read as UTC whatever the runner's time zone, so each row lands in the partition GetTableIds picked for its date
+        serverTimes = [self._serverTimeValue(server_time) for server_time in OgdArrowBatchEncoder._required(columns[c['server_time']], 'server_time')]
+
+        timestamp = self.schema.field("server_time").type
+        arrays = [
+            pyarrow.array(OgdArrowBatchEncoder._required(sessionIds, 'session_id'), pyarrow.string()),
+            pyarrow.array(OgdArrowBatchEncoder._required(columns[c['user_id']], 'user_id'), pyarrow.string()),
+            pyarrow.array(self._jsonColumn(columns[c['user_data']], 'user_data', None, _describe), pyarrow.string()),
+            pyarrow.array(clientTimes, timestamp),
+            pyarrow.array(clientOffsets, pyarrow.int64()),
+            pyarrow.array(serverTimes, timestamp),
+            pyarrow.array(OgdArrowBatchEncoder._required(columns[c['event_name']], 'event_name'), pyarrow.string()),
+            pyarrow.array(self._jsonColumn(columns[c['event_data']], 'event_data', "{}", _describe), pyarrow.string()),
+            pyarrow.array(OgdArrowBatchEncoder._required(columns[c['event_source']], 'event_source'), pyarrow.string()),
+            pyarrow.array(self._jsonColumn(columns[c['game_state']], 'game_state', None, _describe), pyarrow.string()),
+            pyarrow.array(OgdArrowBatchEncoder._required(columns[c['app_version']], 'app_version'), pyarrow.int64()),
+            pyarrow.array(columns[c['app_branch']], pyarrow.string()),
+            pyarrow.array(OgdArrowBatchEncoder._required(columns[c['log_version']], 'log_version'), pyarrow.int64()),
+            pyarrow.array(OgdArrowBatchEncoder._required(sequenceIndices, 'event_sequence_index'), pyarrow.int64()),
+            pyarrow.array(OgdArrowBatchEncoder._required(columns[c['remote_addr']], 'remote_addr'), pyarrow.string()),
+            pyarrow.array(columns[c['http_user_agent']], pyarrow.string())
+        ]
+        return pyarrow.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    # *** PRIVATE METHODS ***
+
+    @staticmethod
+    def _required(values:Tuple, fieldName:str) -> Tuple:
+        if None in values:
+            raise TypeError(f"Cannot set {fieldName} to None")
+        return values
+
+    def _jsonColumn(self, values:Tuple, fieldName:str, default:Optional[str], describe:Callable[[int], str]) -> List[Optional[str]]:
+        # NULL documents become the default, as do documents that aren't valid JSON, which are logged.
+        # Empty documents are left NULL in columns that can be NULL.
+        isValidJson = self._jsonValidator.IsValid
+        column : List[Optional[str]] = []
+        for i, value in enumerate(values):
+            if value is None or (value == "" and default is None):
+                column.append(default)
+            elif isValidJson(value):
+                column.append(value)
+            else:
+                column.append(default)
+                Logger.Log(f"Unable to decode {fieldName} json string: " + str(value) + describe(i), logging.WARN)
+        return column
+
+    def _serverTimeValue(self, server_time:datetime) -> int:
+        # Most of a day is made up of runs of identical server_time values, so reuse the last conversion
+        if server_time != self._lastServerTime:
+            self._lastServerTimeValue = int(round(server_time.replace(tzinfo=timezone.utc).timestamp())) * 1000000
+            self._lastServerTime = server_time
+        return self._lastServerTimeValue
+
+    def _clientOffsetValue(self, client_offset:timedelta) -> int:
+        value = self._clientOffsetValues.get(client_offset)
+        if value is None:
+            value = round(client_offset.total_seconds())
+            self._clientOffsetValues[client_offset] = value
+        return value
@@ -21,3 +21,8 @@ schema = [
     bigquery.SchemaField("remote_addr", "STRING", mode="REQUIRED"),
     bigquery.SchemaField("http_user_agent", "STRING", mode="NULLABLE")
 ]
+
+# When all days are synced into a single table rather than daily shards, the table is partitioned by day on server_time
+# and clustered on the columns most queries filter by
+partition_field = "server_time"
+clustering_fields = ["session_id", "event_name"]
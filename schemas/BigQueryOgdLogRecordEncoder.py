@@ -0,0 +1,179 @@
+## @namespace BigQueryOgdLogRecordEncoder
+#  Encodes batches of OGD MySQL rows directly into the proto2 wire format of the LogRecord message in BigQueryOgdLogRecord.proto,
+#  without building a LogRecord message object for every row.
+#  If you update BigQueryOgdLogRecord.proto, you'll need to update the field tags and the row encoding below to match.
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+# import locals
+from schemas.JsonValidator import JsonValidator
+from utils import Logger
+
+# Precomputed field keys, (field_number << 3) | wire_type, already encoded as varints.
+# Wire type 0 is a varint, wire type 2 is a length-delimited string.
+_SESSION_ID           = b'\x0a' # 1, string
+_USER_ID              = b'\x12' # 2, string
+_USER_DATA            = b'\x1a' # 3, string
+_CLIENT_TIME          = b'\x20' # 4, int64
+_CLIENT_OFFSET        = b'\x28' # 5, int32
+_SERVER_TIME          = b'\x30' # 6, int64
+_EVENT_NAME           = b'\x3a' # 7, string
+_EVENT_DATA           = b'\x42' # 8, string
+_EVENT_SOURCE         = b'\x4a' # 9, string
+_GAME_STATE           = b'\x52' # 10, string
+_APP_VERSION          = b'\x58' # 11, int32
+_APP_BRANCH           = b'\x62' # 12, string
+_LOG_VERSION          = b'\x68' # 13, int32
+_EVENT_SEQUENCE_INDEX = b'\x70' # 14, int64
+_REMOTE_ADDR          = b'\x7a' # 15, string
+_HTTP_USER_AGENT      = b'\x82\x01' # 16, string
+
+_EMPTY_JSON = b'\x02{}' # Length prefix and bytes of "{}"
+
+# Varints for every value that fits in a single byte
+_SMALL_VARINTS : List[bytes] = [bytes((i,)) for i in range(0x80)]
+
+def _varint(value:int) -> bytes:
+    if 0 <= value < 0x80:
+        return _SMALL_VARINTS[value]
+    # Negative int32 and int64 values are sign-extended to 64 bits, and always take 10 bytes
+    if value < 0:
+        value += 1 << 64
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def _string(value:Any) -> bytes:
+    # Length prefix followed by the UTF-8 bytes.
+    # Only str and bytes are accepted, as protobuf does; bytes() of an int would silently encode that many zero bytes.
+    if isinstance(value, str):
+        encoded = value.encode('utf-8')
+    elif isinstance(value, bytes):
+        encoded = value
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__} value {value!r} as a LogRecord string field")
+    return _varint(len(encoded)) + encoded
+
+def _required(value:Any, fieldName:str) -> Any:
+    if value is None:
+        raise TypeError(f"Cannot set LogRecord.{fieldName} to None")
+    return value
+
+class OgdLogRecordEncoder:
+    """Encodes batches of OPEN_GAME_DATA rows into serialized LogRecords.
+
+    Produces the same bytes as building a BigQueryOgdLogRecord_pb2.LogRecord for each row and calling SerializeToString,
+    but looks up each column's tuple index once per batch, and reuses the converted timestamp and offset values
+    for the runs of identical server_time and client_offset values that make up most of a day.
+    JSON columns are checked with the given JsonValidator; documents it rejects are replaced with "{}" or left NULL, as before.
+    """
+
+    def __init__(self, columnIndex:Dict[str, int], jsonValidator:Optional[JsonValidator] = None):
+        self._columnIndex = columnIndex
+        self._jsonValidator : JsonValidator = jsonValidator if jsonValidator is not None else JsonValidator()
+        self._lastServerTime : Optional[datetime] = None
+        self._lastServerTimeField : bytes = b''
+        self._clientOffsetFields  : Dict[timedelta, bytes] = {}
+
+    def EncodeBatch(self, mysqlRows:List[Tuple]) -> List[bytes]:
+        """Encode a batch of MySQL rows.
+
+        :param mysqlRows: Rows from the log entry stream, as tuples in the order of the encoder's column index
+        :type mysqlRows: List[Tuple]
+        :raises TypeError: If a column for a required LogRecord field is NULL
+        :return: One serialized LogRecord per row
+        :rtype: List[bytes]
+        """
+        c = self._columnIndex
+        i_id, i_session_id, i_user_id, i_user_data = c['id'], c['session_id'], c['user_id'], c['user_data']
+        i_client_time, i_client_time_ms, i_client_offset = c['client_time'], c['client_time_ms'], c['client_offset']
+        i_server_time, i_event_name, i_event_data, i_event_source = c['server_time'], c['event_name'], c['event_data'], c['event_source']
+        i_game_state, i_app_version, i_app_branch, i_log_version = c['game_state'], c['app_version'], c['app_branch'], c['log_version']
+        i_event_sequence_index, i_remote_addr, i_http_user_agent = c['event_sequence_index'], c['remote_addr'], c['http_user_agent']
+
+        varint = _varint
+        string = _string
+        isValidJson = self._jsonValidator.IsValid
+
+        serializedRows : List[bytes] = []
+        append = serializedRows.append
+
+        for row in mysqlRows:
+            session_id = _required(row[i_session_id], 'session_id')
+            event_sequence_index = _required(row[i_event_sequence_index], 'event_sequence_index')
+
+            # Skipping the auto_increment primary key since it isn't useful
+            parts = [_SESSION_ID, string(session_id), _USER_ID, string(_required(row[i_user_id], 'user_id'))]
+
+            user_data = row[i_user_data]
+            if user_data is not None and user_data != "":
+                if isValidJson(user_data):
+                    parts += (_USER_DATA, string(user_data))
+                else:
+                    Logger.Log("Unable to decode user_data json string: " + str(user_data) + " for sesson_id: " + str(session_id) + " event_sequence_index: "\
+                         + str(event_sequence_index) + " id: " + str(row[i_id]), logging.WARN)
+
+            # client_time is NOT NULL in MySQL, however it can be 0000-00-00 which is cast to None
+            client_time = row[i_client_time]
+            if client_time is not None:
+                # Seconds to microseconds, adding in the milliseconds column (client_time_ms) from MySQL
+                parts += (_CLIENT_TIME, varint(int(round(client_time.replace(tzinfo=timezone.utc).timestamp())) * 1000000 + row[i_client_time_ms] * 1000))
+
+            client_offset = row[i_client_offset]
+            if client_offset is not None:
+                # Integer number of seconds, since BigQuery's TIME type cannot store negative values
+                clientOffsetField = self._clientOffsetFields.get(client_offset)
+                if clientOffsetField is None:
+                    clientOffsetField = _CLIENT_OFFSET + varint(round(client_offset.total_seconds()))
+                    self._clientOffsetFields[client_offset] = clientOffsetField
+                parts.append(clientOffsetField)
+
+            # server_time in MySQL is not UTC, it's local America/Chicago, but BigQuery always assumes the timestamp is UTC
+            # The naive value is read as UTC whatever the runner's time zone, so each row lands in the partition GetTableIds picked for its date
+            server_time = _required(row[i_server_time], 'server_time')
+            if server_time != self._lastServerTime:
+                self._lastServerTimeField = _SERVER_TIME + varint(int(round(server_time.replace(tzinfo=timezone.utc).timestamp())) * 1000000)
+                self._lastServerTime = server_time
+            parts += (self._lastServerTimeField, _EVENT_NAME, string(_required(row[i_event_name], 'event_name')))
+
+            event_data = row[i_event_data]
+            if event_data is None:
+                parts += (_EVENT_DATA, _EMPTY_JSON)
+            elif isValidJson(event_data):
+                parts += (_EVENT_DATA, string(event_data))
+            else:
+                parts += (_EVENT_DATA, _EMPTY_JSON)
+                Logger.Log("Unable to decode event_data json string: " + str(event_data) + " for sesson_id: " + str(session_id)\
+                     + " event_sequence_index: " + str(event_sequence_index) + " id: " + str(row[i_id]), logging.WARN)
+
+            parts += (_EVENT_SOURCE, string(_required(row[i_event_source], 'event_source')))
+
+            game_state = row[i_game_state]
+            if game_state is not None and game_state != "":
+                if isValidJson(game_state):
+                    parts += (_GAME_STATE, string(game_state))
+                else:
+                    Logger.Log("Unable to decode game_state json string: " + str(game_state) + " for sesson_id: " + str(session_id)\
+                         + " event_sequence_index: " + str(event_sequence_index) + " id: " + str(row[i_id]), logging.WARN)
+
+            parts += (_APP_VERSION, varint(_required(row[i_app_version], 'app_version')))
+
+            app_branch = row[i_app_branch]
+            if app_branch is not None:
+                parts += (_APP_BRANCH, string(app_branch))
+
+            parts += (_LOG_VERSION, varint(_required(row[i_log_version], 'log_version')),
+                      _EVENT_SEQUENCE_INDEX, varint(event_sequence_index),
+                      _REMOTE_ADDR, string(_required(row[i_remote_addr], 'remote_addr')))
+
+            http_user_agent = row[i_http_user_agent]
+            if http_user_agent is not None:
+                parts += (_HTTP_USER_AGENT, string(http_user_agent))
+
+            append(b''.join(parts))
+
+        return serializedRows
@@ -0,0 +1,81 @@
+# Standard module imports
+import json
+import logging
+from time import perf_counter
+from typing import Any, Callable, Dict, Optional
+
+# orjson is an optional, much faster JSON parser. Fall back to the standard library if it isn't installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Local module imports
+from utils import Logger
+
+class JsonValidator:
+    """Checks whether JSON documents from the log tables are valid, with a choice of how much work to spend doing so.
+
+    Modes:
+    - FULL  : Parse every document with the standard json module
+    - FAST  : Parse every document with orjson, if it is installed (otherwise behaves like FULL).
+              orjson is stricter than the json module, e.g. it rejects NaN and Infinity, which BigQuery also rejects.
+    - TRUST : Skip validation entirely and treat every document as valid, for tables whose upstream loggers are known to write valid JSON
+    With a sample rate of N greater than 1, only every Nth document is actually parsed, and the rest are treated as valid.
+    Validators keep a running count for sampling, so each thread should have its own validator.
+    Each validator also totals the documents it parsed, how many were invalid, and the seconds spent parsing them.
+    """
+
+    MODES = ["FULL", "FAST", "TRUST"]
+
+    # Validators are made for every thread of every day, so the missing orjson is only warned about once per process
+    _warnedNoOrjson : bool = False
+
+    def __init__(self, mode:str = "FULL", sampleRate:int = 1):
+        if mode not in JsonValidator.MODES:
+            raise Exception(f"Unsupported JSON validation mode: {mode}, expected one of {JsonValidator.MODES}")
+        if mode == "FAST" and orjson is None:
+            if not JsonValidator._warnedNoOrjson:
+                JsonValidator._warnedNoOrjson = True
+                Logger.Log("JSON validation mode FAST requested, but orjson is not installed (pip3 install orjson). Falling back to FULL validation.", logging.WARNING)
+            mode = "FULL"
+
+        self.mode       : str = mode
+        self.sampleRate : int = max(1, sampleRate)
+        self._numSeen   : int = 0
+        self.numParsed  : int = 0
+        self.numInvalid : int = 0
+        self.secondsParsing : float = 0.0
+        self._parse     : Optional[Callable[[Any], Any]] = None
+        self._errors    : tuple = (json.JSONDecodeError,)
+
+        if mode == "FULL":
+            self._parse = json.loads
+        elif mode == "FAST":
+            self._parse = orjson.loads
+            self._errors = (orjson.JSONDecodeError,)
+
+    @staticmethod
+    def FromConfig(config:Dict[str, Any]) -> "JsonValidator":
+        _sync_config = config.get("SYNC_CONFIG", {})
+        return JsonValidator(mode=_sync_config.get("JSON_VALIDATION", "FULL"), sampleRate=int(_sync_config.get("JSON_VALIDATION_SAMPLE_RATE", 1)))
+
+    def IsValid(self, document:Any) -> bool:
+        if self._parse is None:
+            return True
+
+        if self.sampleRate > 1:
+            self._numSeen += 1
+            if self._numSeen % self.sampleRate != 0:
+                return True
+
+        start = perf_counter()
+        try:
+            self._parse(document)
+            return True
+        except self._errors:
+            self.numInvalid += 1
+            return False
+        finally:
+            self.numParsed += 1
+            self.secondsParsing += perf_counter() - start
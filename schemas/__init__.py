@@ -1,7 +1,13 @@
 __all__ = [
+    "BigQueryLogTableArrowEncoder",
     "BigQueryLogTableSchema",
     "BigQueryOgdLogRecord_pb2",
+    "BigQueryOgdLogRecordEncoder",
+    "JsonValidator",
 ]
 
+from . import BigQueryLogTableArrowEncoder
 from . import BigQueryLogTableSchema
 from . import BigQueryOgdLogRecord_pb2
+from . import BigQueryOgdLogRecordEncoder
+from . import JsonValidator
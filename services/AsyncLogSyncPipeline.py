@@ -0,0 +1,174 @@
+# Standard module imports
+import asyncio
+import logging
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# Local module imports
+from interfaces.AsyncBigQueryInterface import AsyncAppendRowsSendWindow, AsyncBigQueryWriteInterface
+from interfaces.AsyncMySQLInterface import AsyncLogEntryStream
+from interfaces.BigQueryInterface import AppendRowsRequestBuilder, BigQueryWriteInterface, SourceDataRowFormatType
+from interfaces.IdRangeSet import IdRangeSet
+from schemas.JsonValidator import JsonValidator
+from services.LogSyncPipeline import LogSyncPipeline
+from services.SyncMetrics import SyncMetrics
+from utils import Logger
+
+# Marker placed on the row queue to tell the sender that no more batches are coming
+_END_OF_STREAM = object()
+
+class AsyncLogSyncPipeline:
+    """The asyncio counterpart of LogSyncPipeline, moving one day's log entries from an async MySQL cursor into BigQuery write streams.
+
+    Both stages are tasks on the event loop rather than threads, linked by a bounded queue of QUEUE_DEPTH batches:
+    1. A reader task pulls batches of rows from the log entry stream
+    2. The sender (the calling task) encodes each batch into proto2 serialized LogRecords, packs them into append rows requests of up to 10 MB,
+       and sends them round-robin to the write interface's streams, keeping a bounded window of requests in flight.
+       Every request is acknowledged before Run returns.
+
+    Whenever the reader is waiting on MySQL or the sender on an acknowledgement, the loop is free to run other days.
+    Encoding runs on the loop itself, so a single large day is still faster through the threaded LogSyncPipeline,
+    but many days, from many games, can be synced at once without a thread or a process for each.
+    The ids of every log entry sent are collected in exportedIds, and stage timings and counts are added to the given SyncMetrics,
+    the same as LogSyncPipeline. There is no checkpoint journal, so a day that fails part way through is synced from scratch by the next run.
+    """
+
+    def __init__(self, config:Dict[str,Any], bqWriteInterface:AsyncBigQueryWriteInterface, formatType:SourceDataRowFormatType, metrics:Optional[SyncMetrics] = None):
+        _sync_config = config.get("SYNC_CONFIG", {})
+
+        self._config           = config
+        self._bqWriteInterface = bqWriteInterface
+        self._formatType       = formatType
+        self.metrics           : SyncMetrics = metrics if metrics is not None else SyncMetrics(config.get("MYSQL_CONFIG", {}).get("DB_TABLE", ""))
+        self._maxRequestSizeInBytes : int = int(_sync_config.get("MAX_REQUEST_SIZE_BYTES", 10000000))
+
+        self._rowQueue : asyncio.Queue = asyncio.Queue(maxsize=max(1, int(_sync_config.get("QUEUE_DEPTH", 8))))
+        self._error    : Optional[BaseException] = None
+
+        self.sendWindow : AsyncAppendRowsSendWindow = AsyncAppendRowsSendWindow(int(_sync_config.get("MAX_IN_FLIGHT_REQUESTS", 4)))
+        self._numRequests         : int = 0
+        self._streamOffsets       : List[int] = [0] * bqWriteInterface.num_streams
+        self._streamRequestCounts : List[int] = [0] * bqWriteInterface.num_streams
+        self._requestIds          : List[int] = [] # Ids of the log entries in the request being built
+        self.exportedIds          : IdRangeSet = IdRangeSet()
+
+    @property
+    def NumRowsAppended(self) -> int:
+        """The number of rows on the write streams, going by the offsets each stream has reached.
+        Once Run has returned, every one of them has been acknowledged at its offset.
+        """
+        return sum(self._streamOffsets)
+
+    async def Run(self, logEntries:AsyncLogEntryStream) -> Tuple[int, int]:
+        """Drain the given log entry stream through the pipeline, sending every row to the BigQuery write streams.
+
+        :param logEntries: An open stream of all the log entries to send
+        :type logEntries: AsyncLogEntryStream
+        :raises Exception: Any exception raised by the reader task is re-raised here
+        :return: The number of rows exported and the number of append rows requests sent, respectively
+        :rtype: Tuple[int, int]
+        """
+        reader = asyncio.ensure_future(self._runReader(logEntries))
+        try:
+            return await self._runSender(logEntries.columnIndex)
+        finally:
+            if not reader.done():
+                reader.cancel()
+            await asyncio.wait([reader])
+
+            self.metrics.Count("already_appended", self.sendWindow.numAlreadyExists)
+            self.metrics.Count("stream_reconnects", self._bqWriteInterface.numReconnects)
+
+    # *** PRIVATE METHODS ***
+
+    async def _runReader(self, logEntries:AsyncLogEntryStream) -> None:
+        try:
+            while True:
+                start = perf_counter()
+                batch = await logEntries.__anext__()
+                self.metrics.AddTime("fetch", perf_counter() - start)
+
+                self.metrics.Count("rows_read", len(batch))
+                self.metrics.SampleQueueDepth("rows", self._rowQueue.qsize())
+                await self._rowQueue.put(batch)
+        except StopAsyncIteration:
+            pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            Logger.Log(f"Reading log entries from MySQL failed: {type(err)} {str(err)}", logging.ERROR)
+            self._error = err
+
+        # Tell the sender that we're done
+        await self._rowQueue.put(_END_OF_STREAM)
+
+    async def _runSender(self, columnIndex:Dict[str, int]) -> Tuple[int, int]:
+        jsonValidator = JsonValidator.FromConfig(self._config)
+        encoder = BigQueryWriteInterface.GetRowBatchEncoder(columnIndex, self._formatType, jsonValidator)
+        idIndex = columnIndex['id']
+
+        numExportedRows = 0
+        requestBuilder = AppendRowsRequestBuilder(self._maxRequestSizeInBytes)
+
+        while True:
+            batch = await self._rowQueue.get()
+            if batch is _END_OF_STREAM:
+                break
+
+            serializedRows = LogSyncPipeline.EncodeBatch(encoder, jsonValidator, batch, self.metrics)
+            for i, serializedRowData in enumerate(serializedRows):
+                # If adding this row to the request would push it over the max request limit of 10 MB
+                # we'll send the request and start a new request before adding the row
+                if not requestBuilder.TryAdd(serializedRowData):
+                    await self._sendRequest(requestBuilder)
+                    requestBuilder.TryAdd(serializedRowData)
+
+                self._requestIds.append(batch[i][idIndex])
+                numExportedRows += 1
+
+        if self._error is not None:
+            raise self._error
+
+        # If we have a request with rows that hasn't been sent yet, send it now
+        if not requestBuilder.NumRows == 0:
+            await self._sendRequest(requestBuilder, isFinal=True)
+
+        # Surface any failed appends now, before the streams are committed
+        with self.metrics.Time("append"):
+            await self.sendWindow.Drain()
+        Logger.Log(f"All {str(self.sendWindow.numAcknowledged)} append rows requests acknowledged", logging.DEBUG)
+
+        self.metrics.Count("invalid_json", jsonValidator.numInvalid)
+        return (numExportedRows, self._numRequests)
+
+    async def _sendRequest(self, requestBuilder:AppendRowsRequestBuilder, isFinal:bool=False) -> None:
+        # Requests are dealt out to the write streams round-robin, each stream keeping its own offset, as in LogSyncPipeline
+        streamIndex = self._numRequests % self._bqWriteInterface.num_streams
+        offset = self._streamOffsets[streamIndex]
+        numPreviousRequests = self._streamRequestCounts[streamIndex]
+        numRowsInRequest = requestBuilder.NumRows
+
+        Logger.Log(f"Creating {'final ' if isFinal else ''}append rows request number: {str(numPreviousRequests + 1)} for stream: {str(streamIndex + 1)} "\
+                   f"containing {str(numRowsInRequest)} rows with offset: {str(offset)} and sending", logging.INFO)
+
+        numBytes = requestBuilder.SizeInBytes
+        bqAppendRowsRequest = requestBuilder.Build(offset)
+
+        requestIds = IdRangeSet.FromIds(self._requestIds)
+        self._requestIds = []
+
+        # Send the request via the stream, and track its response in the send window. This waits if too many requests are in flight.
+        start = perf_counter()
+        future = await self._bqWriteInterface.SendAppendRowsRequest(numPreviousRequests, bqAppendRowsRequest, streamIndex)
+        self.metrics.SampleQueueDepth("in_flight", self.sendWindow.NumInFlight)
+        await self.sendWindow.Add(numPreviousRequests, offset, numRowsInRequest, future, streamIndex)
+        self.metrics.AddTime("append", perf_counter() - start)
+
+        self.metrics.Count("requests")
+        self.metrics.Count("rows_sent", numRowsInRequest)
+        self.metrics.Count("bytes_sent", numBytes)
+
+        self.exportedIds = self.exportedIds.Union(requestIds)
+        self._streamOffsets[streamIndex] += numRowsInRequest
+        self._streamRequestCounts[streamIndex] += 1
+        self._numRequests += 1
@@ -0,0 +1,185 @@
+# Standard module imports
+import asyncio
+import logging
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+# Local module imports
+from interfaces.AsyncBigQueryInterface import AsyncBigQueryInterface, AsyncBigQueryWriteInterface
+from interfaces.AsyncMySQLInterface import AsyncMySQLInterface
+from interfaces.BigQueryInterface import SourceDataRowFormatType
+from services.AsyncLogSyncPipeline import AsyncLogSyncPipeline
+from services.OpenGameDataLogSyncer import OpenGameDataLogSyncer
+from schemas import BigQueryLogTableSchema # Specifies the list of columns for our BigQuery table schema - used for table creation calls
+from services.SyncMetrics import SyncMetrics
+from utils import Logger
+
+class AsyncLogSyncer:
+    """The asyncio counterpart of OpenGameDataLogSyncer, syncing all log entries for a specified OGD log table, batched by date,
+    with every day run as a task on a single event loop.
+
+    MySQL is read through an AsyncMySQLInterface's pool of aiomysql connections, rows are appended through the BigQuery Storage Write API's
+    gRPC aio client, and BigQuery table metadata calls run on the loop's executor. Each day goes through the same steps as
+    OpenGameDataLogSyncer.SyncDate, to the same tables, with the same verification and marking of exactly the rows that were sent.
+    Only the Storage Write API sink is supported, and there is no checkpoint journal, so a day that fails is synced from scratch by the next run.
+    """
+
+    def __init__(self, config:Dict[str,Any], mysqlInterface:Optional[AsyncMySQLInterface] = None):
+        sink = config.get("SYNC_CONFIG", {}).get("SINK", "WRITE_API")
+        if sink != "WRITE_API":
+            raise Exception(f"Unsupported sink for the asyncio sync engine: {sink}, expected WRITE_API")
+
+        self._config = config
+        self._mysqlInterface : Optional[AsyncMySQLInterface] = mysqlInterface
+        self.numDaysSynced   : int = 0
+
+    async def SyncAll(self, maxDaysToSync:int = 100, parallelDays:int = 1, daySlots:Optional[asyncio.Semaphore] = None) -> int:
+        """Synchronize up to maxDaysToSync of the oldest days with unsynced log entries, up to parallelDays of them at a time.
+
+        If the syncer wasn't given an interface, it opens a pool of parallelDays + 1 connections for the run, so every day can stream its
+        log entries on a connection of its own while the others run their smaller queries. If any day fails, days that have not yet started
+        are skipped, and the first error is raised once running days finish.
+
+        :param maxDaysToSync: The maximum number of days-worth of data to synchronize, defaults to 100
+        :type maxDaysToSync: int, optional
+        :param parallelDays: The maximum number of days to synchronize at the same time, defaults to 1
+        :type parallelDays: int, optional
+        :param daySlots: Shared between syncers to limit the number of days syncing at once across all of them, defaults to no limit beyond parallelDays
+        :type daySlots: Optional[asyncio.Semaphore], optional
+        :return: The number of days synchronized to long-term storage.
+        :rtype: int
+        """
+        ownsInterface = self._mysqlInterface is None
+        if ownsInterface:
+            self._mysqlInterface = AsyncMySQLInterface(self._config, poolSize=max(1, parallelDays) + 1)
+            if not await self._mysqlInterface.Open():
+                raise Exception("Unable to open MySQL connection pool")
+
+        try:
+            datesToMigrate = await self._mysqlInterface.GetUnmigratedDateCounts(maxDaysToSync)
+
+            if len(datesToMigrate) == 0:
+                Logger.Log(f"No MySQL entries in {self._config['MYSQL_CONFIG']['DB_TABLE']} require migration to BigQuery", logging.INFO)
+                return 0
+
+            Logger.Log(f"Found {len(datesToMigrate)} days with unsynced log entries, from {str(datesToMigrate[0][0])} to {str(datesToMigrate[-1][0])}", logging.INFO)
+            return await self.SyncDates([dateToMigrate for dateToMigrate, _ in datesToMigrate], parallelDays, daySlots)
+        finally:
+            if ownsInterface:
+                await self._mysqlInterface.Close()
+                self._mysqlInterface = None
+
+    async def SyncDates(self, datesToMigrate:List[date], parallelDays:int = 1, daySlots:Optional[asyncio.Semaphore] = None) -> int:
+        """Synchronize the given dates concurrently, with up to parallelDays of them at a time.
+
+        :return: The number of days synchronized to long-term storage.
+        :rtype: int
+        """
+        gameSlots = asyncio.Semaphore(max(1, parallelDays))
+        firstError : List[BaseException] = []
+
+        async def _syncDateInTurn(dateToMigrate:date) -> None:
+            async with gameSlots:
+                if daySlots is not None:
+                    await daySlots.acquire()
+                try:
+                    # Once a day has failed, days that haven't started are skipped
+                    if len(firstError) > 0:
+                        return
+                    await self.SyncDate(dateToMigrate)
+                    self.numDaysSynced += 1
+                except Exception as err:
+                    Logger.Log(f"Failed to sync log entries for {str(dateToMigrate)}: {type(err)} {str(err)}", logging.ERROR)
+                    firstError.append(err)
+                finally:
+                    if daySlots is not None:
+                        daySlots.release()
+
+        numDaysSyncedBefore = self.numDaysSynced
+        await asyncio.gather(*[_syncDateInTurn(dateToMigrate) for dateToMigrate in datesToMigrate])
+
+        if len(firstError) > 0:
+            raise firstError[0]
+
+        return self.numDaysSynced - numDaysSyncedBefore
+
+    async def SyncDate(self, dateToMigrate:date) -> None:
+        """Synchronize an individual date, through the same steps as OpenGameDataLogSyncer.SyncDate:
+        create the day's table if needed, stream the day's rows through an AsyncLogSyncPipeline into PENDING write streams,
+        finalize and commit them in a single batch, verify the rows arrived, and mark exactly the rows that were sent as synced.
+
+        :param dateToMigrate: The date to synchronize
+        :type dateToMigrate: date
+        :raises Exception: If fewer rows than expected were found in BigQuery
+        """
+        _mysql_config = self._config.get('MYSQL_CONFIG', {})
+        _sync_config = self._config.get('SYNC_CONFIG', {})
+        partitioned = bool(self._config.get('BIGQUERY_CONFIG', {}).get("PARTITIONED_TABLE", False))
+        bqTableId, bqFqTableId = OpenGameDataLogSyncer.GetTableIds(self._config, dateToMigrate)
+
+        Logger.Log(f"Begin syncing log entries for: {str(dateToMigrate)} from MySQL: {_mysql_config['DB_NAME']}.{_mysql_config['DB_TABLE']} to BigQuery: {bqFqTableId}")
+        metrics = SyncMetrics(_mysql_config['DB_TABLE'], dateToMigrate)
+
+        migrationStatusCounts = await self._mysqlInterface.GetMigrationStatusCountsByDate(dateToMigrate)
+        Logger.Log(f'For: {str(dateToMigrate)} Found {str(migrationStatusCounts[0])} MySQL rows marked as requiring migration', logging.INFO)
+        Logger.Log(f'For: {str(dateToMigrate)} Found {str(migrationStatusCounts[1])} MySQL rows marked as already migrated', logging.INFO)
+
+        bqInterface = AsyncBigQueryInterface(self._config["BIGQUERY_CONFIG"])
+        numWriteStreams = int(_sync_config.get("WRITE_STREAMS_PER_DAY", 1))
+
+        succeeded = False
+        try:
+            table = await bqInterface.GetTable(bqTableId)
+            numBqTableEntriesBefore = 0
+
+            if table is not None:
+                numBqTableEntriesBefore = await bqInterface.GetTableRowCount(bqFqTableId, table)
+                Logger.Log(f"For: {str(dateToMigrate)} Found {str(numBqTableEntriesBefore)} existing BigQuery rows.", logging.INFO)
+            else:
+                if partitioned:
+                    created = await bqInterface.CreateTable(bqTableId, BigQueryLogTableSchema.schema,
+                                                            partitionField=BigQueryLogTableSchema.partition_field, clusteringFields=BigQueryLogTableSchema.clustering_fields)
+                else:
+                    created = await bqInterface.CreateTable(bqFqTableId, BigQueryLogTableSchema.schema)
+                # A table created elsewhere since the dataset was listed may already hold some of the day's rows
+                if not created:
+                    numBqTableEntriesBefore = await bqInterface.GetTableRowCount(bqFqTableId, await bqInterface.GetTable(bqTableId))
+                    Logger.Log(f"For: {str(dateToMigrate)} Found {str(numBqTableEntriesBefore)} existing BigQuery rows.", logging.INFO)
+
+            bqWriteInterface = AsyncBigQueryWriteInterface(self._config["BIGQUERY_CONFIG"], bqFqTableId, numWriteStreams)
+            formatType = SourceDataRowFormatType[_mysql_config["SOURCE_TYPE"]]
+            pipeline = AsyncLogSyncPipeline(self._config, bqWriteInterface, formatType, metrics)
+
+            logEntries = await self._mysqlInterface.GetLogEntriesByDate(dateToMigrate, formatType, int(_sync_config.get("FETCH_BATCH_SIZE", 1000)))
+            try:
+                numExportedRows, numRequests = await pipeline.Run(logEntries)
+            except BaseException:
+                # Abandon the streams uncommitted
+                await bqWriteInterface.CloseAppendRowsStreams()
+                raise
+            finally:
+                await logEntries.Close()
+
+            numRowsFinalized = 0
+            if not numRequests == 0:
+                with metrics.Time("finalize_commit"):
+                    numRowsFinalized = await bqWriteInterface.CloseFinalizeAndCommit()
+            Logger.Log(f"{str(numExportedRows)} MySQL log entries sent to: {bqFqTableId}", logging.INFO)
+
+            with metrics.Time("verify"):
+                verified = await asyncio.get_running_loop().run_in_executor(None, OpenGameDataLogSyncer.VerifyDate, dateToMigrate, bqInterface.bqInterface, bqFqTableId,
+                                                                          migrationStatusCounts[0], numBqTableEntriesBefore, pipeline.NumRowsAppended, numRowsFinalized)
+            if not verified:
+                Logger.Log(f"Expected to migrate {str(migrationStatusCounts[0])} rows from MySQL, but fewer new rows were found in BigQuery", logging.FATAL)
+                raise Exception("Missing expected log entries in BigQuery")
+
+            with metrics.Time("mark_synced"):
+                numMarked = await self._mysqlInterface.MarkLogEntriesAsSyncedByIds(pipeline.exportedIds, int(_sync_config.get("MARK_SYNCED_CHUNK_SIZE", 10000)))
+            Logger.Log(f"{str(numMarked)} MySQL entries for {str(dateToMigrate)}, in {len(pipeline.exportedIds.Intervals)} id ranges, have been marked as synced")
+
+            succeeded = True
+        finally:
+            metrics.Finish(succeeded)
+            OpenGameDataLogSyncer.ReportMetrics(self._config, metrics)
+
+        Logger.Log(f"Completed syncing log entries for: {str(dateToMigrate)}")
@@ -0,0 +1,91 @@
+# Standard module imports
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+# Local module imports
+from interfaces.AsyncMySQLInterface import AsyncMySQLInterface
+from services.AsyncLogSyncer import AsyncLogSyncer
+from services.SyncScheduler import SyncScheduler
+from utils import Logger
+
+class AsyncSyncScheduler:
+    """The asyncio counterpart of SyncScheduler, syncing the log tables of every game listed in SCHEDULER_CONFIG's GAMES on a single event loop.
+
+    Each game gets an AsyncLogSyncer with the same config as SyncScheduler would give it, and all of them run at once.
+    They share one AsyncMySQLInterface pool of MAX_CONCURRENT_DAYS + 1 connections, and no more than MAX_CONCURRENT_DAYS days,
+    from any games, sync at the same time. Days waiting for a turn are let in first come, first served, so games take turns,
+    and no game has more than MAX_CONCURRENT_DAYS_PER_GAME of its days syncing at once.
+    If a day fails, the rest of that game's days are skipped for the pass, and the other games carry on.
+    """
+
+    def __init__(self, config:Dict[str,Any]):
+        _scheduler_config = config.get("SCHEDULER_CONFIG", {})
+
+        self._config = config
+        self._games  : Dict[str, str] = dict(_scheduler_config.get("GAMES", {}))
+        self._maxConcurrentDays        : int = max(1, int(_scheduler_config.get("MAX_CONCURRENT_DAYS", 4)))
+        self._maxConcurrentDaysPerGame : int = max(1, int(_scheduler_config.get("MAX_CONCURRENT_DAYS_PER_GAME", 1)))
+
+        self.failedGames : Dict[str, BaseException] = {}
+
+        if len(self._games) == 0:
+            raise Exception("No games to sync, add them to GAMES in the SCHEDULER_CONFIG")
+
+    async def RunForever(self, maxDaysPerGame:int, intervalMinutes:int) -> None:
+        """Run a pass over every game, then wait for the next one, starting a pass every intervalMinutes until the process is stopped.
+        A pass that runs longer than the interval is followed straight away by the next one.
+
+        :param maxDaysPerGame: The maximum number of days to sync for each game in each pass
+        :type maxDaysPerGame: int
+        :param intervalMinutes: The number of minutes from the start of one pass to the start of the next
+        :type intervalMinutes: int
+        """
+        while True:
+            passStart = datetime.now()
+            await self.RunOnce(maxDaysPerGame)
+
+            nextPassStart = passStart + timedelta(minutes=intervalMinutes)
+            Logger.Log(f"Next sync pass at {nextPassStart.strftime('%Y-%m-%d %H:%M:%S')}", logging.INFO)
+            await asyncio.sleep(max(0, (nextPassStart - datetime.now()).total_seconds()))
+
+    async def RunOnce(self, maxDaysPerGame:int) -> Dict[str, int]:
+        """Sync up to maxDaysPerGame days of every game.
+
+        :param maxDaysPerGame: The maximum number of days to sync for each game
+        :type maxDaysPerGame: int
+        :return: The number of days synced for each game. Games that failed are listed in failedGames.
+        :rtype: Dict[str, int]
+        """
+        self.failedGames = {}
+
+        mysqlInterface = AsyncMySQLInterface(self._config, poolSize=self._maxConcurrentDays + 1)
+        if not await mysqlInterface.Open():
+            raise Exception("Unable to open MySQL connection pool")
+
+        Logger.Log(f"Syncing {len(self._games)} games, with up to {self._maxConcurrentDays} days at a time", logging.INFO)
+
+        try:
+            daySlots = asyncio.Semaphore(self._maxConcurrentDays)
+            syncers = {game : AsyncLogSyncer(SyncScheduler.GetGameConfig(self._config, game, datasetId), mysqlInterface.ForTable(game))
+                       for game, datasetId in self._games.items()}
+            await asyncio.gather(*[self._syncGame(game, syncer, maxDaysPerGame, daySlots) for game, syncer in syncers.items()])
+        finally:
+            await mysqlInterface.Close()
+
+        numDaysSynced = {game : syncer.numDaysSynced for game, syncer in syncers.items()}
+        for game in self._games:
+            status = "FAILED" if game in self.failedGames else "OK"
+            Logger.Log(f"{game}: synced {numDaysSynced[game]} days, {status}", logging.INFO)
+
+        return numDaysSynced
+
+    # *** PRIVATE METHODS ***
+
+    async def _syncGame(self, game:str, syncer:AsyncLogSyncer, maxDaysPerGame:int, daySlots:asyncio.Semaphore) -> None:
+        try:
+            await syncer.SyncAll(maxDaysPerGame, self._maxConcurrentDaysPerGame, daySlots)
+        except Exception as err:
+            Logger.Log(f"Failed to sync log entries of {game}, skipping its remaining days: {type(err)} {str(err)}", logging.ERROR)
+            self.failedGames[game] = err
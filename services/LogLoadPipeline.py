@@ -0,0 +1,150 @@
+# Standard module imports
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# pyarrow is an optional dependency, only needed to sync through load jobs
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Local module imports
+from interfaces.BigQueryInterface import BigQueryInterface, SourceDataRowFormatType
+from interfaces.IdRangeSet import IdRangeSet
+from interfaces.MySQLInterface import ChunkedLogEntryStream, LogEntryStream
+from schemas.BigQueryLogTableArrowEncoder import OgdArrowBatchEncoder
+from schemas.JsonValidator import JsonValidator
+from services.SyncMetrics import SyncMetrics
+from utils import Logger
+
+class LogLoadPipeline:
+    """Moves one day's log entries from a MySQL cursor into BigQuery through a compressed Parquet file and a single load job,
+    as an alternative to LogSyncPipeline and the Storage Write API for bulk backfills.
+
+    Load jobs aren't billed, and Arrow converts each batch a column at a time rather than a row at a time.
+    Batches are converted to Arrow record batches as they're read, and gathered into row groups of PARQUET_ROW_GROUP_ROWS rows,
+    each written to the file as soon as it's full, so no more than one row group is held in memory however large the day is.
+
+    The ids of every log entry written are collected in exportedIds, so that exactly those log entries can be marked as synced.
+    The load job's id is made from the table and those ids, so a day that is run again before its log entries were marked
+    picks up the earlier load job rather than loading the same rows twice.
+    """
+
+    def __init__(self, config:Dict[str,Any], formatType:SourceDataRowFormatType, metrics:Optional[SyncMetrics] = None):
+        if pyarrow is None:
+            raise Exception("Syncing through load jobs needs pyarrow, which is not installed. Install it with: pip3 install pyarrow")
+        if formatType != SourceDataRowFormatType.OPEN_GAME_DATA:
+            raise Exception("Unsupported source data format type for load jobs: " + str(formatType))
+
+        _sync_config = config.get("SYNC_CONFIG", {})
+
+        self._config        = config
+        self._formatType    = formatType
+        self.metrics        : SyncMetrics = metrics if metrics is not None else SyncMetrics(config.get("MYSQL_CONFIG", {}).get("DB_TABLE", ""))
+        self._stagingDir    : str = _sync_config.get("LOAD_JOB_STAGING_DIR", "") or tempfile.gettempdir()
+        self._rowGroupRows  : int = max(1, int(_sync_config.get("PARQUET_ROW_GROUP_ROWS", 100000)))
+        self._compression   : str = _sync_config.get("PARQUET_COMPRESSION", "zstd")
+
+        self.filePath    : Optional[str] = None
+        self.exportedIds : IdRangeSet = IdRangeSet()
+
+    def Run(self, logEntries:Union[LogEntryStream, ChunkedLogEntryStream]) -> Tuple[int, int]:
+        """Write every log entry in the given stream to a new Parquet file in the staging directory.
+
+        :param logEntries: An open stream of all the log entries to load
+        :type logEntries: Union[LogEntryStream, ChunkedLogEntryStream]
+        :return: The number of rows written and the number of row groups they were written in, respectively
+        :rtype: Tuple[int, int]
+        """
+        jsonValidator = JsonValidator.FromConfig(self._config)
+        encoder = OgdArrowBatchEncoder(logEntries.columnIndex, jsonValidator)
+        idIndex = logEntries.columnIndex['id']
+
+        os.makedirs(self._stagingDir, exist_ok=True)
+        fileHandle, self.filePath = tempfile.mkstemp(prefix="ogd_sync_", suffix=".parquet", dir=self._stagingDir)
+        os.close(fileHandle)
+
+        numRows = 0
+        numRowGroups = 0
+        pendingBatches : List[pyarrow.RecordBatch] = []
+        pendingIds : List[int] = []
+
+        with pyarrow.parquet.ParquetWriter(self.filePath, encoder.schema, compression=self._compression) as parquetWriter:
+            batches = iter(logEntries)
+            while True:
+                start = perf_counter()
+                batch = next(batches, None)
+                self.metrics.AddTime("fetch", perf_counter() - start)
+                if batch is None:
+                    break
+                self.metrics.Count("rows_read", len(batch))
+
+                secondsParsingBefore = jsonValidator.secondsParsing
+                start = perf_counter()
+                pendingBatches.append(encoder.EncodeBatch(batch))
+                secondsValidating = jsonValidator.secondsParsing - secondsParsingBefore
+                self.metrics.AddTime("validate", secondsValidating)
+                self.metrics.AddTime("serialize", perf_counter() - start - secondsValidating)
+
+                pendingIds += [row[idIndex] for row in batch]
+                numRows += len(batch)
+
+                if len(pendingIds) >= self._rowGroupRows:
+                    self._writeRowGroup(parquetWriter, pendingBatches, pendingIds)
+                    numRowGroups += 1
+                    pendingBatches, pendingIds = [], []
+
+            if len(pendingIds) > 0:
+                self._writeRowGroup(parquetWriter, pendingBatches, pendingIds)
+                numRowGroups += 1
+
+        self.metrics.Count("invalid_json", jsonValidator.numInvalid)
+        if isinstance(logEntries, ChunkedLogEntryStream):
+            self.metrics.Count("read_retries", logEntries.numRetries)
+
+        Logger.Log(f"Wrote {str(numRows)} rows in {str(numRowGroups)} row groups to {self.filePath}, {str(os.path.getsize(self.filePath))} bytes", logging.INFO)
+        return (numRows, numRowGroups)
+
+    def Load(self, bqInterface:BigQueryInterface, fqTableId:str) -> int:
+        """Load the file written by Run into the given table, or partition, and wait for the load job to finish.
+
+        :param bqInterface: The interface to start the load job with
+        :type bqInterface: BigQueryInterface
+        :param fqTableId: The fully qualified id of the table, or of one of its partitions, with a $YYYYMMDD partition decorator
+        :type fqTableId: str
+        :return: The number of rows loaded
+        :rtype: int
+        """
+        idsDigest = hashlib.sha1(self.exportedIds.ToString().encode('utf-8')).hexdigest()[:16]
+        jobIdPrefix = "ogd_sync_" + re.sub(r"[^A-Za-z0-9_]", "_", fqTableId) + "_" + idsDigest
+
+        with self.metrics.Time("append"):
+            job = bqInterface.StartParquetLoadJob(fqTableId, self.filePath, jobIdPrefix)
+        with self.metrics.Time("finalize_commit"):
+            numRowsLoaded = bqInterface.WaitForLoadJob(job)
+
+        self.metrics.Count("requests")
+        self.metrics.Count("rows_sent", len(self.exportedIds))
+        self.metrics.Count("bytes_sent", os.path.getsize(self.filePath))
+        return numRowsLoaded
+
+    def Close(self) -> None:
+        """Delete the Parquet file, if one was written.
+        """
+        if self.filePath is not None and os.path.exists(self.filePath):
+            os.remove(self.filePath)
+        self.filePath = None
+
+    # *** PRIVATE METHODS ***
+
+    def _writeRowGroup(self, parquetWriter:Any, batches:List[Any], ids:List[int]) -> None:
+        start = perf_counter()
+        parquetWriter.write_table(pyarrow.Table.from_batches(batches), row_group_size=len(ids))
+        self.metrics.AddTime("serialize", perf_counter() - start)
+        self.exportedIds = self.exportedIds.Union(IdRangeSet.FromIds(ids))
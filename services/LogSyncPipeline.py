@@ -0,0 +1,551 @@
+# Standard module imports
+import logging
+import queue
+import threading
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+# Local module imports
+from interfaces.BigQueryInterface import AppendRowsRequestBuilder, AppendRowsSendWindow, BigQueryWriteInterface, SourceDataRowFormatType
+from interfaces.IdRangeSet import IdRangeSet
+from interfaces.MySQLInterface import ChunkedLogEntryStream, LogEntryStream, MySQLInterface
+from interfaces.StagedLogFile import StagedLogFile
+from interfaces.SyncJournal import DayCheckpoint, JournaledRequest
+from schemas.JsonValidator import JsonValidator
+from services.MemoryBudget import MemoryBudget
+from services.SerializerProcessPool import SerializerProcessPool
+from services.SyncAutotuner import SyncAutotuner
+from services.SyncMetrics import SyncMetrics
+from utils import Logger
+
+# Marker placed on a queue to tell the next stage that no more batches are coming
+_END_OF_STREAM = object()
+
+class LogSyncPipeline:
+    """Staged producer/consumer pipeline that moves one day's log entries from a MySQL cursor into a BigQuery write stream.
+
+    The stages are linked by bounded queues, so the day runs at the speed of the slowest stage rather than the sum of all three:
+    1. A reader thread pulls batches of rows from the MySQL log entry stream
+    2. One or more serializer threads encode each batch of rows into proto2 serialized LogRecords.
+       With SERIALIZER_PROCESSES set, each thread instead hands its batches to the process's SerializerProcessPool, with one thread per process.
+       The pool must already have been started with SerializerProcessPool.ForConfig, before any threads were, or the pipeline raises.
+    3. The sender (the calling thread) packs serialized rows into append rows requests of up to 10 MB, and sends them round-robin
+       to the write interface's streams, keeping a bounded window of requests in flight. Every request is acknowledged before Run returns.
+
+    The ids of every log entry sent are collected in exportedIds, so that exactly those log entries can be marked as synced.
+    If given a day checkpoint, each request's stream, offset and log entry ids are recorded in the sync journal before it is sent,
+    and marked once it is acknowledged, so that Resume can carry on from them after a crash.
+    Time spent fetching, validating, serializing and appending is added to the given SyncMetrics, along with row, byte and request counts,
+    and samples of how full each queue and the send window are.
+    If given a SyncAutotuner, the pipeline reports its fetch, serialize and append timings to it, and picks up the request size,
+    send window and fetch batch size it tunes as the day goes, from the next request or fetch on.
+    If SYNC_CONFIG sets MAX_MEMORY, the reader takes each batch's estimated size from the process's MemoryBudget before passing it on,
+    waiting while the budget is used up, and the batch's share is given back once the request holding its last row is acknowledged.
+    While a reader is waiting, the sender sends partly built requests instead of holding their rows until they fill.
+
+    Instead of Run, a day can be split in two with a StagedLogFile: Stage runs the reader and serializers into the file, so MySQL is read
+    without waiting on BigQuery, and Upload then sends the file's rows through the sender. Each pipeline should only run once,
+    so uploading a staged file again, e.g. after its commit failed, takes a new pipeline and write interface.
+    """
+
+    def __init__(self, config:Dict[str,Any], bqWriteInterface:BigQueryWriteInterface, formatType:SourceDataRowFormatType, checkpoint:Optional[DayCheckpoint] = None,
+                 metrics:Optional[SyncMetrics] = None, tuner:Optional[SyncAutotuner] = None):
+        _sync_config = config.get("SYNC_CONFIG", {})
+
+        self._config           = config
+        self._bqWriteInterface = bqWriteInterface
+        self._formatType       = formatType
+        self._checkpoint       = checkpoint
+        self.metrics           : SyncMetrics = metrics if metrics is not None else SyncMetrics(config.get("MYSQL_CONFIG", {}).get("DB_TABLE", ""))
+        self._tuner            = tuner
+        self._budget           : Optional[MemoryBudget] = MemoryBudget.ForConfig(config)
+        self._serializerPool   : Optional[SerializerProcessPool] = SerializerProcessPool.Get(config)
+        self._numSerializers   : int = max(1, int(_sync_config.get("SERIALIZER_WORKERS", 2)))
+        if self._serializerPool is not None:
+            # Each serializer thread waits on one batch at a time, so it takes one per process to keep every process busy
+            self._numSerializers = max(self._numSerializers, self._serializerPool.numProcesses)
+        self._queueDepth       : int = max(1, int(_sync_config.get("QUEUE_DEPTH", 8)))
+        self._maxRequestSizeInBytes : int = int(_sync_config.get("MAX_REQUEST_SIZE_BYTES", 10000000))
+        self._maxInFlight           : int = int(_sync_config.get("MAX_IN_FLIGHT_REQUESTS", 4))
+        if tuner is not None:
+            self._maxRequestSizeInBytes = tuner.RequestSizeInBytes
+            self._maxInFlight = tuner.MaxInFlight
+
+        self._rowQueue        : queue.Queue = queue.Queue(maxsize=self._queueDepth)
+        self._serializedQueue : queue.Queue = queue.Queue(maxsize=self._queueDepth)
+        self._stopEvent       : threading.Event = threading.Event()
+        self._error           : Optional[BaseException] = None
+
+        self.sendWindow : AppendRowsSendWindow = AppendRowsSendWindow(self._maxInFlight, self._acknowledge if checkpoint is not None else None)
+        self._numRequests         : int = 0
+        self._streamOffsets       : List[int] = [0] * bqWriteInterface.num_streams
+        self._streamRequestCounts : List[int] = [0] * bqWriteInterface.num_streams
+        self._requestIds          : List[int] = [] # Ids of the log entries in the request being built
+        self.exportedIds          : IdRangeSet = IdRangeSet()
+
+        # Bytes this pipeline holds in the memory budget, in total and for the rows of the request being built
+        self._reservedBytes        : int = 0
+        self._requestReservedBytes : int = 0
+        self._reservationsReleased : bool = False
+        self._reservationLock      : threading.Lock = threading.Lock()
+
+    @property
+    def NumRowsAppended(self) -> int:
+        """The number of rows on the write streams, going by the offsets each stream has reached.
+        Once Run has returned, every one of them has been acknowledged at its offset.
+        """
+        return sum(self._streamOffsets)
+
+    def Resume(self, journaledRequests:List[JournaledRequest], resumedStreams:Set[int], readRequestRows:Callable[[JournaledRequest], List[Tuple]]) -> bool:
+        """Carry on from the requests a previous run recorded in the sync journal, before Run sends the rest of the day.
+
+        For a write stream that was resumed, only the requests that were never acknowledged are sent again, at their original offsets.
+        If the stream did receive one of them, BigQuery answers ALREADY_EXISTS, which the send window accepts.
+        For a write stream that no longer exists, a new stream is created and every one of its requests is sent again.
+        Either way the rows are re-read by id, a request at a time, and afterwards each stream continues from the end of its last recorded request.
+
+        :param journaledRequests: Every request recorded for the day, ordered by stream and then offset
+        :type journaledRequests: List[JournaledRequest]
+        :param resumedStreams: The indices of the write streams that were resumed
+        :type resumedStreams: Set[int]
+        :param readRequestRows: Reads the log entries with the ids of the given request
+        :type readRequestRows: Callable[[JournaledRequest], List[Tuple]]
+        :return: False if a request's log entries no longer match what was recorded, in which case the day must be synced from scratch
+        :rtype: bool
+        """
+        columnIndex = {name : i for i, name in enumerate(MySQLInterface.GetLogEntryColumns(self._formatType))}
+        jsonValidator = JsonValidator.FromConfig(self._config)
+        encoder = BigQueryWriteInterface.GetRowBatchEncoder(columnIndex, self._formatType, jsonValidator)
+        numResentRequests = 0
+
+        for journaledRequest in journaledRequests:
+            streamIndex = journaledRequest.streamIndex
+            numPreviousRequests = self._streamRequestCounts[streamIndex]
+
+            if streamIndex not in resumedStreams or not journaledRequest.acknowledged:
+                with self.metrics.Time("fetch"):
+                    rows = readRequestRows(journaledRequest)
+                if len(rows) != journaledRequest.numRows:
+                    Logger.Log(f"Request at offset: {str(journaledRequest.offset)} of stream: {str(streamIndex + 1)} recorded {str(journaledRequest.numRows)} rows, "\
+                               f"but only {str(len(rows))} of its log entries could be read", logging.WARNING)
+                    return False
+
+                requestBuilder = AppendRowsRequestBuilder(self._maxRequestSizeInBytes)
+                for serializedRowData in LogSyncPipeline.EncodeBatch(encoder, jsonValidator, rows, self.metrics):
+                    if not requestBuilder.TryAdd(serializedRowData):
+                        raise Exception(f"The log entries of the request at offset: {str(journaledRequest.offset)} of stream: {str(streamIndex + 1)} no longer fit in a single request")
+
+                Logger.Log(f"Resending append rows request number: {str(numPreviousRequests + 1)} for stream: {str(streamIndex + 1)} "\
+                           f"containing {str(journaledRequest.numRows)} rows with offset: {str(journaledRequest.offset)}", logging.INFO)
+                numBytes = requestBuilder.SizeInBytes
+                self._send(requestBuilder.Build(journaledRequest.offset), streamIndex, numPreviousRequests, journaledRequest.offset, journaledRequest.numRows, journaledRequest.ids, numBytes)
+                numResentRequests += 1
+
+            self.exportedIds = self.exportedIds.Union(journaledRequest.ids)
+            self._streamOffsets[streamIndex] = journaledRequest.offset + journaledRequest.numRows
+            self._streamRequestCounts[streamIndex] += 1
+            self._numRequests += 1
+
+        self.metrics.Count("requests_resent", numResentRequests)
+        self.metrics.Count("invalid_json", jsonValidator.numInvalid)
+        Logger.Log(f"Resumed from {str(len(journaledRequests))} recorded append rows requests, {str(numResentRequests)} of which were sent again", logging.INFO)
+        return True
+
+    def Run(self, logEntries:Union[LogEntryStream, ChunkedLogEntryStream]) -> Tuple[int, int]:
+        """Drain the given log entry stream through the pipeline, sending every row to the BigQuery write stream.
+
+        :param logEntries: An open stream of all the log entries to send
+        :type logEntries: Union[LogEntryStream, ChunkedLogEntryStream]
+        :raises Exception: Any exception raised by the reader or serializer threads is re-raised here
+        :return: The number of rows exported and the number of append rows requests sent, respectively
+        :rtype: Tuple[int, int]
+        """
+        return self._runStages(self._readingThreads(logEntries), lambda: self._runSender(self._numSerializers), logEntries)
+
+    def Stage(self, logEntries:Union[LogEntryStream, ChunkedLogEntryStream], stagedFile:StagedLogFile) -> int:
+        """Drain the given log entry stream through the reader and serializers into a local staged file, rather than to BigQuery.
+        Each batch is written as soon as it's serialized, in the order it was read, and its share of the memory budget given back,
+        so the day is read from MySQL as fast as it can be serialized, and the stream can be closed before any of it is uploaded.
+
+        :param logEntries: An open stream of all the log entries to stage
+        :type logEntries: Union[LogEntryStream, ChunkedLogEntryStream]
+        :param stagedFile: The file to write the serialized rows to
+        :type stagedFile: StagedLogFile
+        :raises Exception: Any exception raised by the reader or serializer threads is re-raised here
+        :return: The number of rows staged
+        :rtype: int
+        """
+        return self._runStages(self._readingThreads(logEntries), lambda: self._runStagedWriter(stagedFile), logEntries)
+
+    def Upload(self, stagedFile:StagedLogFile) -> Tuple[int, int]:
+        """Send every row of a staged file to the BigQuery write stream, as Run would have sent them.
+        A reader thread decompresses the file's blocks and hands them straight to the sender, so nothing is serialized again.
+
+        :param stagedFile: A file written by Stage
+        :type stagedFile: StagedLogFile
+        :raises Exception: Any exception raised by the staged file reader is re-raised here
+        :return: The number of rows exported and the number of append rows requests sent, respectively
+        :rtype: Tuple[int, int]
+        """
+        stagedReader = threading.Thread(target=self._runStagedReader, args=(stagedFile,), name="LogSyncStagedReader", daemon=True)
+        return self._runStages([stagedReader], lambda: self._runSender(1))
+
+    @staticmethod
+    def EncodeBatch(encoder:Any, jsonValidator:JsonValidator, batch:List[Tuple], metrics:SyncMetrics) -> List[bytes]:
+        """Encode a batch of rows with the given encoder, adding the time taken to the metrics' validate and serialize stages.
+        JSON columns are validated as part of encoding, so the validator's own timing is split out of the serialize stage.
+
+        :return: The proto2 serialized LogRecords, one per row
+        :rtype: List[bytes]
+        """
+        secondsParsingBefore = jsonValidator.secondsParsing
+        start = perf_counter()
+        serializedRows = encoder.EncodeBatch(batch)
+        secondsValidating = jsonValidator.secondsParsing - secondsParsingBefore
+
+        metrics.AddTime("validate", secondsValidating)
+        metrics.AddTime("serialize", perf_counter() - start - secondsValidating)
+        return serializedRows
+
+    # *** PRIVATE METHODS ***
+
+    def _readingThreads(self, logEntries:Union[LogEntryStream, ChunkedLogEntryStream]) -> List[threading.Thread]:
+        reader = threading.Thread(target=self._runReader, args=(logEntries,), name="LogSyncReader", daemon=True)
+        serializers = [threading.Thread(target=self._runSerializer, args=(logEntries.columnIndex,), name=f"LogSyncSerializer{i}", daemon=True)
+                       for i in range(self._numSerializers)]
+        return [reader] + serializers
+
+    def _runStages(self, threads:List[threading.Thread], runLastStage:Callable[[], Any],
+                   logEntries:Optional[Union[LogEntryStream, ChunkedLogEntryStream]] = None) -> Any:
+        # Run the last stage on the calling thread, while the given threads feed it
+        for thread in threads:
+            thread.start()
+
+        try:
+            result = runLastStage()
+        except BaseException as err:
+            self._fail(err)
+            raise
+        finally:
+            self._stopEvent.set()
+            for thread in threads:
+                thread.join()
+
+            # Give back whatever is still held in the memory budget, e.g. batches that were dropped when the day failed
+            self._releaseAllMemory()
+
+            self.metrics.Count("already_appended", self.sendWindow.numAlreadyExists)
+            self.metrics.Count("stream_reconnects", self._bqWriteInterface.numReconnects)
+            if isinstance(logEntries, ChunkedLogEntryStream):
+                self.metrics.Count("read_retries", logEntries.numRetries)
+
+        if self._error is not None:
+            raise self._error
+
+        return result
+
+    def _fail(self, err:BaseException) -> None:
+        if self._error is None:
+            self._error = err
+        self._stopEvent.set()
+
+    def _put(self, targetQueue:queue.Queue, item:Any) -> bool:
+        # Block until there is room in the queue, but give up if another stage has failed
+        while not self._stopEvent.is_set():
+            try:
+                targetQueue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, sourceQueue:queue.Queue) -> Any:
+        while not self._stopEvent.is_set():
+            try:
+                return sourceQueue.get(timeout=0.5)
+            except queue.Empty:
+                pass
+        return _END_OF_STREAM
+
+    def _getSerialized(self, requestBuilder:Optional[AppendRowsRequestBuilder]) -> Any:
+        if self._budget is None or requestBuilder is None:
+            return self._get(self._serializedQueue)
+
+        while not self._stopEvent.is_set():
+            try:
+                return self._serializedQueue.get(timeout=0.1)
+            except queue.Empty:
+                # A reader is waiting on the memory budget, which the rows in this request hold until it's sent and acknowledged
+                if self._budget.NumWaiting > 0 and requestBuilder.NumRows > 0:
+                    Logger.Log(f"Memory budget of {self._budget.maxBytes} bytes is used up, sending a partly built request of {requestBuilder.NumRows} rows", logging.DEBUG)
+                    self._sendRequest(requestBuilder)
+        return _END_OF_STREAM
+
+    def _reserveMemory(self, numBytes:int) -> Optional[int]:
+        # Take a batch's estimated size from the memory budget, waiting for room. Returns None if the pipeline stopped while waiting.
+        if self._budget is None:
+            return 0
+
+        start = perf_counter()
+        while not self._budget.Acquire(numBytes):
+            if self._stopEvent.is_set():
+                return None
+        self.metrics.AddTime("memory_wait", perf_counter() - start)
+
+        with self._reservationLock:
+            self._reservedBytes += numBytes
+        return numBytes
+
+    def _releaseMemory(self, numBytes:int) -> None:
+        with self._reservationLock:
+            # Once the pipeline has given everything back, late acknowledgements have nothing left to release
+            if self._reservationsReleased:
+                return
+            self._reservedBytes -= numBytes
+        self._budget.Release(numBytes)
+
+    def _releaseAllMemory(self) -> None:
+        if self._budget is None:
+            return
+        with self._reservationLock:
+            self._reservationsReleased = True
+            numBytes = self._reservedBytes
+            self._reservedBytes = 0
+        self._budget.Release(numBytes)
+
+    def _runReader(self, logEntries:Union[LogEntryStream, ChunkedLogEntryStream]) -> None:
+        try:
+            batches = iter(logEntries)
+            seq = 0
+            while True:
+                if self._tuner is not None:
+                    logEntries.batch_size = self._tuner.FetchBatchSize
+                start = perf_counter()
+                batch = next(batches, None)
+                secondsFetching = perf_counter() - start
+                self.metrics.AddTime("fetch", secondsFetching)
+                if batch is None:
+                    break
+                if self._tuner is not None:
+                    self._tuner.RecordFetch(len(batch), secondsFetching)
+
+                self.metrics.Count("rows_read", len(batch))
+                if isinstance(logEntries, ChunkedLogEntryStream):
+                    self.metrics.SampleQueueDepth("chunk_batches", logEntries.NumQueuedBatches)
+                reservedBytes = self._reserveMemory(MemoryBudget.EstimateBatchBytes(batch) if self._budget is not None else 0)
+                if reservedBytes is None:
+                    return
+
+                self.metrics.SampleQueueDepth("rows", self._rowQueue.qsize())
+                if not self._put(self._rowQueue, (seq, batch, reservedBytes)):
+                    return
+                seq += 1
+        except BaseException as err:
+            Logger.Log(f"Reading log entries from MySQL failed: {type(err)} {str(err)}", logging.ERROR)
+            self._fail(err)
+        finally:
+            # Tell every serializer that we're done
+            for _ in range(self._numSerializers):
+                if not self._put(self._rowQueue, _END_OF_STREAM):
+                    break
+
+    def _runSerializer(self, columnIndex:Dict[str, int]) -> None:
+        try:
+            jsonValidator = JsonValidator.FromConfig(self._config)
+            encoder = BigQueryWriteInterface.GetRowBatchEncoder(columnIndex, self._formatType, jsonValidator)
+            idIndex = columnIndex['id']
+
+            while True:
+                item = self._get(self._rowQueue)
+                if item is _END_OF_STREAM:
+                    break
+
+                seq, batch, reservedBytes = item
+                start = perf_counter()
+                if self._serializerPool is not None:
+                    serializedRows = self._serializerPool.EncodeBatch(self._config, columnIndex, self._formatType, batch, self.metrics)
+                else:
+                    serializedRows = LogSyncPipeline.EncodeBatch(encoder, jsonValidator, batch, self.metrics)
+                if self._tuner is not None:
+                    self._tuner.RecordSerialized(len(batch), sum(len(serializedRow) for serializedRow in serializedRows), perf_counter() - start)
+                ids = [row[idIndex] for row in batch]
+
+                self.metrics.SampleQueueDepth("serialized", self._serializedQueue.qsize())
+                if not self._put(self._serializedQueue, (seq, serializedRows, ids, reservedBytes)):
+                    return
+            self.metrics.Count("invalid_json", jsonValidator.numInvalid)
+        except BaseException as err:
+            Logger.Log(f"Serializing log entries failed: {type(err)} {str(err)}", logging.ERROR)
+            self._fail(err)
+        finally:
+            self._put(self._serializedQueue, _END_OF_STREAM)
+
+    def _orderedBatches(self, numProducers:int, requestBuilder:Optional[AppendRowsRequestBuilder] = None) -> Iterator[Tuple[List[bytes], List[int], int]]:
+        # Serializers can finish out of order, so hold early batches until it's their turn
+        pendingBatches : Dict[int, Tuple[List[bytes], List[int], int]] = {}
+        nextSeq = 0
+        numProducersDone = 0
+
+        while numProducersDone < numProducers:
+            item = self._getSerialized(requestBuilder)
+            if self._stopEvent.is_set():
+                break
+            if item is _END_OF_STREAM:
+                numProducersDone += 1
+                continue
+
+            seq, serializedRows, ids, reservedBytes = item
+            pendingBatches[seq] = (serializedRows, ids, reservedBytes)
+
+            while nextSeq in pendingBatches:
+                yield pendingBatches.pop(nextSeq)
+                nextSeq += 1
+
+    def _runStagedWriter(self, stagedFile:StagedLogFile) -> int:
+        for serializedRows, ids, reservedBytes in self._orderedBatches(self._numSerializers):
+            with self.metrics.Time("stage_write"):
+                stagedFile.WriteBatch(serializedRows, ids)
+            # The batch is on disk now, so its rows no longer count against the memory budget
+            if reservedBytes > 0:
+                self._releaseMemory(reservedBytes)
+
+        if self._error is not None:
+            raise self._error
+
+        with self.metrics.Time("stage_write"):
+            stagedFile.FinishWriting()
+        self.metrics.Count("bytes_staged", stagedFile.SizeInBytes)
+        return stagedFile.numRows
+
+    def _runStagedReader(self, stagedFile:StagedLogFile) -> None:
+        try:
+            batches = iter(stagedFile.ReadBatches())
+            seq = 0
+            while True:
+                start = perf_counter()
+                batch = next(batches, None)
+                self.metrics.AddTime("stage_read", perf_counter() - start)
+                if batch is None:
+                    break
+
+                serializedRows, ids = batch
+                reservedBytes = self._reserveMemory(sum(len(serializedRow) for serializedRow in serializedRows) if self._budget is not None else 0)
+                if reservedBytes is None:
+                    return
+
+                self.metrics.SampleQueueDepth("serialized", self._serializedQueue.qsize())
+                if not self._put(self._serializedQueue, (seq, serializedRows, ids, reservedBytes)):
+                    return
+                seq += 1
+        except BaseException as err:
+            Logger.Log(f"Reading staged log entries from {stagedFile.path} failed: {type(err)} {str(err)}", logging.ERROR)
+            self._fail(err)
+        finally:
+            self._put(self._serializedQueue, _END_OF_STREAM)
+
+    def _runSender(self, numProducers:int) -> Tuple[int, int]:
+        numExportedRows = 0
+        requestBuilder = AppendRowsRequestBuilder(self._maxRequestSizeInBytes)
+
+        for serializedRows, ids, reservedBytes in self._orderedBatches(numProducers, requestBuilder):
+            for i, serializedRowData in enumerate(serializedRows):
+                # If adding this row to the request would push it over the max request limit of 10 MB
+                # we'll send the request and start a new request before adding the row
+                if not requestBuilder.TryAdd(serializedRowData):
+                    self._sendRequest(requestBuilder)
+                    requestBuilder.TryAdd(serializedRowData)
+
+                self._requestIds.append(ids[i])
+                numExportedRows += 1
+
+            # The batch's rows are held until the request with its last row is acknowledged
+            self._requestReservedBytes += reservedBytes
+
+        if self._error is not None:
+            raise self._error
+
+        # If we have a request with rows that hasn't been sent yet, send it now
+        if not requestBuilder.NumRows == 0:
+            self._sendRequest(requestBuilder, isFinal=True)
+
+        # Surface any failed appends now, before the streams are committed
+        with self.metrics.Time("append"):
+            self.sendWindow.Drain()
+        Logger.Log(f"All {str(self.sendWindow.numAcknowledged)} append rows requests acknowledged", logging.DEBUG)
+
+        return (numExportedRows, self._numRequests)
+
+    def _sendRequest(self, requestBuilder:AppendRowsRequestBuilder, isFinal:bool=False) -> None:
+        # Requests are dealt out to the write streams round-robin, each stream keeping its own offset.
+        # The offset of the first request on a stream should be zero, and the offset of subsequent requests
+        # should be equal to the number of rows we've previously sent on that stream.
+        streamIndex = self._numRequests % self._bqWriteInterface.num_streams
+        offset = self._streamOffsets[streamIndex]
+        numPreviousRequests = self._streamRequestCounts[streamIndex]
+        numRowsInRequest = requestBuilder.NumRows
+
+        Logger.Log(f"Request size: {str(requestBuilder.SizeInBytes)} bytes", logging.DEBUG)
+        Logger.Log(f"Creating {'final ' if isFinal else ''}append rows request number: {str(numPreviousRequests + 1)} for stream: {str(streamIndex + 1)} "\
+                   f"containing {str(numRowsInRequest)} rows with offset: {str(offset)} and sending", logging.INFO)
+
+        # The size of a single AppendRowsRequest must be less than 10 MB in size
+        # https://cloud.google.com/python/docs/reference/bigquerystorage/latest/google.cloud.bigquery_storage_v1.client.BigQueryWriteClient
+        numBytes = requestBuilder.SizeInBytes
+        bqAppendRowsRequest = requestBuilder.Build(offset)
+
+        requestIds = IdRangeSet.FromIds(self._requestIds)
+        self._requestIds = []
+        reservedBytes = self._requestReservedBytes
+        self._requestReservedBytes = 0
+
+        self._send(bqAppendRowsRequest, streamIndex, numPreviousRequests, offset, numRowsInRequest, requestIds, numBytes, reservedBytes)
+        self.exportedIds = self.exportedIds.Union(requestIds)
+
+        self._streamOffsets[streamIndex] += numRowsInRequest
+        self._streamRequestCounts[streamIndex] += 1
+        self._numRequests += 1
+
+        # Pick up any settings the tuner has moved since the last request
+        if self._tuner is not None:
+            requestBuilder.maxRequestSizeInBytes = self._tuner.RequestSizeInBytes
+            self.sendWindow.maxInFlight = self._tuner.MaxInFlight
+
+    def _acknowledge(self, streamIndex:int, offset:int, numRows:int) -> None:
+        self._checkpoint.AcknowledgeRequest(streamIndex, offset)
+
+    def _send(self, bqAppendRowsRequest:Any, streamIndex:int, numPreviousRequests:int, offset:int, numRows:int, requestIds:IdRangeSet, numBytes:int,
+              reservedBytes:int = 0) -> None:
+        # Record the request before sending it, so a restarted run knows which rows may already be at this offset
+        if self._checkpoint is not None:
+            self._checkpoint.RecordRequest(streamIndex, offset, numRows, requestIds)
+
+        # Send the request via the stream, and track its response in the send window. This waits if too many requests are in flight.
+        start = perf_counter()
+        future = self._bqWriteInterface.SendAppendRowsRequest(numPreviousRequests, bqAppendRowsRequest, streamIndex)
+
+        # The first request on a stream is what creates it, possibly after a few attempts
+        if self._checkpoint is not None and numPreviousRequests == 0:
+            self._checkpoint.RecordStream(streamIndex, self._bqWriteInterface.write_streams[streamIndex].name)
+
+        if self._tuner is not None:
+            future.add_done_callback(self._recordAppendTime(numBytes, start))
+        if reservedBytes > 0:
+            future.add_done_callback(lambda _: self._releaseMemory(reservedBytes))
+
+        self.metrics.SampleQueueDepth("in_flight", self.sendWindow.NumInFlight)
+        waitStart = perf_counter()
+        self.sendWindow.Add(numPreviousRequests, offset, numRows, future, streamIndex)
+        if self._tuner is not None:
+            self._tuner.RecordSendWait(perf_counter() - waitStart)
+        self.metrics.AddTime("append", perf_counter() - start)
+
+        self.metrics.Count("requests")
+        self.metrics.Count("rows_sent", numRows)
+        self.metrics.Count("bytes_sent", numBytes)
+
+    def _recordAppendTime(self, numBytes:int, sentAt:float) -> Callable[[Any], None]:
+        # Called on the append rows stream's thread once the request's response arrives
+        def _onDone(future:Any) -> None:
+            if future.exception() is None:
+                self._tuner.RecordAppend(numBytes, perf_counter() - sentAt)
+        return _onDone
@@ -0,0 +1,118 @@
+# Standard module imports
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# resource is only available on Unix, so peak RSS isn't measured elsewhere
+try:
+    import resource
+except ImportError:
+    resource = None
+
+class MemoryBudget:
+    """A limit on the bytes of log entries that the sync pipelines of a process hold in memory at once, from when a batch of rows is read
+    from MySQL until the append rows request holding its last row is acknowledged by BigQuery.
+
+    Readers Acquire a batch's estimated size before passing it on, and wait while the budget is used up, so MySQL is only read as fast as
+    BigQuery takes the rows. A batch is always let through when nothing else holds the budget, so a single batch larger than the budget
+    can still be synced. Sizes are estimates from the lengths of each row's values, and the interpreter and libraries use memory on top of them,
+    so the budget should be set somewhat below the memory the runner actually has.
+    Every pipeline with the same MAX_MEMORY in its config shares one budget, through ForConfig, so parallel days and games are limited together.
+    All methods are safe to call from several threads.
+    """
+
+    _budgets : Dict[int, "MemoryBudget"] = {}
+    _budgetsLock : threading.Lock = threading.Lock()
+
+    # Rough overhead of each row's tuple, and of each value in it, beyond the bytes of its strings
+    ROW_OVERHEAD_BYTES   : int = 64
+    VALUE_OVERHEAD_BYTES : int = 16
+
+    def __init__(self, maxBytes:int):
+        self.maxBytes     : int = max(1, maxBytes)
+        self.peakBytes    : int = 0
+        self._usedBytes   : int = 0
+        self._numWaiting  : int = 0
+        self._condition   : threading.Condition = threading.Condition()
+
+    @staticmethod
+    def ForConfig(config:Dict[str, Any]) -> Optional["MemoryBudget"]:
+        """Get the process's budget for SYNC_CONFIG's MAX_MEMORY, or None if it isn't set.
+        """
+        maxMemory = config.get("SYNC_CONFIG", {}).get("MAX_MEMORY", "")
+        if maxMemory in ("", None, 0):
+            return None
+        maxBytes = MemoryBudget.ParseSize(maxMemory)
+        with MemoryBudget._budgetsLock:
+            if maxBytes not in MemoryBudget._budgets:
+                MemoryBudget._budgets[maxBytes] = MemoryBudget(maxBytes)
+            return MemoryBudget._budgets[maxBytes]
+
+    @staticmethod
+    def ParseSize(size:Any) -> int:
+        """Parse a number of bytes, given either as a number or as a string with an optional K, M or G suffix, e.g. "512M" or "2G"
+        """
+        text = str(size).strip().upper().rstrip("B")
+        multipliers = {"K" : 1024, "M" : 1024 ** 2, "G" : 1024 ** 3}
+        try:
+            if len(text) > 0 and text[-1] in multipliers:
+                return int(float(text[:-1]) * multipliers[text[-1]])
+            return int(float(text))
+        except ValueError:
+            raise Exception(f"Unsupported memory size: {size}, expected a number of bytes, optionally followed by K, M or G")
+
+    @staticmethod
+    def EstimateBatchBytes(batch:List[Tuple]) -> int:
+        numBytes = 0
+        for row in batch:
+            numBytes += MemoryBudget.ROW_OVERHEAD_BYTES
+            for value in row:
+                numBytes += MemoryBudget.VALUE_OVERHEAD_BYTES + (len(value) if isinstance(value, (str, bytes, bytearray)) else 8)
+        return numBytes
+
+    @staticmethod
+    def PeakRSSBytes() -> int:
+        """The peak resident set size of this process so far, or 0 where it can't be measured
+        """
+        if resource is None:
+            return 0
+        # ru_maxrss is in kilobytes on Linux, and bytes on macOS
+        maxRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxRSS if sys.platform == "darwin" else maxRSS * 1024
+
+    @property
+    def UsedBytes(self) -> int:
+        with self._condition:
+            return self._usedBytes
+
+    @property
+    def NumWaiting(self) -> int:
+        """The number of readers waiting for room in the budget. Senders should flush partly built requests while this is above zero,
+        since the rows in them can't be released until they're sent.
+        """
+        with self._condition:
+            return self._numWaiting
+
+    def Acquire(self, numBytes:int, timeout:float = 0.5) -> bool:
+        """Take numBytes from the budget, waiting up to timeout seconds for room.
+
+        :return: True if the bytes were taken, False if there still wasn't room when the timeout ran out
+        :rtype: bool
+        """
+        with self._condition:
+            if self._usedBytes > 0 and self._usedBytes + numBytes > self.maxBytes:
+                self._numWaiting += 1
+                try:
+                    hasRoom = self._condition.wait_for(lambda: self._usedBytes == 0 or self._usedBytes + numBytes <= self.maxBytes, timeout)
+                finally:
+                    self._numWaiting -= 1
+                if not hasRoom:
+                    return False
+            self._usedBytes += numBytes
+            self.peakBytes = max(self.peakBytes, self._usedBytes)
+            return True
+
+    def Release(self, numBytes:int) -> None:
+        with self._condition:
+            self._usedBytes = max(0, self._usedBytes - numBytes)
+            self._condition.notify_all()
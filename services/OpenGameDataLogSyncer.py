@@ -1,18 +1,25 @@
 # Standard module imports
 import logging
 import sys
-from datetime import datetime
-from typing import Any, Dict, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 # Local module imports
 from interfaces.BigQueryInterface import BigQueryInterface, BigQueryWriteInterface, SourceDataRowFormatType
-from interfaces.MySQLInterface import MySQLInterface
+from interfaces.IdRangeSet import IdRangeSet
+from interfaces.MySQLInterface import ChunkedLogEntryStream, LogEntryStream, MySQLConnectionPool, MySQLInterface
+from interfaces.StagedLogFile import StagedLogFile
+from interfaces.SyncJournal import DayCheckpoint, SyncJournal
+from services.LogLoadPipeline import LogLoadPipeline
+from services.LogSyncPipeline import LogSyncPipeline
+from services.SerializerProcessPool import SerializerProcessPool
 from schemas import BigQueryLogTableSchema # Specifies the list of columns for our BigQuery table schema - used for table creation calls
+from services.SyncAutotuner import SyncAutotuner
+from services.SyncMetrics import SyncMetrics
 from utils import Logger
 
-# pip module imports
-from google.cloud.bigquery_storage_v1 import types
-
 # This class facilitates the migration of log entries from MySQL to BigQuery
 class OpenGameDataLogSyncer:
     """Class to sync all log entries for a specified OGD log table, batched by date
@@ -22,216 +29,530 @@ class OpenGameDataLogSyncer:
         self._config  = config
         self._mysqlInterface: Optional[MySQLInterface] = None
 
-    def SyncAll(self, maxDaysToSync:int = 100) -> int:
+    def SyncAll(self, maxDaysToSync:int = 100, parallelDays:int = 1) -> int:
         """Function to synchronize as much data as possible to long-term storage.
         Uses a limit on the number of days to synchronize, to ensure we don't have the process run an overlong time.
 
         Performed in the following steps:
-        1. Get date of the oldest unmigrated row in MySQL table (oldest row where synced = 0)
-        2. Create a BigQuery table for that date if a table doesn't already exist
+        1. Get every date with unmigrated rows in MySQL table (rows where synced = 0), with a single query, oldest first
+        2. For the oldest date in that list, create a BigQuery table for that date if a table doesn't already exist
         3. Get all MySQL rows for that date
         4. Send all MySQL rows for that date to BigQuery and commit
-        5. Set the synced field to 1 for all MySQL rows for that date
-           There is a risk that new log entries for that date will be added to MySQL between steps 3 and 5, but this should not
-           happen. The alternative would be storing potentially millions of ids and using that as the WHERE criteria for the UPDATE, 
-           which could be a performance nightmare.
-        6. Go back to Step 1. 
+        5. Set the synced field to 1 for exactly the MySQL rows that were sent for that date
+           The ids sent are kept as intervals of consecutive ids rather than millions of individual ids, and marked by primary key
+           in chunks, so log entries added to MySQL for that date between steps 3 and 5 are left unsynced for the next run.
+        6. Go back to Step 2 with the next date in the list. 
+
+        If parallelDays is more than 1, the dates in the list are instead synced concurrently by SyncDaysInParallel.
 
         :param maxDaysToSync: The maximum number of days-worth of data to synchronize, defaults to 100
         :type maxDaysToSync: int, optional
+        :param parallelDays: The maximum number of days to synchronize at the same time, defaults to 1
+        :type parallelDays: int, optional
         :return: The number of days synchronized to long-term storage.
         :rtype: int
         """
-        
+
+        # Fork any serializer processes before the MySQL tunnel and BigQuery clients start threads of their own
+        SerializerProcessPool.ForConfig(self._config)
+
         # Establish a MySQL connection, set long timeouts for our session
         self._mysqlInterface = MySQLInterface(self._config)
         self._mysqlInterface.SetSessionVariables()
-        
-        # Get the oldest date for a log entry that we're able to sync
-        dateToMigrate = self._mysqlInterface.GetOldestUnmigratedDate()
 
-        if dateToMigrate is None:
+        # Get every date with log entries that we're able to sync, so we don't have to go back to the database after each day
+        datesToMigrate = self._mysqlInterface.GetUnmigratedDateCounts(maxDaysToSync)
+
+        if len(datesToMigrate) == 0:
             Logger.Log('No MySQL entries require migration to BigQuery', logging.INFO)
             return 0
 
+        Logger.Log(f"Found {len(datesToMigrate)} days with unsynced log entries, from {str(datesToMigrate[0][0])} to {str(datesToMigrate[-1][0])}", logging.INFO)
+
+        MySQLConnectionPool.CheckPoolSize(self._config, min(parallelDays, len(datesToMigrate)))
+
+        if parallelDays > 1:
+            # Each worker opens its own connection, so give the planning connection back rather than holding it for the whole run
+            self._mysqlInterface.Close()
+            return self.SyncDaysInParallel([dateToMigrate for dateToMigrate, _ in datesToMigrate], parallelDays)
+
         # Number of days we've sync'd for this execution of SyncAll()
         numDaysSynced = 0
 
-        # While we still have a day with unmigrated rows, and haven't reached our limit of days
-        while dateToMigrate is not None and numDaysSynced < maxDaysToSync:
+        for dateToMigrate, numUnsyncedRows in datesToMigrate:
 
-            Logger.Log("Oldest unsynced log entry found for date: " + str(dateToMigrate))
+            Logger.Log(f"Oldest unsynced log entry found for date: {str(dateToMigrate)}, with {numUnsyncedRows} unsynced entries")
             self.SyncDate(dateToMigrate)
 
-            # Get the next oldest date with unmigrated rows
-            dateToMigrate = self._mysqlInterface.GetOldestUnmigratedDate()
-
             numDaysSynced += 1
             
         return numDaysSynced
 
-    def SyncDate(self, dateToMigrate:datetime.date) -> None:
+    def SyncDaysInParallel(self, datesToMigrate:List[date], parallelDays:int) -> int:
+        """Function to synchronize several dates concurrently, with a bounded pool of workers.
+
+        Each day is written to its own table shard through its own PENDING write stream, so days are independent of one another.
+        Every worker thread opens its own MySQL connection, which it reuses for each of the days it syncs,
+        and SyncDate creates a separate BigQuery write interface for every day, so per-day commit and verification are unchanged.
+        If any day fails, days that have not yet started are cancelled, and the first error is raised once running days finish.
+
+        :param datesToMigrate: The dates to synchronize
+        :type datesToMigrate: List[date]
+        :param parallelDays: The maximum number of days to synchronize at the same time
+        :type parallelDays: int
+        :return: The number of days synchronized to long-term storage.
+        :rtype: int
+        """
+        workerState = threading.local()
+        workerInterfaces : List[MySQLInterface] = []
+        workerInterfacesLock = threading.Lock()
+
+        def _syncDateOnWorker(dateToMigrate:date) -> None:
+            mysqlInterface = getattr(workerState, "mysqlInterface", None)
+            if mysqlInterface is None:
+                mysqlInterface = MySQLInterface(self._config)
+                mysqlInterface.SetSessionVariables()
+                workerState.mysqlInterface = mysqlInterface
+                with workerInterfacesLock:
+                    workerInterfaces.append(mysqlInterface)
+            try:
+                self.SyncDate(dateToMigrate, mysqlInterface)
+            except BaseException:
+                # The failed day may have left the connection unusable, so the worker's next day opens a new one
+                workerState.mysqlInterface = None
+                with workerInterfacesLock:
+                    workerInterfaces.remove(mysqlInterface)
+                mysqlInterface.Close()
+                raise
+
+        Logger.Log(f"Syncing {len(datesToMigrate)} days with up to {parallelDays} days at a time", logging.INFO)
+
+        numDaysSynced = 0
+        firstError : Optional[BaseException] = None
+
+        with ThreadPoolExecutor(max_workers=parallelDays, thread_name_prefix="SyncDay") as executor:
+            futures = {executor.submit(_syncDateOnWorker, dateToMigrate) : dateToMigrate for dateToMigrate in datesToMigrate}
+
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                err = future.exception()
+                if err is None:
+                    numDaysSynced += 1
+                else:
+                    Logger.Log(f"Failed to sync log entries for {str(futures[future])}: {type(err)} {str(err)}", logging.ERROR)
+                    if firstError is None:
+                        firstError = err
+                        for pendingFuture in futures:
+                            pendingFuture.cancel()
+
+        for mysqlInterface in workerInterfaces:
+            mysqlInterface.Close()
+
+        if firstError is not None:
+            raise firstError
+
+        return numDaysSynced
+
+    def SyncDate(self, dateToMigrate:datetime.date, mysqlInterface:Optional[MySQLInterface] = None) -> None:
         """Function to synchronize an individual date.
         
         Performed in the following steps:
-        1. For a given day fetch a cursor for all the day's log rows in MySQL
+        1. For a given day open a stream of all the day's log rows in MySQL
         2. Create a BigQuery table following the naming convention {TableBasename}_YYYYMMDD if one doesn't exist
-        3. Create a "PENDING" mode BigQuery write stream
+             If PARTITIONED_TABLE is set, every day instead goes to a single {TableBasename} table, partitioned by day on server_time
+             and clustered on session_id and event_name, which is created the first time. The day's rows are written to its partition
+             through the {TableBasename}$YYYYMMDD partition decorator, and counted by filtering on server_time.
+        3. Create one or more "PENDING" mode BigQuery write streams
              Pending mode: Records are buffered in a pending state until you commit the stream. When you commit a stream, 
              all of the pending data becomes available for reading. The commit is an atomic operation. Use this mode for 
              batch workloads, as an alternative to BigQuery load jobs.
              https://cloud.google.com/bigquery/docs/write-api#application-created_streams
-        3. Iterate over the MySQL cursor, creating requests containing batches of rows. Send each request to the stream when it nears the 10 MB limit.
-        4. Close, write, and commit the BigQuery write stream 
-        5. Close the MySQL cursor
+        3. Run the MySQL cursor through a LogSyncPipeline: a reader thread, serializer threads, and a sender overlap so the
+           database and BigQuery are both kept busy. The sender creates requests containing batches of rows, sending each
+           request to the stream when it nears the 10 MB limit.
+        4. Close and finalize the BigQuery write streams, and commit them in a single batch
+        5. Close the MySQL log entry stream
+
+        If SINK is LOAD_JOB, steps 3 and 4 are instead done by a LogLoadPipeline, which writes the day's rows to a compressed Parquet file
+        and loads it into the same table with a single load job. The load job's id identifies the rows it loads, so the checkpoint journal isn't used.
+
+        If STAGE_LOCALLY is set, steps 3 and 4 are split in two: the day's rows are serialized into a compressed StagedLogFile and the
+        log entry stream is closed, then the file is uploaded through the write streams. If appending, finalizing or committing fails,
+        the file is uploaded again on new write streams, up to STAGING_UPLOAD_ATTEMPTS times in all, without reading MySQL again.
+        The staged file stands in for the checkpoint journal within a run, so the journal isn't used.
+
+        If CHECKPOINT_JOURNAL_PATH is set, the day's progress is recorded in a SyncJournal as it goes.
+        If an earlier run died part way through the day, this run resumes the day's write streams, sends any requests that were never acknowledged
+        again, and reads only the log entries that weren't already sent. A day that had already been finalized or committed skips straight to that step.
+
+        If AUTOTUNE is set, a SyncAutotuner adjusts the request size, send window and fetch batch size while the day is streamed,
+        starting from the values it saved for the game's last day.
+
+        Time spent in each stage of the day, along with counts of rows, bytes, requests and retries, is gathered in a SyncMetrics and logged once the day is done.
+        If METRICS_REPORT_DIR is set, it is also written there as a JSON report for the day and a Prometheus textfile for the game.
 
         :param dateToMigrate: _description_
         :type dateToMigrate: datetime.date
+        :param mysqlInterface: The MySQL connection to read the day's log entries with, defaults to the connection opened by SyncAll
+        :type mysqlInterface: Optional[MySQLInterface], optional
         :raises Exception: _description_
         """
 
+        if mysqlInterface is None:
+            mysqlInterface = self._mysqlInterface
+
         _mysql_config = self._config.get('MYSQL_CONFIG', {})
         mysqlTablePath = f"{_mysql_config['DB_NAME']}.{_mysql_config['DB_TABLE']}"
 
-        _bq_config = self._config.get('BIGQUERY_CONFIG', {})
-        bqFqTableId = f"{_bq_config['PROJECT_ID']}.{_bq_config['DATASET_ID']}.{_bq_config['TABLE_BASENAME']}_{dateToMigrate.strftime('%Y%m%d')}"
-
+        partitioned = bool(self._config.get('BIGQUERY_CONFIG', {}).get("PARTITIONED_TABLE", False))
+        bqTableId, bqFqTableId = OpenGameDataLogSyncer.GetTableIds(self._config, dateToMigrate)
 
         Logger.Log("Begin syncing log entries for: " + str(dateToMigrate) + " from MySQL: " + mysqlTablePath + " to BigQuery: " + bqFqTableId)
+        metrics = SyncMetrics(_mysql_config['DB_TABLE'], dateToMigrate)
 
         # Get the number of migrated & unmigrated source rows for the given date
-        if self._mysqlInterface is not None:
-            migrationStatusCounts = self._mysqlInterface.GetMigrationStatusCountsByDate(dateToMigrate)
+        if mysqlInterface is not None:
+            migrationStatusCounts = mysqlInterface.GetMigrationStatusCountsByDate(dateToMigrate)
 
             Logger.Log(f'For: {str(dateToMigrate)} Found {str(migrationStatusCounts[0])} MySQL rows marked as requiring migration', logging.INFO)
             Logger.Log(f'For: {str(dateToMigrate)} Found {str(migrationStatusCounts[1])} MySQL rows marked as already migrated', logging.INFO)
 
             bqInterface = BigQueryInterface(self._config["BIGQUERY_CONFIG"])
+            numWriteStreams = int(self._config.get("SYNC_CONFIG", {}).get("WRITE_STREAMS_PER_DAY", 1))
+            useLoadJob = self._useLoadJob()
+            useStaging = bool(self._config.get("SYNC_CONFIG", {}).get("STAGE_LOCALLY", False)) and not useLoadJob
+            tuner = SyncAutotuner(self._config, _mysql_config['DB_TABLE']) if self._config.get("SYNC_CONFIG", {}).get("AUTOTUNE", False) and not useLoadJob else None
+
+            journal = self._openJournal() if not useLoadJob and not useStaging else None
+            succeeded = False
+            try:
+                checkpoint = journal.GetDay(dateToMigrate) if journal is not None else None
+                table = bqInterface.GetTable(bqTableId)
+                tableExists = table is not None
+
+                # Only resume a checkpoint that was written for the same table and streams as we'd use now
+                if checkpoint is not None and not (tableExists and checkpoint.tableId == bqFqTableId and checkpoint.numStreams == numWriteStreams):
+                    Logger.Log(f"For: {str(dateToMigrate)} ignoring checkpoint for {checkpoint.tableId} with {str(checkpoint.numStreams)} streams, which doesn't match the current table", logging.WARNING)
+                    checkpoint = None
+
+                numBqTableEntriesBefore = 0
+
+                if checkpoint is not None:
+                    # Rows appended to PENDING streams aren't visible until they're committed, so the count from the earlier run still stands
+                    numBqTableEntriesBefore = checkpoint.numRowsBefore
+                    Logger.Log(f"For: {str(dateToMigrate)} resuming from a checkpoint at stage {checkpoint.stage}, with {str(numBqTableEntriesBefore)} existing BigQuery rows.", logging.INFO)
+                # If the desination table exists
+                elif tableExists:
+
+                    # Get a count of existing entries
+                    numBqTableEntriesBefore = bqInterface.GetTableRowCount(bqFqTableId, table)
+                    Logger.Log(f"For: {str(dateToMigrate)} Found {str(numBqTableEntriesBefore)} existing BigQuery rows.", logging.INFO)
+                else:
+                    if partitioned:
+                        # Create the table that every day's partition goes in
+                        created = bqInterface.CreateTable(bqTableId, BigQueryLogTableSchema.schema,
+                                                          partitionField=BigQueryLogTableSchema.partition_field, clusteringFields=BigQueryLogTableSchema.clustering_fields)
+                    else:
+                        # Create the table
+                        created = bqInterface.CreateTable(bqFqTableId, BigQueryLogTableSchema.schema)
+
+                    # The table listing can be out of date, so a table created elsewhere since may already hold some of the day's rows,
+                    # which have to be counted for the day to be verified
+                    if not created:
+                        numBqTableEntriesBefore = bqInterface.GetTableRowCount(bqFqTableId, bqInterface.GetTable(bqTableId))
+                        Logger.Log(f"For: {str(dateToMigrate)} Found {str(numBqTableEntriesBefore)} existing BigQuery rows.", logging.INFO)
+
+                if journal is not None and checkpoint is None:
+                    checkpoint = journal.StartDay(dateToMigrate, bqFqTableId, numWriteStreams, numBqTableEntriesBefore)
+
+                # Get a write interface instance, which splits the day's rows across one or more PENDING write streams
+                if not useLoadJob:
+                    bqWriteInterface = BigQueryWriteInterface(self._config["BIGQUERY_CONFIG"], bqFqTableId, numWriteStreams)
+
+                # Explicitly set DEBUG log level to see the caught exceptions and debugging output from the Google libraries and API calls
+                if self._config["DEBUG_LEVEL"] == "DEBUG":
+                    logging.basicConfig(level=logging.DEBUG)
+
+                if checkpoint is not None and checkpoint.stage == SyncJournal.FINALIZING:
+                    with metrics.Time("finalize_commit"):
+                        committed = self._resumeCommit(bqWriteInterface, checkpoint)
+                    if not committed:
+                        checkpoint = journal.StartDay(dateToMigrate, bqFqTableId, numWriteStreams, numBqTableEntriesBefore)
+
+                # How many rows the write streams hold, by the acknowledged offsets and by BigQuery's count when they were finalized.
+                # These stay None if the day's rows were committed by an earlier run.
+                numRowsAppended  : Optional[int] = None
+                numRowsFinalized : Optional[int] = None
+
+                if useLoadJob:
+                    formatType = SourceDataRowFormatType[self._config["MYSQL_CONFIG"]["SOURCE_TYPE"]]
+                    numRowsAppended, numRowsFinalized, exportedIds = self._loadDate(dateToMigrate, formatType, mysqlInterface, bqInterface, bqFqTableId, metrics)
+                elif useStaging:
+                    formatType = SourceDataRowFormatType[self._config["MYSQL_CONFIG"]["SOURCE_TYPE"]]
+                    numRowsAppended, numRowsFinalized, exportedIds = self._stageDate(dateToMigrate, formatType, mysqlInterface, bqWriteInterface, bqFqTableId, numWriteStreams, metrics, tuner)
+                elif checkpoint is None or checkpoint.stage == SyncJournal.STREAMING:
+                    formatType = SourceDataRowFormatType[self._config["MYSQL_CONFIG"]["SOURCE_TYPE"]]
+
+                    # Read, serialize, and send the day's rows in overlapping stages
+                    pipeline = LogSyncPipeline(self._config, bqWriteInterface, formatType, checkpoint, metrics, tuner)
+
+                    journaledRequests = checkpoint.GetRequests() if checkpoint is not None else []
+                    if len(journaledRequests) > 0:
+                        resumedStreams = {streamIndex for streamIndex, streamName in checkpoint.GetStreamNames().items() if bqWriteInterface.ResumeWriteStream(streamIndex, streamName)}
+                        if not pipeline.Resume(journaledRequests, resumedStreams, lambda request: mysqlInterface.GetLogEntriesByIds(dateToMigrate, formatType, request.ids)):
+                            # The recorded requests can't be repeated, so abandon their streams uncommitted and start the day over
+                            Logger.Log(f"For: {str(dateToMigrate)} unable to resume from checkpoint, syncing the day from scratch", logging.WARNING)
+                            bqWriteInterface.CloseAppendRowsStreams()
+                            checkpoint = journal.StartDay(dateToMigrate, bqFqTableId, numWriteStreams, numBqTableEntriesBefore)
+                            bqWriteInterface = BigQueryWriteInterface(self._config["BIGQUERY_CONFIG"], bqFqTableId, numWriteStreams)
+                            pipeline = LogSyncPipeline(self._config, bqWriteInterface, formatType, checkpoint, metrics, tuner)
+
+                    # Get a stream of all source log entries on the given day, apart from any already sent
+                    logEntries = self._getLogEntryStream(dateToMigrate, formatType, mysqlInterface, pipeline.exportedIds)
+
+                    try:
+                        numExportedRows, numRequests = pipeline.Run(logEntries)
+                    finally:
+                        logEntries.Close()
+
+                    numRowsAppended = pipeline.NumRowsAppended
+                    numRowsFinalized = 0
+
+                    # If we sent any append rows requests to BQ
+                    if not numRequests == 0:
+                        if checkpoint is not None:
+                            checkpoint.SetStage(SyncJournal.FINALIZING)
+                        with metrics.Time("finalize_commit"):
+                            numRowsFinalized = bqWriteInterface.CloseFinalizeAndCommit()
+
+                    Logger.Log(f"{str(numExportedRows)} MySQL log entries sent to: {bqFqTableId}", logging.INFO)
+                    exportedIds = pipeline.exportedIds
+                else:
+                    # The day's rows were all sent by an earlier run, as recorded in the checkpoint
+                    exportedIds = IdRangeSet()
+                    for journaledRequest in checkpoint.GetRequests():
+                        exportedIds = exportedIds.Union(journaledRequest.ids)
+
+                if checkpoint is not None:
+                    checkpoint.SetStage(SyncJournal.COMMITTED)
+
+                with metrics.Time("verify"):
+                    verified = OpenGameDataLogSyncer.VerifyDate(dateToMigrate, bqInterface, bqFqTableId, migrationStatusCounts[0], numBqTableEntriesBefore, numRowsAppended, numRowsFinalized)
+                if not verified:
+                    Logger.Log(f"Expected to migrate {str(migrationStatusCounts[0])} rows from MySQL, but fewer new rows were found in BigQuery", logging.FATAL)
+                    raise Exception("Missing expected log entries in BigQuery")
+                    sys.exit(1) # This is unrecoverable, don't allow catching or continuing
+
+                with metrics.Time("mark_synced"):
+                    numMarked = mysqlInterface.MarkLogEntriesAsSyncedByIds(exportedIds, int(self._config.get("SYNC_CONFIG", {}).get("MARK_SYNCED_CHUNK_SIZE", 10000)))
+                Logger.Log(f"{str(numMarked)} MySQL entries for {str(dateToMigrate)}, in {len(exportedIds.Intervals)} id ranges, have been marked as synced")
+
+                if checkpoint is not None:
+                    checkpoint.Clear()
+                if tuner is not None:
+                    Logger.Log(f"For: {str(dateToMigrate)} autotuned to {tuner.ToSummary()}", logging.INFO)
+                    metrics.Count("autotune_adjustments", tuner.numAdjustments)
+                    tuner.Save()
+                succeeded = True
+            finally:
+                if journal is not None:
+                    journal.Close()
+                metrics.Finish(succeeded)
+                OpenGameDataLogSyncer.ReportMetrics(self._config, metrics)
 
-            numBqTableEntriesBefore = 0
-
-            # If the desination table exists
-            if bqInterface.TableExists(bqFqTableId):
-
-                # Get a count of existing entries
-                numBqTableEntriesBefore = bqInterface.GetTableCount(bqFqTableId)
-                Logger.Log(f"For: {str(dateToMigrate)} Found {str(numBqTableEntriesBefore)} existing BigQuery rows.", logging.INFO)
-            else:
-                # Create the table
-                bqInterface.CreateTable(bqFqTableId, BigQueryLogTableSchema.schema)
-
-            # Get a write interface instance
-            bqWriteInterface = BigQueryWriteInterface(self._config["BIGQUERY_CONFIG"], bqFqTableId)
-
-            # Get a cursor for all source log entries on the given day
-            logEntriesCursor = self._mysqlInterface.GetLogEntriesByDate(dateToMigrate, SourceDataRowFormatType[self._config["MYSQL_CONFIG"]["SOURCE_TYPE"]])
-                    
-            # Rows are dictionaries keyed by column name
-            mysqlRow = logEntriesCursor.fetchone()
-
-            numRequests = 0
-            numExportedRows = 0
-            numRowsInRequest = 0
-            maxRequestSizeInBytes = 10000000
-
-            # Explicitly set DEBUG log level to see the caught exceptions and debugging output from the Google libraries and API calls
-            if self._config["DEBUG_LEVEL"] == "DEBUG":
-                logging.basicConfig(level=logging.DEBUG)
-
-            estimatedRequestSize = 0
-            bqAppendRowsResponses = []
-
-            protoRows = types.ProtoRows()
-            bqAppendRowsRequest = None
-
-            # Offset of the first request should be zero
-            # Offset of subsequent requests should be equal to the number of rows we've previously sent
-            offset = 0
-
-            while mysqlRow is not None:
-
-                serializedRowData = BigQueryWriteInterface.AssembleSerializedRowData(mysqlRow, SourceDataRowFormatType[self._config["MYSQL_CONFIG"]["SOURCE_TYPE"]])
-                sizeOfserializedRowData = sys.getsizeof(serializedRowData)
-                
-                # If adding this row to the request would push it over the max request limit of 10 MB
-                # we'll send the request and start a new request before adding the row
-                if sizeOfserializedRowData + estimatedRequestSize >= maxRequestSizeInBytes:
-
-                    Logger.Log(f"Estimated request size: {str(estimatedRequestSize)} bytes", logging.DEBUG)
-                    Logger.Log(f"Creating append rows request number: {str(numRequests + 1)} containing {str(numRowsInRequest)} rows with offset: {str(offset)} and sending", logging.INFO)
-
-                    # The size of a single AppendRowsRequest must be less than 10 MB in size
-                    # https://cloud.google.com/python/docs/reference/bigquerystorage/latest/google.cloud.bigquery_storage_v1.client.BigQueryWriteClient
-                    bqAppendRowsRequest = BigQueryWriteInterface.GetAppendRowsRequest(protoRows, offset)
-
-                    # Send the request via the stream, store the repsonse in the array of responses
-                    bqAppendRowsResponses.append(bqWriteInterface.SendAppendRowsRequest(numRequests, bqAppendRowsRequest))
-                    
-                    # TODO: Could try deferring the response logging until all the requests have been sent. I believe the sends are supposed to be asynchronous, so .result() might wait until they resolve.
-                    # Not seeing much difference with days that don't have millions of log entries
-                    Logger.Log(f"For request number: {str(numRequests + 1)} with offset: {str(offset)} Request response result: {str(bqAppendRowsResponses[len(bqAppendRowsResponses) - 1].result())}", logging.DEBUG)
-                    
-                    # Update our offset
-                    offset += numRowsInRequest
-                    
-                    # Reset our request size and number of rows in the request, increase our offset
-                    estimatedRequestSize = 0
-                    numRowsInRequest = 0
-
-                    numRequests += 1
-
-            
-                # If we're starting a new request
-                if numRowsInRequest == 0:
-                    # Create a batch of row data by appending proto2 serialized bytes to the serialized_rows repeated field.
-                    protoRows = types.ProtoRows()
-
-                # Add this row to the request
-                protoRows.serialized_rows.append(BigQueryWriteInterface.AssembleSerializedRowData(mysqlRow, SourceDataRowFormatType[self._config["MYSQL_CONFIG"]["SOURCE_TYPE"]]))
-                numRowsInRequest += 1
-                numExportedRows += 1
-                estimatedRequestSize += sizeOfserializedRowData
-
-                #Logger.Log(mysqlRow, logging.INFO)
-
-                # Get the next row
-                mysqlRow = self._mysqlInterface._db_cursor.fetchone()
-
-            self._mysqlInterface._db_cursor.close()
-
-            # If we have a request with rows that hasn't been sent yet
-            if not numRowsInRequest == 0:
-
-                # Send it now
-                Logger.Log(f"Estimated request size: {str(estimatedRequestSize)} bytes", logging.DEBUG)
-                Logger.Log(f"Creating final append rows request number: {str(numRequests + 1)} containing {str(numRowsInRequest)} rows with offset: {str(offset)} and sending", logging.INFO)
-                bqAppendRowsRequest = BigQueryWriteInterface.GetAppendRowsRequest(protoRows, offset)
-
-                bqAppendRowsResponses.append(bqWriteInterface.SendAppendRowsRequest(numRequests, bqAppendRowsRequest))
-                Logger.Log(f"For request number: {str(numRequests + 1)} with offset: {str(offset)} Request response result: {str(bqAppendRowsResponses[len(bqAppendRowsResponses) - 1].result())}", logging.DEBUG)
-
-                numRequests += 1
-
-            # If we sent any append rows requests to BQ
-            if not numRequests == 0:
-                bqWriteInterface.CloseFinalizeAndCommit()
-
-            Logger.Log(f"{str(numExportedRows)} MySQL log entries sent to: {bqFqTableId}", logging.INFO)
-
-            numBqTableEntriesAfter = bqInterface.GetTableCount(bqFqTableId)
-            Logger.Log(f"For: {str(dateToMigrate)} found {str(numBqTableEntriesAfter)} BigQuery rows", logging.INFO)
-
-            numRowsConfirmedInserted = numBqTableEntriesAfter - numBqTableEntriesBefore
-
-            if numRowsConfirmedInserted < migrationStatusCounts[0]:
-                Logger.Log(f"Expected to migrate {str(migrationStatusCounts[0])} rows from MySQL, but only {str(numRowsConfirmedInserted)} new rows found in BigQuery", logging.FATAL)
-                raise Exception("Missing expected log entries in BigQuery")
-                sys.exit(1) # This is unrecoverable, don't allow catching or continuing
-
-            self._mysqlInterface.MarkLogEntriesAsSynced(dateToMigrate)        
-            Logger.Log(f"MySQL entries for {str(dateToMigrate)} have all been marked as synced")
-
-            
             Logger.Log(f"Completed syncing log entries for: {str(dateToMigrate)}")
         else:
-            Logger.Log(f"Could not sync log entries for {str(dateToMigrate)}, the MySQLInterface was None!")
\ No newline at end of file
+            Logger.Log(f"Could not sync log entries for {str(dateToMigrate)}, the MySQLInterface was None!")
+
+    @staticmethod
+    def GetTableIds(config:Dict[str,Any], dateToMigrate:date) -> Tuple[str, str]:
+        """Get the ids of the BigQuery table a day is synced to, and of the table or partition its rows are written to.
+
+        :return: The id of the day's table, and the id its rows are written through, respectively.
+                 With PARTITIONED_TABLE set, these are the table shared by every day, and the day's partition of it, with a $YYYYMMDD decorator.
+                 Otherwise both are the day's own {TableBasename}_YYYYMMDD table.
+        :rtype: Tuple[str, str]
+        """
+        _bq_config = config.get('BIGQUERY_CONFIG', {})
+        if bool(_bq_config.get("PARTITIONED_TABLE", False)):
+            # Every day goes to one table, with the day's rows streamed straight into its partition
+            bqTableId = f"{_bq_config['PROJECT_ID']}.{_bq_config['DATASET_ID']}.{_bq_config['TABLE_BASENAME']}"
+            return (bqTableId, f"{bqTableId}${dateToMigrate.strftime('%Y%m%d')}")
+
+        bqTableId = f"{_bq_config['PROJECT_ID']}.{_bq_config['DATASET_ID']}.{_bq_config['TABLE_BASENAME']}_{dateToMigrate.strftime('%Y%m%d')}"
+        return (bqTableId, bqTableId)
+
+    def _useLoadJob(self) -> bool:
+        sink = self._config.get("SYNC_CONFIG", {}).get("SINK", "WRITE_API")
+        if sink not in ["WRITE_API", "LOAD_JOB"]:
+            raise Exception(f"Unsupported sink: {sink}, expected WRITE_API or LOAD_JOB")
+        return sink == "LOAD_JOB"
+
+    def _loadDate(self, dateToMigrate:date, formatType:SourceDataRowFormatType, mysqlInterface:MySQLInterface, bqInterface:BigQueryInterface,
+                  bqFqTableId:str, metrics:SyncMetrics) -> Tuple[int, int, IdRangeSet]:
+        """Write all of a day's unsynced log entries to a Parquet file, and load it into the given table with a single load job.
+
+        :return: The number of rows written to the file, the number of rows the load job loaded, and the ids of the log entries written
+        :rtype: Tuple[int, int, IdRangeSet]
+        """
+        pipeline = LogLoadPipeline(self._config, formatType, metrics)
+        try:
+            logEntries = self._getLogEntryStream(dateToMigrate, formatType, mysqlInterface, pipeline.exportedIds)
+            try:
+                numExportedRows, numRowGroups = pipeline.Run(logEntries)
+            finally:
+                logEntries.Close()
+
+            numRowsLoaded = 0
+            if not numExportedRows == 0:
+                numRowsLoaded = pipeline.Load(bqInterface, bqFqTableId)
+        finally:
+            pipeline.Close()
+
+        Logger.Log(f"{str(numExportedRows)} MySQL log entries loaded into: {bqFqTableId}, in {str(numRowGroups)} row groups", logging.INFO)
+        return (numExportedRows, numRowsLoaded, pipeline.exportedIds)
+
+    def _stageDate(self, dateToMigrate:date, formatType:SourceDataRowFormatType, mysqlInterface:MySQLInterface, bqWriteInterface:BigQueryWriteInterface,
+                   bqFqTableId:str, numWriteStreams:int, metrics:SyncMetrics, tuner:Optional[SyncAutotuner]) -> Tuple[Optional[int], Optional[int], IdRangeSet]:
+        """Serialize all of a day's unsynced log entries into a local staged file, closing the log entry stream once they're written,
+        then upload the file through PENDING write streams, finalize and commit them.
+        If that fails before the streams were committed, they're abandoned and the file is uploaded again on new streams.
+
+        :return: The number of rows acknowledged and the number of rows finalized, or None for both if the streams turned out to be
+                 committed after all, and the ids of the log entries staged
+        :rtype: Tuple[Optional[int], Optional[int], IdRangeSet]
+        """
+        _sync_config = self._config.get("SYNC_CONFIG", {})
+        numAttempts = max(1, int(_sync_config.get("STAGING_UPLOAD_ATTEMPTS", 3)))
+
+        stagedFile = StagedLogFile.Create(_sync_config.get("STAGING_DIR", ""), int(_sync_config.get("STAGING_COMPRESSION_LEVEL", 1)))
+        try:
+            pipeline = LogSyncPipeline(self._config, bqWriteInterface, formatType, None, metrics, tuner)
+            logEntries = self._getLogEntryStream(dateToMigrate, formatType, mysqlInterface, IdRangeSet())
+            try:
+                numStagedRows = pipeline.Stage(logEntries, stagedFile)
+            finally:
+                logEntries.Close()
+            Logger.Log(f"{str(numStagedRows)} MySQL log entries staged to: {stagedFile.path}, {str(stagedFile.SizeInBytes)} bytes in {str(stagedFile.numBlocks)} blocks", logging.INFO)
+
+            attempt = 1
+            while True:
+                pipeline = LogSyncPipeline(self._config, bqWriteInterface, formatType, None, metrics, tuner)
+                try:
+                    numExportedRows, numRequests = pipeline.Upload(stagedFile)
+                    numRowsFinalized = 0
+                    if not numRequests == 0:
+                        with metrics.Time("finalize_commit"):
+                            numRowsFinalized = bqWriteInterface.CloseFinalizeAndCommit()
+                    Logger.Log(f"{str(numExportedRows)} staged log entries sent to: {bqFqTableId}", logging.INFO)
+                    return (pipeline.NumRowsAppended, numRowsFinalized, stagedFile.exportedIds)
+                except Exception as err:
+                    bqWriteInterface.CloseAppendRowsStreams()
+                    # The commit is atomic, so if it went through before the error, every row is in and uploading again would duplicate them
+                    writeStreams = [bqWriteInterface.GetExistingWriteStream(writeStreamName) for writeStreamName in bqWriteInterface.GetWriteStreamNames()]
+                    if any(writeStream is not None and writeStream.commit_time for writeStream in writeStreams):
+                        Logger.Log(f"For: {str(dateToMigrate)} write streams were committed despite: {type(err)} {str(err)}", logging.WARNING)
+                        return (None, None, stagedFile.exportedIds)
+                    if attempt >= numAttempts:
+                        raise
+
+                    attempt += 1
+                    Logger.Log(f"For: {str(dateToMigrate)} uploading the staged file failed: {type(err)} {str(err)}, uploading it again on new write streams, "\
+                               f"attempt {str(attempt)} of {str(numAttempts)}", logging.WARNING)
+                    metrics.Count("staged_reuploads")
+                    bqWriteInterface = BigQueryWriteInterface(self._config["BIGQUERY_CONFIG"], bqFqTableId, numWriteStreams)
+        finally:
+            stagedFile.Delete()
+
+    def _openJournal(self) -> Optional[SyncJournal]:
+        journalPath = self._config.get("SYNC_CONFIG", {}).get("CHECKPOINT_JOURNAL_PATH", "")
+        return SyncJournal(journalPath) if journalPath else None
+
+    @staticmethod
+    def ReportMetrics(config:Dict[str,Any], metrics:SyncMetrics) -> None:
+        """Log the summary of a finished day's metrics, and write its report to METRICS_REPORT_DIR if that is set.
+        """
+        Logger.Log(f"For: {str(metrics.dateToSync)} {'synced' if metrics.succeeded else 'failed after'} {metrics.ToSummary()}",
+                   logging.INFO if metrics.succeeded else logging.WARNING)
+
+        reportDir = config.get("SYNC_CONFIG", {}).get("METRICS_REPORT_DIR", "")
+        if reportDir:
+            # A report that can't be written shouldn't fail a day that has already been synced
+            try:
+                metrics.WriteReport(reportDir)
+            except OSError as err:
+                Logger.Log(f"Unable to write the sync report for {str(metrics.dateToSync)} to {reportDir}: {type(err)} {str(err)}", logging.WARNING)
+
+    def _resumeCommit(self, bqWriteInterface:BigQueryWriteInterface, checkpoint:DayCheckpoint) -> bool:
+        """Finish finalizing and committing the write streams of a day whose checkpoint stopped at the FINALIZING stage.
+
+        :return: False if any of the streams no longer exists, and the day has to be synced from scratch
+        :rtype: bool
+        """
+        writeStreamNames = list(checkpoint.GetStreamNames().values())
+        writeStreams = [bqWriteInterface.GetExistingWriteStream(writeStreamName) for writeStreamName in writeStreamNames]
+
+        if any(writeStream is None for writeStream in writeStreams):
+            Logger.Log(f"Write streams for {checkpoint.tableId} no longer exist, unable to commit them", logging.WARNING)
+            return False
+
+        # The commit is atomic, so if one stream was committed, they all were
+        if all(writeStream.commit_time for writeStream in writeStreams):
+            Logger.Log(f"Write streams for {checkpoint.tableId} were already committed", logging.INFO)
+            return True
+
+        bqWriteInterface.FinalizeWriteStreams(writeStreamNames)
+        bqWriteInterface.CommitWriteStreams(writeStreamNames)
+        return True
+
+    @staticmethod
+    def VerifyDate(dateToMigrate:date, bqInterface:BigQueryInterface, bqFqTableId:str, numRowsExpected:int, numBqTableEntriesBefore:int,
+                   numRowsAppended:Optional[int], numRowsFinalized:Optional[int]) -> bool:
+        """Check that at least the expected number of rows were added to the BigQuery table, using the cheapest source of row counts available.
+
+        1. If the rows were committed by this run, the number of rows acknowledged at each stream's offsets should match
+           BigQuery's own count of rows when the streams were finalized. If they agree, no further check is needed.
+        2. Otherwise, count the table's rows from its metadata, which isn't a query job
+        3. Only if that comes up short, count the table's rows with a COUNT(*) query, in case the metadata is lagging behind
+        """
+        if numRowsAppended is not None and numRowsFinalized is not None:
+            if numRowsAppended != numRowsFinalized:
+                Logger.Log(f"For: {str(dateToMigrate)} {str(numRowsAppended)} rows were acknowledged, but {str(numRowsFinalized)} rows were finalized", logging.WARNING)
+            elif numRowsFinalized >= numRowsExpected:
+                Logger.Log(f"For: {str(dateToMigrate)} committed {str(numRowsFinalized)} rows to BigQuery, of {str(numRowsExpected)} expected", logging.INFO)
+                return True
+
+        numRowsConfirmedInserted = bqInterface.GetTableRowCount(bqFqTableId) - numBqTableEntriesBefore
+        if numRowsConfirmedInserted < numRowsExpected:
+            numRowsConfirmedInserted = bqInterface.GetTableCount(bqFqTableId) - numBqTableEntriesBefore
+
+        Logger.Log(f"For: {str(dateToMigrate)} found {str(numRowsConfirmedInserted)} new BigQuery rows, of {str(numRowsExpected)} expected", logging.INFO)
+        return numRowsConfirmedInserted >= numRowsExpected
+
+    def _getLogEntryStream(self, dateToMigrate:date, formatType:SourceDataRowFormatType, mysqlInterface:MySQLInterface, exportedIds:IdRangeSet) -> Union[LogEntryStream, ChunkedLogEntryStream]:
+        """Open a stream of all the source log entries on the given day, other than the ones with the given ids.
+
+        If READ_CHUNK_ID_SPAN is set, the day is split into chunks of that many ids, which are read in parallel
+        through READER_CONNECTIONS connections of their own, and retried individually if a connection drops.
+        Otherwise the whole day is read with a single query on the given connection.
+        If some ids were already exported, only the ranges of ids in between them are read, always by id range.
+        """
+        _sync_config = self._config.get("SYNC_CONFIG", {})
+        fetchBatchSize = int(_sync_config.get("FETCH_BATCH_SIZE", 1000))
+        chunkIdSpan = int(_sync_config.get("READ_CHUNK_ID_SPAN", 0))
+
+        if chunkIdSpan <= 0 and len(exportedIds) == 0:
+            return mysqlInterface.GetLogEntriesByDate(dateToMigrate, formatType, fetchBatchSize)
+
+        idRange = mysqlInterface.GetLogEntryIdRangeByDate(dateToMigrate)
+        idChunks = []
+        if idRange is not None:
+            for startId, endId in exportedIds.Complement(idRange[0], idRange[1]).Intervals:
+                idChunks += ChunkedLogEntryStream.SplitIdRange(startId, endId, chunkIdSpan) if chunkIdSpan > 0 else [(startId, endId)]
+        Logger.Log(f"For: {str(dateToMigrate)} reading ids {str(idRange)} in {len(idChunks)} chunks", logging.INFO)
+
+        return ChunkedLogEntryStream(self._config, dateToMigrate, formatType, idChunks,
+                                     numConnections=int(_sync_config.get("READER_CONNECTIONS", 2)),
+                                     fetchBatchSize=fetchBatchSize,
+                                     maxRetries=int(_sync_config.get("READ_CHUNK_RETRIES", 5)))
@@ -0,0 +1,113 @@
+# Standard module imports
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# Local module imports
+from interfaces.BigQueryInterface import BigQueryWriteInterface, SourceDataRowFormatType
+from schemas.JsonValidator import JsonValidator
+from services.SyncMetrics import SyncMetrics
+from utils import Logger
+
+# The encoders of a worker process, by column layout, row format and JSON validation settings.
+# Encoders keep per-batch caches and validators keep sampling counts, so each worker process builds its own.
+_workerEncoders : Dict[Tuple, Tuple[Any, JsonValidator]] = {}
+
+def _encodeBatchInWorker(columnIndex:Dict[str, int], formatType:SourceDataRowFormatType, validationMode:str, validationSampleRate:int,
+                         batch:List[Tuple]) -> Tuple[List[bytes], float, float, int]:
+    # Runs in a worker process. Returns the serialized rows, the seconds spent validating JSON and serializing, and the number of invalid JSON documents.
+    key = (tuple(columnIndex.items()), formatType, validationMode, validationSampleRate)
+    if key not in _workerEncoders:
+        jsonValidator = JsonValidator(mode=validationMode, sampleRate=validationSampleRate)
+        _workerEncoders[key] = (BigQueryWriteInterface.GetRowBatchEncoder(columnIndex, formatType, jsonValidator), jsonValidator)
+    encoder, jsonValidator = _workerEncoders[key]
+
+    secondsParsingBefore = jsonValidator.secondsParsing
+    numInvalidBefore = jsonValidator.numInvalid
+    start = perf_counter()
+    serializedRows = encoder.EncodeBatch(batch)
+    secondsValidating = jsonValidator.secondsParsing - secondsParsingBefore
+
+    return (serializedRows, secondsValidating, perf_counter() - start - secondsValidating, jsonValidator.numInvalid - numInvalidBefore)
+
+def _startWorker() -> None:
+    # Nothing to do; submitting it makes the pool fork all of its worker processes straight away
+    pass
+
+## @class SerializerProcessPool
+#  A pool of worker processes that turn batches of MySQL rows into proto2 serialized LogRecords, so serialization isn't held to one core by the GIL.
+#  Batches are pickled to a worker and the serialized rows pickled back, and each batch keeps its place in the pipeline's sequence,
+#  so the sender still packs rows into requests, and assigns offsets, in the order they were read.
+#  Every pipeline in the process with the same SERIALIZER_PROCESSES shares one pool.
+#  Workers are forked, since spawned workers would re-run main.py, so the pool must be started with ForConfig before any threads or gRPC channels are,
+#  e.g. at the start of SyncAll; all of its workers are forked as soon as it's created. Pipelines only look it up with Get, which never starts one.
+class SerializerProcessPool:
+
+    _pools     : Dict[int, "SerializerProcessPool"] = {}
+    _poolsLock : threading.Lock = threading.Lock()
+
+    def __init__(self, numProcesses:int):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise Exception("SERIALIZER_PROCESSES needs worker processes to be forked, which this platform doesn't support. Set it to 0 to serialize on threads.")
+
+        self.numProcesses : int = numProcesses
+        self._executor : ProcessPoolExecutor = ProcessPoolExecutor(max_workers=numProcesses, mp_context=multiprocessing.get_context("fork"))
+        self._executor.submit(_startWorker).result()
+        Logger.Log(f"Started {numProcesses} serializer processes", logging.INFO)
+
+    # Get the pool for the config's SERIALIZER_PROCESSES, creating it if needed, or None if it's 0 and rows are serialized on threads
+    @staticmethod
+    def ForConfig(config:Dict[str,Any]) -> Optional["SerializerProcessPool"]:
+        numProcesses = int(config.get("SYNC_CONFIG", {}).get("SERIALIZER_PROCESSES", 0))
+        if numProcesses <= 0:
+            return None
+
+        with SerializerProcessPool._poolsLock:
+            pool = SerializerProcessPool._pools.get(numProcesses)
+            if pool is None:
+                pool = SerializerProcessPool(numProcesses)
+                SerializerProcessPool._pools[numProcesses] = pool
+            return pool
+
+    # Get the already started pool for the config's SERIALIZER_PROCESSES, or None if it's 0 and rows are serialized on threads.
+    # Raises rather than starting the pool, since by the time a pipeline asks for it, forking would copy the threads already running.
+    @staticmethod
+    def Get(config:Dict[str,Any]) -> Optional["SerializerProcessPool"]:
+        numProcesses = int(config.get("SYNC_CONFIG", {}).get("SERIALIZER_PROCESSES", 0))
+        if numProcesses <= 0:
+            return None
+
+        with SerializerProcessPool._poolsLock:
+            pool = SerializerProcessPool._pools.get(numProcesses)
+        if pool is None:
+            raise Exception(f"No pool of {numProcesses} serializer processes has been started. Call SerializerProcessPool.ForConfig before starting any threads, as SyncAll does.")
+        return pool
+
+    # Shut down every pool in the process, along with its worker processes
+    @staticmethod
+    def CloseAll() -> None:
+        with SerializerProcessPool._poolsLock:
+            pools = list(SerializerProcessPool._pools.values())
+            SerializerProcessPool._pools = {}
+        for pool in pools:
+            pool._executor.shutdown(wait=True)
+
+    def EncodeBatch(self, config:Dict[str,Any], columnIndex:Dict[str, int], formatType:SourceDataRowFormatType, batch:List[Tuple], metrics:SyncMetrics) -> List[bytes]:
+        """Encode a batch of rows on one of the pool's workers, waiting for the result.
+        The workers' time validating and serializing is added to the metrics' validate and serialize stages, and their invalid JSON documents are counted.
+
+        :return: The proto2 serialized LogRecords, one per row
+        :rtype: List[bytes]
+        """
+        _sync_config = config.get("SYNC_CONFIG", {})
+        future = self._executor.submit(_encodeBatchInWorker, columnIndex, formatType, _sync_config.get("JSON_VALIDATION", "FULL"),
+                                       int(_sync_config.get("JSON_VALIDATION_SAMPLE_RATE", 1)), batch)
+        serializedRows, secondsValidating, secondsSerializing, numInvalid = future.result()
+
+        metrics.AddTime("validate", secondsValidating)
+        metrics.AddTime("serialize", secondsSerializing)
+        metrics.Count("invalid_json", numInvalid)
+        return serializedRows
@@ -0,0 +1,254 @@
+# Standard module imports
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional
+
+# Local module imports
+from services.SyncMetrics import SyncMetrics
+from utils import Logger
+
+class SyncAutotuner:
+    """Tunes the append rows request size, the send window and the MySQL fetch batch size of a game's syncs, from what it measures as they run.
+
+    - Request size and send window are tuned by hill climbing on append throughput, the bytes acknowledged per second.
+      Every WINDOW_REQUESTS acknowledged requests, one of the two is moved a step in its current direction. If throughput goes up by more than
+      IMPROVEMENT_THRESHOLD, the move is kept and the same setting is moved again; otherwise it is undone, that setting's direction is reversed,
+      and the other setting is tried next. Moves are only tried while the sender spends at least BOTTLENECK_WAIT_FRACTION of its time waiting
+      on acknowledgements, since when MySQL or serialization holds the day back, append throughput says nothing about the settings.
+    - The fetch batch size is set from the mean size of a serialized row, so each batch holds about AUTOTUNE_FETCH_BATCH_BYTES bytes,
+      whether a game logs tiny events or huge game_state documents.
+    The request size never goes above MAX_REQUEST_SIZE_BYTES, nor the window above AUTOTUNE_MAX_IN_FLIGHT_REQUESTS.
+    With AUTOTUNE_STATE_DIR set, the tuned values are saved there as autotune_{game}.json, and each day of the game starts from them.
+    All methods are safe to call from several threads, as acknowledgements arrive on the append rows streams' own threads.
+    """
+
+    WINDOW_REQUESTS           : int   = 8
+    IMPROVEMENT_THRESHOLD     : float = 0.05
+    BOTTLENECK_WAIT_FRACTION  : float = 0.1
+    REQUEST_SIZE_STEP         : float = 1.5
+    MIN_REQUEST_SIZE_BYTES    : int   = 1000000
+    MIN_FETCH_BATCH_SIZE      : int   = 100
+    MAX_FETCH_BATCH_SIZE      : int   = 50000
+
+    def __init__(self, config:Dict[str, Any], game:str):
+        _sync_config = config.get("SYNC_CONFIG", {})
+
+        self.game      : str = game
+        self._stateDir : str = _sync_config.get("AUTOTUNE_STATE_DIR", "")
+        self._maxRequestSizeInBytes : int = int(_sync_config.get("MAX_REQUEST_SIZE_BYTES", 10000000))
+        self._minRequestSizeInBytes : int = min(SyncAutotuner.MIN_REQUEST_SIZE_BYTES, self._maxRequestSizeInBytes)
+        self._maxInFlightLimit      : int = max(1, int(_sync_config.get("AUTOTUNE_MAX_IN_FLIGHT_REQUESTS", 16)))
+        self._fetchBatchBytes       : int = max(1, int(_sync_config.get("AUTOTUNE_FETCH_BATCH_BYTES", 4000000)))
+
+        # The settings, starting from the config's until any saved ones are loaded
+        self._requestSizeInBytes : int = self._maxRequestSizeInBytes
+        self._maxInFlight        : int = min(max(1, int(_sync_config.get("MAX_IN_FLIGHT_REQUESTS", 4))), self._maxInFlightLimit)
+        self._fetchBatchSize     : int = max(1, int(_sync_config.get("FETCH_BATCH_SIZE", 1000)))
+        self._bytesPerRow        : Optional[float] = None
+
+        # Hill climbing state
+        self._knobs      : List[str] = ["request_size", "in_flight"]
+        self._knob       : int = 0
+        self._directions : Dict[str, int] = {"request_size" : 1, "in_flight" : 1}
+        self._undo       : Optional[Callable[[], None]] = None # Undoes the move being tried, if there is one
+        self._baseline   : Optional[float] = None              # Bytes per second before the move being tried
+        self.numAdjustments : int = 0
+
+        # Measurements over the current window of acknowledged requests
+        self._windowStart     : float = perf_counter()
+        self._windowRequests  : int = 0
+        self._windowBytes     : int = 0
+        self._windowWaiting   : float = 0.0
+        # Running totals over the whole run, for the summary
+        self._rowsFetched     : int = 0
+        self._secondsFetching : float = 0.0
+        self._rowsSerialized  : int = 0
+        self._secondsSerializing : float = 0.0
+        self._numAppends      : int = 0
+        self._secondsAppending : float = 0.0
+
+        self._lock : threading.Lock = threading.Lock()
+        self._load()
+
+    @property
+    def RequestSizeInBytes(self) -> int:
+        with self._lock:
+            return self._requestSizeInBytes
+
+    @property
+    def MaxInFlight(self) -> int:
+        with self._lock:
+            return self._maxInFlight
+
+    @property
+    def FetchBatchSize(self) -> int:
+        with self._lock:
+            return self._fetchBatchSize
+
+    def RecordFetch(self, numRows:int, seconds:float) -> None:
+        with self._lock:
+            self._rowsFetched += numRows
+            self._secondsFetching += seconds
+
+    def RecordSerialized(self, numRows:int, numBytes:int, seconds:float) -> None:
+        """Record a batch of rows that was serialized, and size the next fetches from the mean serialized row size.
+        """
+        if numRows == 0:
+            return
+        with self._lock:
+            self._rowsSerialized += numRows
+            self._secondsSerializing += seconds
+            batchBytesPerRow = numBytes / numRows
+            self._bytesPerRow = batchBytesPerRow if self._bytesPerRow is None else 0.8 * self._bytesPerRow + 0.2 * batchBytesPerRow
+            self._fetchBatchSize = self._fetchBatchSizeFor(self._bytesPerRow)
+
+    def RecordSendWait(self, seconds:float) -> None:
+        """Record time the sender spent waiting for room in the send window.
+        """
+        with self._lock:
+            self._windowWaiting += seconds
+
+    def RecordAppend(self, numBytes:int, roundTripSeconds:float) -> None:
+        """Record an acknowledged append rows request, from when it was sent until its acknowledgement arrived.
+        Every WINDOW_REQUESTS of these, the request size or send window may be moved.
+        """
+        with self._lock:
+            self._numAppends += 1
+            self._secondsAppending += roundTripSeconds
+            self._windowRequests += 1
+            self._windowBytes += numBytes
+            if self._windowRequests >= SyncAutotuner.WINDOW_REQUESTS:
+                self._endWindow()
+
+    def Save(self) -> None:
+        """Save the tuned settings to AUTOTUNE_STATE_DIR, if it is set, for the game's next day to start from.
+        """
+        if not self._stateDir:
+            return
+        # The move being tried hasn't been shown to help, so save the settings from before it
+        with self._lock:
+            if self._undo is not None:
+                self._undo()
+                self._undo = None
+            state = {
+                "game"                  : self.game,
+                "updated"               : datetime.now().isoformat(timespec="seconds"),
+                "request_size_in_bytes" : self._requestSizeInBytes,
+                "max_in_flight"         : self._maxInFlight,
+                "fetch_batch_size"      : self._fetchBatchSize,
+                "bytes_per_row"         : self._bytesPerRow
+            }
+        try:
+            os.makedirs(self._stateDir, exist_ok=True)
+            SyncMetrics._writeAtomically(self._statePath(), json.dumps(state, indent=4))
+        except OSError as err:
+            Logger.Log(f"Could not save tuned sync settings for {self.game}: {type(err)} {str(err)}", logging.WARNING)
+
+    def ToSummary(self) -> str:
+        with self._lock:
+            fetchRate = self._rowsFetched / self._secondsFetching if self._secondsFetching > 0 else 0.0
+            serializeRate = self._rowsSerialized / self._secondsSerializing if self._secondsSerializing > 0 else 0.0
+            roundTrip = self._secondsAppending / self._numAppends if self._numAppends > 0 else 0.0
+            return f"request size {self._requestSizeInBytes} bytes, {self._maxInFlight} requests in flight, fetch batches of {self._fetchBatchSize} rows "\
+                   f"after {self.numAdjustments} adjustments; fetched {fetchRate:.0f} rows/s, serialized {serializeRate:.0f} rows/s, {roundTrip * 1000:.0f} ms per append"
+
+    # *** PRIVATE METHODS ***
+
+    def _statePath(self) -> str:
+        return os.path.join(self._stateDir, f"autotune_{self.game}.json")
+
+    def _load(self) -> None:
+        if not self._stateDir or not os.path.isfile(self._statePath()):
+            return
+        try:
+            with open(self._statePath(), "r", encoding="utf-8") as file:
+                state = json.load(file)
+            self._requestSizeInBytes = min(max(int(state["request_size_in_bytes"]), self._minRequestSizeInBytes), self._maxRequestSizeInBytes)
+            self._maxInFlight = min(max(int(state["max_in_flight"]), 1), self._maxInFlightLimit)
+            if state.get("bytes_per_row") is not None:
+                self._bytesPerRow = float(state["bytes_per_row"])
+                self._fetchBatchSize = self._fetchBatchSizeFor(self._bytesPerRow)
+            Logger.Log(f"Loaded tuned sync settings for {self.game}: request size {self._requestSizeInBytes} bytes, {self._maxInFlight} requests in flight, "\
+                       f"fetch batches of {self._fetchBatchSize} rows", logging.INFO)
+        except (OSError, ValueError, KeyError, TypeError) as err:
+            Logger.Log(f"Ignoring unreadable tuned sync settings in {self._statePath()}: {type(err)} {str(err)}", logging.WARNING)
+
+    def _fetchBatchSizeFor(self, bytesPerRow:float) -> int:
+        return min(max(int(self._fetchBatchBytes / max(bytesPerRow, 1.0)), SyncAutotuner.MIN_FETCH_BATCH_SIZE), SyncAutotuner.MAX_FETCH_BATCH_SIZE)
+
+    def _endWindow(self) -> None:
+        now = perf_counter()
+        seconds = now - self._windowStart
+        throughput = self._windowBytes / seconds if seconds > 0 else 0.0
+        waitingFraction = self._windowWaiting / seconds if seconds > 0 else 0.0
+
+        self._windowStart = now
+        self._windowRequests = 0
+        self._windowBytes = 0
+        self._windowWaiting = 0.0
+
+        if self._undo is not None:
+            knob = self._knobs[self._knob]
+            if throughput > self._baseline * (1 + SyncAutotuner.IMPROVEMENT_THRESHOLD):
+                # Keep the move, and try another in the same direction
+                Logger.Log(f"Autotune for {self.game}: moving {knob} raised append throughput to {throughput:.0f} bytes/s, keeping it", logging.DEBUG)
+                self._undo = None
+                self._baseline = throughput
+                if not self._move(knob):
+                    self._knob = (self._knob + 1) % len(self._knobs)
+                return
+
+            Logger.Log(f"Autotune for {self.game}: moving {knob} gave {throughput:.0f} bytes/s against {self._baseline:.0f} bytes/s, undoing it", logging.DEBUG)
+            self._undo()
+            self._undo = None
+            self._directions[knob] = -self._directions[knob]
+            self._knob = (self._knob + 1) % len(self._knobs)
+            # Measure the undone settings again before the next move, rather than comparing against a lucky window
+            self._baseline = None
+            return
+
+        if waitingFraction < SyncAutotuner.BOTTLENECK_WAIT_FRACTION:
+            # Appends aren't what's holding the day back
+            self._baseline = None
+            return
+
+        if self._baseline is None:
+            self._baseline = throughput
+            return
+
+        # Try a move on the current setting, or the other one if the current one is already at its limit
+        for _ in range(len(self._knobs)):
+            if self._move(self._knobs[self._knob]):
+                return
+            self._directions[self._knobs[self._knob]] = -self._directions[self._knobs[self._knob]]
+            self._knob = (self._knob + 1) % len(self._knobs)
+
+    def _move(self, knob:str) -> bool:
+        # Move a setting one step in its current direction, keeping the way to undo it. Returns False if it's already at its limit.
+        direction = self._directions[knob]
+        if knob == "request_size":
+            before = self._requestSizeInBytes
+            after = int(before * SyncAutotuner.REQUEST_SIZE_STEP) if direction > 0 else int(before / SyncAutotuner.REQUEST_SIZE_STEP)
+            after = min(max(after, self._minRequestSizeInBytes), self._maxRequestSizeInBytes)
+            if after == before:
+                return False
+            self._requestSizeInBytes = after
+            def _undo() -> None:
+                self._requestSizeInBytes = before
+        else:
+            before = self._maxInFlight
+            after = min(max(before + direction, 1), self._maxInFlightLimit)
+            if after == before:
+                return False
+            self._maxInFlight = after
+            def _undo() -> None:
+                self._maxInFlight = before
+
+        self._undo = _undo
+        self.numAdjustments += 1
+        Logger.Log(f"Autotune for {self.game}: trying {knob} {before} -> {after}", logging.DEBUG)
+        return True
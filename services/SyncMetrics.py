@@ -0,0 +1,131 @@
+# Standard module imports
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+class SyncMetrics:
+    """Timings and counts for syncing one day of one game's log entries, so that the stage holding a table back can be found.
+
+    Each stage's time is the wall-clock time spent in it, summed over every thread working on that stage. Stages run concurrently,
+    so their times can add up to more than the day took. A stage with close to the day's total time is the bottleneck.
+    Counts are running totals, e.g. of rows, bytes and retries. Queue depths are sampled as items are queued, keeping the mean and maximum.
+    All methods are safe to call from several threads.
+    """
+
+    STAGES = ["fetch", "validate", "serialize", "append", "finalize_commit", "verify", "mark_synced"]
+
+    def __init__(self, game:str, dateToSync:Optional[date] = None):
+        self.game         : str = game
+        self.dateToSync   : Optional[date] = dateToSync
+        self.succeeded    : bool = False
+        self.startedAt    : datetime = datetime.now()
+        self.totalSeconds : Optional[float] = None
+        self.stageSeconds : Dict[str, float] = {stage : 0.0 for stage in SyncMetrics.STAGES}
+        self.counts       : Dict[str, int] = {}
+        self._queueDepths : Dict[str, List[int]] = {} # queue name -> [number of samples, sum of samples, maximum]
+        self._start       : float = perf_counter()
+        self._lock        : threading.Lock = threading.Lock()
+
+    @contextmanager
+    def Time(self, stage:str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.AddTime(stage, perf_counter() - start)
+
+    def AddTime(self, stage:str, seconds:float) -> None:
+        with self._lock:
+            self.stageSeconds[stage] = self.stageSeconds.get(stage, 0.0) + seconds
+
+    def Count(self, name:str, amount:int = 1) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def SampleQueueDepth(self, name:str, depth:int) -> None:
+        with self._lock:
+            samples = self._queueDepths.setdefault(name, [0, 0, 0])
+            samples[0] += 1
+            samples[1] += depth
+            samples[2] = max(samples[2], depth)
+
+    def Finish(self, succeeded:bool) -> None:
+        self.succeeded = succeeded
+        self.totalSeconds = perf_counter() - self._start
+
+    @property
+    def RowsPerSecond(self) -> float:
+        totalSeconds = self.totalSeconds if self.totalSeconds is not None else perf_counter() - self._start
+        return self.counts.get("rows_sent", 0) / totalSeconds if totalSeconds > 0 else 0.0
+
+    def ToDict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "game"           : self.game,
+                "date"           : self.dateToSync.isoformat() if self.dateToSync is not None else None,
+                "succeeded"      : self.succeeded,
+                "started_at"     : self.startedAt.isoformat(timespec="seconds"),
+                "total_seconds"  : self.totalSeconds,
+                "rows_per_second": self.RowsPerSecond,
+                "stage_seconds"  : dict(self.stageSeconds),
+                "counts"         : dict(self.counts),
+                "queue_depths"   : {name : {"samples" : samples[0], "mean" : samples[1] / samples[0], "max" : samples[2]}
+                                    for name, samples in self._queueDepths.items() if samples[0] > 0}
+            }
+
+    def ToSummary(self) -> str:
+        stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.stageSeconds.items())
+        return f"{self.counts.get('rows_sent', 0)} rows, {self.counts.get('bytes_sent', 0)} bytes in {self.totalSeconds or 0:.2f}s "\
+               f"({self.RowsPerSecond:.0f} rows/s); {stages}"
+
+    def ToPrometheus(self) -> str:
+        """Format the metrics in the Prometheus text exposition format, for the node exporter's textfile collector.
+        Every metric is labelled with the game, so each game's file can sit in the same collector directory.
+        """
+        report = self.ToDict()
+        game = self.game.replace("\\", "\\\\").replace('"', '\\"')
+        dayTimestamp = datetime.combine(self.dateToSync, datetime.min.time()).timestamp() if self.dateToSync is not None else 0
+        lines = []
+
+        def _metric(name:str, help:str, samples:List[Tuple[str, float]]) -> None:
+            lines.append(f"# HELP ogd_sync_{name} {help}")
+            lines.append(f"# TYPE ogd_sync_{name} gauge")
+            for labels, value in samples:
+                lines.append(f'ogd_sync_{name}{{game="{game}"{labels}}} {value}')
+
+        _metric("day_timestamp_seconds", "Start of the last day synced, as a Unix timestamp", [("", dayTimestamp)])
+        _metric("succeeded", "Whether the last day synced succeeded", [("", int(report["succeeded"]))])
+        _metric("total_seconds", "Wall-clock seconds taken to sync the last day", [("", report["total_seconds"] or 0)])
+        _metric("rows_per_second", "Rows sent per second while syncing the last day", [("", report["rows_per_second"])])
+        _metric("stage_seconds", "Seconds spent in each stage while syncing the last day, summed over threads",
+                [(f',stage="{stage}"', seconds) for stage, seconds in report["stage_seconds"].items()])
+        for name, value in sorted(report["counts"].items()):
+            _metric(name, f"Number of {name.replace('_', ' ')} while syncing the last day", [("", value)])
+        _metric("queue_depth_mean", "Mean depth of each queue while syncing the last day",
+                [(f',queue="{name}"', depths["mean"]) for name, depths in report["queue_depths"].items()])
+        _metric("queue_depth_max", "Maximum depth of each queue while syncing the last day",
+                [(f',queue="{name}"', depths["max"]) for name, depths in report["queue_depths"].items()])
+
+        return "\n".join(lines) + "\n"
+
+    def WriteReport(self, directory:str) -> None:
+        """Write the metrics to the given directory, as {game}_{YYYYMMDD}.json for the day, and as ogd_sync_{game}.prom,
+        which is replaced by each day synced for the game. Files are written to a temporary name and then renamed,
+        so a collector never reads half a file.
+        """
+        os.makedirs(directory, exist_ok=True)
+        dayName = self.dateToSync.strftime('%Y%m%d') if self.dateToSync is not None else "undated"
+
+        SyncMetrics._writeAtomically(os.path.join(directory, f"{self.game}_{dayName}.json"), json.dumps(self.ToDict(), indent=4))
+        SyncMetrics._writeAtomically(os.path.join(directory, f"ogd_sync_{self.game}.prom"), self.ToPrometheus())
+
+    @staticmethod
+    def _writeAtomically(path:str, text:str) -> None:
+        tempPath = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tempPath, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(tempPath, path)
@@ -0,0 +1,209 @@
+# Standard module imports
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+from time import sleep
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Local module imports
+from interfaces.MySQLInterface import MySQLConnectionPool, MySQLInterface
+from services.OpenGameDataLogSyncer import OpenGameDataLogSyncer
+from services.SerializerProcessPool import SerializerProcessPool
+from utils import Logger
+
+class SyncScheduler:
+    """Syncs the log tables of every game listed in the config from a single long-lived process, rather than one process per game.
+
+    The games are listed in SCHEDULER_CONFIG's GAMES, mapping each game's MySQL table to its BigQuery dataset.
+    Each game's days are written to {dataset}_daily shards, the same as a single-game run with that table and dataset.
+    Days from all games share one pool of MAX_CONCURRENT_DAYS workers. Each worker keeps its MySQL connection open,
+    pointing it at whichever game's table it is syncing, so a whole pass only opens as many connections as there are workers.
+    With a POOL_SIZE in the MYSQL_CONFIG, those connections go back to the shared pool at the end of a pass, ready for the next one.
+    Games take turns in round-robin order whenever a worker frees up, so one game with a long backlog can't hold up the rest,
+    and no game has more than MAX_CONCURRENT_DAYS_PER_GAME of its days syncing at once.
+    If a day fails, the rest of that game's days are skipped for the pass, and the other games carry on.
+    """
+
+    def __init__(self, config:Dict[str,Any]):
+        _scheduler_config = config.get("SCHEDULER_CONFIG", {})
+
+        self._config = config
+        self._games  : Dict[str, str] = dict(_scheduler_config.get("GAMES", {}))
+        self._maxConcurrentDays        : int = max(1, int(_scheduler_config.get("MAX_CONCURRENT_DAYS", 4)))
+        self._maxConcurrentDaysPerGame : int = max(1, int(_scheduler_config.get("MAX_CONCURRENT_DAYS_PER_GAME", 1)))
+
+        self._workerState          = threading.local()
+        self._workerInterfaces     : List[MySQLInterface] = []
+        self._workerInterfacesLock : threading.Lock = threading.Lock()
+
+        self.failedGames : Dict[str, BaseException] = {}
+
+        if len(self._games) == 0:
+            raise Exception("No games to sync, add them to GAMES in the SCHEDULER_CONFIG")
+
+    @staticmethod
+    def GetGameConfig(config:Dict[str,Any], game:str, datasetId:str) -> Dict[str,Any]:
+        """Get a copy of the config that syncs the given game's MySQL table to its BigQuery dataset.
+
+        :param config: The config shared by every game
+        :type config: Dict[str,Any]
+        :param game: The name of the game's MySQL table
+        :type game: str
+        :param datasetId: The game's BigQuery dataset
+        :type datasetId: str
+        :return: The game's config
+        :rtype: Dict[str,Any]
+        """
+        gameConfig = {**config,
+                      "MYSQL_CONFIG": {**config["MYSQL_CONFIG"], "DB_TABLE": game},
+                      "BIGQUERY_CONFIG": {**config["BIGQUERY_CONFIG"], "DATASET_ID": datasetId, "TABLE_BASENAME": f"{datasetId}_daily"}}
+
+        # Checkpoints are kept by date, so every game needs a journal of its own
+        journalPath = config.get("SYNC_CONFIG", {}).get("CHECKPOINT_JOURNAL_PATH", "")
+        if journalPath:
+            journalRoot, journalExt = os.path.splitext(journalPath)
+            gameConfig["SYNC_CONFIG"] = {**config["SYNC_CONFIG"], "CHECKPOINT_JOURNAL_PATH": f"{journalRoot}_{game}{journalExt}"}
+
+        return gameConfig
+
+    def RunForever(self, maxDaysPerGame:int, intervalMinutes:int) -> None:
+        """Run a pass over every game, then wait for the next one, starting a pass every intervalMinutes until the process is stopped.
+        A pass that runs longer than the interval is followed straight away by the next one.
+
+        :param maxDaysPerGame: The maximum number of days to sync for each game in each pass
+        :type maxDaysPerGame: int
+        :param intervalMinutes: The number of minutes from the start of one pass to the start of the next
+        :type intervalMinutes: int
+        """
+        while True:
+            passStart = datetime.now()
+            self.RunOnce(maxDaysPerGame)
+
+            nextPassStart = passStart + timedelta(minutes=intervalMinutes)
+            Logger.Log(f"Next sync pass at {nextPassStart.strftime('%Y-%m-%d %H:%M:%S')}", logging.INFO)
+            while datetime.now() < nextPassStart:
+                sleep(min(60, max(0, (nextPassStart - datetime.now()).total_seconds())))
+
+    def RunOnce(self, maxDaysPerGame:int) -> Dict[str, int]:
+        """Sync up to maxDaysPerGame days of every game.
+
+        :param maxDaysPerGame: The maximum number of days to sync for each game
+        :type maxDaysPerGame: int
+        :return: The number of days synced for each game. Games that failed are listed in failedGames.
+        :rtype: Dict[str, int]
+        """
+        self.failedGames = {}
+        numDaysSynced : Dict[str, int] = {game : 0 for game in self._games}
+
+        # Fork any serializer processes before the MySQL tunnel and BigQuery clients start threads of their own
+        SerializerProcessPool.ForConfig(self._config)
+
+        try:
+            datesToMigrate = self._planGames(maxDaysPerGame)
+            MySQLConnectionPool.CheckPoolSize(self._config, self._maxConcurrentDays)
+
+            Logger.Log(f"Syncing {sum(len(dates) for dates in datesToMigrate.values())} days across {len(self._games)} games, "\
+                       f"with up to {self._maxConcurrentDays} days at a time", logging.INFO)
+
+            syncers = {game : OpenGameDataLogSyncer(SyncScheduler.GetGameConfig(self._config, game, datasetId)) for game, datasetId in self._games.items()}
+            rotation : Deque[str] = deque(game for game in self._games if len(datesToMigrate.get(game, [])) > 0)
+            numRunning : Dict[str, int] = {game : 0 for game in self._games}
+            running : Dict[Future, Tuple[str, date]] = {}
+
+            with ThreadPoolExecutor(max_workers=self._maxConcurrentDays, thread_name_prefix="SyncGameDay") as executor:
+                while len(running) > 0 or len(rotation) > 0:
+
+                    # Hand out free workers to the games in turn
+                    while len(running) < self._maxConcurrentDays:
+                        game = self._nextGame(rotation, datesToMigrate, numRunning)
+                        if game is None:
+                            break
+                        dateToMigrate = datesToMigrate[game].popleft()
+                        running[executor.submit(self._syncDateOnWorker, syncers[game], game, dateToMigrate)] = (game, dateToMigrate)
+                        numRunning[game] += 1
+
+                    done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        game, dateToMigrate = running.pop(future)
+                        numRunning[game] -= 1
+                        err = future.exception()
+                        if err is None:
+                            numDaysSynced[game] += 1
+                        else:
+                            Logger.Log(f"Failed to sync log entries of {game} for {str(dateToMigrate)}, skipping its remaining days: {type(err)} {str(err)}", logging.ERROR)
+                            self.failedGames.setdefault(game, err)
+                            datesToMigrate[game].clear()
+
+                    # Drop games with nothing left to start
+                    rotation = deque(game for game in rotation if len(datesToMigrate[game]) > 0)
+        finally:
+            self._closeWorkerInterfaces()
+
+        for game in self._games:
+            status = "FAILED" if game in self.failedGames else "OK"
+            Logger.Log(f"{game}: synced {numDaysSynced[game]} days, {status}", logging.INFO)
+
+        return numDaysSynced
+
+    # *** PRIVATE METHODS ***
+
+    def _planGames(self, maxDaysPerGame:int) -> Dict[str, Deque[date]]:
+        # Get every game's unsynced dates, oldest first, over a single connection
+        datesToMigrate : Dict[str, Deque[date]] = {}
+
+        plannerInterface = MySQLInterface(self._config)
+        try:
+            plannerInterface.SetSessionVariables()
+            for game in self._games:
+                try:
+                    plannerInterface.SetTable(game)
+                    datesToMigrate[game] = deque(dateToMigrate for dateToMigrate, _ in plannerInterface.GetUnmigratedDateCounts(maxDaysPerGame))
+                    Logger.Log(f"Found {len(datesToMigrate[game])} days with unsynced log entries for {game}", logging.INFO)
+                except Exception as err:
+                    Logger.Log(f"Failed to get the unsynced days of {game}: {type(err)} {str(err)}", logging.ERROR)
+                    self.failedGames[game] = err
+                    datesToMigrate[game] = deque()
+        finally:
+            plannerInterface.Close()
+
+        return datesToMigrate
+
+    def _nextGame(self, rotation:Deque[str], datesToMigrate:Dict[str, Deque[date]], numRunning:Dict[str, int]) -> Optional[str]:
+        # The first game in the rotation that has days left and room to start one. It then goes to the back of the rotation.
+        for _ in range(len(rotation)):
+            game = rotation[0]
+            rotation.rotate(-1)
+            if len(datesToMigrate[game]) > 0 and numRunning[game] < self._maxConcurrentDaysPerGame:
+                return game
+        return None
+
+    def _syncDateOnWorker(self, syncer:OpenGameDataLogSyncer, game:str, dateToMigrate:date) -> None:
+        mysqlInterface = getattr(self._workerState, "mysqlInterface", None)
+        if mysqlInterface is None:
+            mysqlInterface = MySQLInterface(self._config)
+            mysqlInterface.SetSessionVariables()
+            self._workerState.mysqlInterface = mysqlInterface
+            with self._workerInterfacesLock:
+                self._workerInterfaces.append(mysqlInterface)
+
+        mysqlInterface.SetTable(game)
+        try:
+            syncer.SyncDate(dateToMigrate, mysqlInterface)
+        except BaseException:
+            # The failed day may have left the connection unusable, so the worker's next day opens a new one
+            self._workerState.mysqlInterface = None
+            with self._workerInterfacesLock:
+                self._workerInterfaces.remove(mysqlInterface)
+            mysqlInterface.Close()
+            raise
+
+    def _closeWorkerInterfaces(self) -> None:
+        # Worker threads end with the pass, so their connections are closed with it
+        with self._workerInterfacesLock:
+            for mysqlInterface in self._workerInterfaces:
+                mysqlInterface.Close()
+            self._workerInterfaces = []
+        self._workerState = threading.local()
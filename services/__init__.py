@@ -1,3 +1,13 @@
-__all__ = [ "OpenGameDataLogSyncer" ]
+__all__ = [ "OpenGameDataLogSyncer", "LogLoadPipeline", "LogSyncPipeline", "SyncScheduler", "SerializerProcessPool", "AsyncLogSyncPipeline", "AsyncLogSyncer", "AsyncSyncScheduler", "SyncAutotuner", "MemoryBudget", "SyncMetrics" ]
 #
 from . import OpenGameDataLogSyncer
+from . import LogLoadPipeline
+from . import LogSyncPipeline
+from . import SyncScheduler
+from . import SerializerProcessPool
+from . import AsyncLogSyncPipeline
+from . import AsyncLogSyncer
+from . import AsyncSyncScheduler
+from . import SyncAutotuner
+from . import MemoryBudget
+from . import SyncMetrics
\ No newline at end of file
@@ -0,0 +1,6 @@
+# Standard module imports
+import os
+import sys
+
+# The tests import the repo's top-level packages the same way main.py does, so run them with the repo root on the path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
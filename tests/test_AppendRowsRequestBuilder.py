@@ -0,0 +1,58 @@
+# Standard module imports
+import random
+
+import pytest
+from google.cloud.bigquery_storage_v1 import types
+
+# Local module imports
+from interfaces.BigQueryInterface import AppendRowsRequestBuilder
+
+def _encodedSize(request:types.AppendRowsRequest) -> int:
+    return len(types.AppendRowsRequest.serialize(request))
+
+def _offsetOnlySize(offset:int) -> int:
+    request = types.AppendRowsRequest()
+    request.offset = offset
+    return _encodedSize(request)
+
+@pytest.mark.parametrize("rowLengths, offset", [([0], 0), ([5, 200, 1], 0), ([127, 128, 16383, 16384], 12345), ([3000] * 40, 1 << 40)])
+def test_size_matches_the_encoded_request(rowLengths, offset):
+    builder = AppendRowsRequestBuilder(maxRequestSizeInBytes=10000000, reservedBytes=0)
+    for rowLength in rowLengths:
+        assert builder.TryAdd(b"r" * rowLength)
+
+    sizeInBytes = builder.SizeInBytes
+    request = builder.Build(offset)
+
+    # Without headroom, the builder's size is exactly the request's, apart from the offset field
+    assert sizeInBytes + _offsetOnlySize(offset) == _encodedSize(request)
+    assert list(request.proto_rows.rows.serialized_rows) == [b"r" * rowLength for rowLength in rowLengths]
+
+def test_rows_are_packed_up_to_the_limit_and_never_over_it():
+    generator = random.Random(7)
+    rows = [bytes(generator.randrange(256) for _ in range(generator.randrange(1, 3000))) for _ in range(500)]
+    maxRequestSizeInBytes = 50000
+    builder = AppendRowsRequestBuilder(maxRequestSizeInBytes)
+    requests = []
+
+    for row in rows:
+        if not builder.TryAdd(row):
+            # A request is only sent once it's too full for the next row, which is at most 3000 bytes
+            assert builder.SizeInBytes > maxRequestSizeInBytes - 3010
+            requests.append(builder.Build(len(requests)))
+            assert builder.NumRows == 0
+            assert builder.TryAdd(row)
+    requests.append(builder.Build(len(requests)))
+
+    assert [row for request in requests for row in request.proto_rows.rows.serialized_rows] == rows
+    for request in requests:
+        assert _encodedSize(request) + AppendRowsRequestBuilder.REQUEST_HEADROOM_BYTES <= maxRequestSizeInBytes + _offsetOnlySize(request.offset)
+
+def test_a_row_too_large_for_any_request_raises():
+    builder = AppendRowsRequestBuilder(maxRequestSizeInBytes=1000, reservedBytes=100)
+    assert builder.TryAdd(b"x" * 800)
+    # Too large for this request, but it would fit in an empty one
+    assert not builder.TryAdd(b"x" * 800)
+    builder.Build(0)
+    with pytest.raises(Exception):
+        builder.TryAdd(b"x" * 1000)
@@ -0,0 +1,93 @@
+# Standard module imports
+from concurrent.futures import Future
+from typing import List, Tuple
+
+import google.api_core.exceptions
+import pytest
+from google.cloud.bigquery_storage_v1 import types
+
+# Local module imports
+from interfaces.BigQueryInterface import AppendRowsSendWindow
+
+def _acknowledged(offset:int, **response) -> Future:
+    future = Future()
+    future.set_result(types.AppendRowsResponse(append_result=types.AppendRowsResponse.AppendResult(offset=offset), **response))
+    return future
+
+def _failed(error:Exception) -> Future:
+    future = Future()
+    future.set_exception(error)
+    return future
+
+class _RecordingFuture:
+    """A future that records when its result was asked for, so tests can see which requests the window waited on"""
+
+    def __init__(self, name:str, results:List[str], offset:int):
+        self._name    = name
+        self._results = results
+        self._future  = _acknowledged(offset)
+
+    def result(self):
+        self._results.append(self._name)
+        return self._future.result()
+
+def test_requests_are_acknowledged_oldest_first_and_reported():
+    acknowledged : List[Tuple[int, int, int]] = []
+    window = AppendRowsSendWindow(maxInFlight=8, onAcknowledged=lambda streamIndex, offset, numRows: acknowledged.append((streamIndex, offset, numRows)))
+
+    window.Add(0, 0, 10, _acknowledged(0), streamIndex=0)
+    window.Add(0, 0, 5, _acknowledged(0), streamIndex=1)
+    window.Add(1, 10, 20, _acknowledged(10), streamIndex=0)
+    assert window.NumInFlight == 3
+    window.Drain()
+
+    assert window.NumInFlight == 0
+    assert acknowledged == [(0, 0, 10), (1, 0, 5), (0, 10, 20)]
+    assert (window.numAcknowledged, window.numRowsAcknowledged, window.numAlreadyExists) == (3, 35, 0)
+
+def test_a_full_window_waits_for_the_oldest_request():
+    results : List[str] = []
+    window = AppendRowsSendWindow(maxInFlight=2)
+
+    window.Add(0, 0, 1, _RecordingFuture("first", results, 0))
+    window.Add(1, 1, 1, _RecordingFuture("second", results, 1))
+    assert results == []
+    window.Add(2, 2, 1, _RecordingFuture("third", results, 2))
+
+    # Only the oldest request was waited on to make room
+    assert results == ["first"]
+    assert window.NumInFlight == 2
+    window.Drain()
+    assert results == ["first", "second", "third"]
+
+def test_an_acknowledgement_at_the_wrong_offset_raises():
+    window = AppendRowsSendWindow()
+    window.Add(0, 100, 10, _acknowledged(90))
+    with pytest.raises(Exception, match="acknowledged at offset: 90"):
+        window.Drain()
+
+def test_row_errors_raise():
+    window = AppendRowsSendWindow()
+    window.Add(0, 0, 2, _acknowledged(0, row_errors=[types.RowError(index=1, message="bad row")]))
+    with pytest.raises(Exception, match="row errors"):
+        window.Drain()
+
+def test_rows_already_appended_are_counted_and_acknowledged():
+    acknowledged : List[Tuple[int, int, int]] = []
+    window = AppendRowsSendWindow(onAcknowledged=lambda streamIndex, offset, numRows: acknowledged.append((streamIndex, offset, numRows)))
+
+    window.Add(0, 0, 10, _acknowledged(0))
+    window.Add(1, 10, 10, _failed(google.api_core.exceptions.AlreadyExists("Offset already exists")))
+    window.Add(2, 20, 10, _acknowledged(20))
+    window.Drain()
+
+    assert window.numAlreadyExists == 1
+    assert (window.numAcknowledged, window.numRowsAcknowledged) == (3, 30)
+    assert acknowledged == [(0, 0, 10), (0, 10, 10), (0, 20, 10)]
+
+def test_other_failures_are_raised():
+    window = AppendRowsSendWindow()
+    window.Add(0, 0, 10, _failed(google.api_core.exceptions.OutOfRange("Offset beyond end of stream")))
+    with pytest.raises(google.api_core.exceptions.OutOfRange):
+        window.Drain()
+    assert window.numAcknowledged == 0
@@ -0,0 +1,77 @@
+# Standard module imports
+from typing import Dict, List, Optional
+
+import google.api_core.exceptions
+import pytest
+from google.cloud import bigquery
+
+# Local module imports
+from interfaces.BigQueryInterface import BigQueryClients, BigQueryInterface
+from schemas import BigQueryLogTableSchema
+
+class FakeClient:
+    """Stands in for bigquery.Client, holding a dataset's tables in memory, where another process may already have created a table"""
+
+    def __init__(self, tableIds:List[str], createdElsewhere:List[str], rowCounts:Optional[Dict[str, int]] = None):
+        self.tableIds         = list(tableIds)
+        self.createdElsewhere = list(createdElsewhere)
+        self.rowCounts        = rowCounts or {}
+        self.numListings      = 0
+
+    def list_tables(self, datasetId:str):
+        self.numListings += 1
+        return [bigquery.TableReference.from_string(tableId) for tableId in self.tableIds]
+
+    def get_table(self, tableId:str) -> bigquery.Table:
+        if tableId not in self.tableIds + self.createdElsewhere:
+            raise google.api_core.exceptions.NotFound(tableId)
+        table = bigquery.Table(tableId)
+        table._properties["numRows"] = str(self.rowCounts.get(tableId, 0))
+        return table
+
+    def create_table(self, table:bigquery.Table) -> bigquery.Table:
+        tableId = f"{table.project}.{table.dataset_id}.{table.table_id}"
+        if tableId in self.tableIds + self.createdElsewhere:
+            raise google.api_core.exceptions.Conflict(f"Already Exists: Table {tableId}")
+        self.tableIds.append(tableId)
+        return table
+
+def _interface(name:str, client:FakeClient) -> BigQueryInterface:
+    # Each test has its own credentials path, and so its own registered client, and its own dataset, and so its own table listing
+    config = {"CREDENTIALS_FILEPATH" : f"test_{name}.json", "TABLE_CACHE_SECONDS" : 600}
+    BigQueryClients.Register(config, client, None)
+    return BigQueryInterface(config)
+
+def test_created_tables_are_added_to_the_listing():
+    client = FakeClient(["project.created.existing"], [])
+    bqInterface = _interface("created", client)
+    assert not bqInterface.TableExists("project.created.new")
+
+    assert bqInterface.CreateTable("project.created.new", BigQueryLogTableSchema.schema)
+    assert bqInterface.TableExists("project.created.new")
+    assert client.numListings == 1
+
+def test_a_table_created_elsewhere_is_treated_as_existing():
+    client = FakeClient([], ["project.conflict.logs"], {"project.conflict.logs" : 250})
+    bqInterface = _interface("conflict", client)
+    assert not bqInterface.TableExists("project.conflict.logs")
+
+    # The table was created by someone else after the dataset was listed, so it isn't reported as created
+    assert not bqInterface.CreateTable("project.conflict.logs", BigQueryLogTableSchema.schema, partitionField=BigQueryLogTableSchema.partition_field)
+
+    assert bqInterface.TableExists("project.conflict.logs")
+    table = bqInterface.GetTable("project.conflict.logs")
+    assert table is not None
+    # And the rows it already holds can be counted
+    assert bqInterface.GetTableRowCount("project.conflict.logs", table) == 250
+    assert client.numListings == 1
+
+def test_other_errors_are_raised():
+    class ForbiddenClient(FakeClient):
+        def create_table(self, table:bigquery.Table) -> bigquery.Table:
+            raise google.api_core.exceptions.Forbidden("Access Denied")
+
+    bqInterface = _interface("forbidden", ForbiddenClient([], []))
+    with pytest.raises(google.api_core.exceptions.Forbidden):
+        bqInterface.CreateTable("project.forbidden.logs", BigQueryLogTableSchema.schema)
+    assert not bqInterface.TableExists("project.forbidden.logs")
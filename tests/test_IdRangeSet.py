@@ -0,0 +1,40 @@
+# Standard module imports
+import random
+
+import pytest
+
+# Local module imports
+from interfaces.IdRangeSet import IdRangeSet
+
+def _ids(idSet:IdRangeSet) -> list:
+    return [entryId for startId, endId in idSet.Intervals for entryId in range(startId, endId + 1)]
+
+def test_from_ids_collapses_consecutive_ids():
+    idSet = IdRangeSet.FromIds([7, 3, 4, 5, 5, 10, 9, 1])
+    assert idSet.Intervals == [(1, 1), (3, 5), (7, 7), (9, 10)]
+    assert len(idSet) == 7
+
+def test_overlapping_and_adjacent_intervals_are_merged():
+    assert IdRangeSet([(5, 8), (1, 3), (4, 4), (7, 12), (20, 21)]).Intervals == [(1, 12), (20, 21)]
+    assert IdRangeSet([(1, 10), (2, 3)]).Intervals == [(1, 10)]
+
+def test_union_matches_the_set_union():
+    generator = random.Random(11)
+    left, right = set(generator.sample(range(500), 200)), set(generator.sample(range(300, 800), 200))
+    union = IdRangeSet.FromIds(left).Union(IdRangeSet.FromIds(right))
+    assert _ids(union) == sorted(left | right)
+    assert len(union) == len(left | right)
+
+@pytest.mark.parametrize("minId, maxId", [(0, 100), (5, 5), (6, 9), (12, 40), (50, 60)])
+def test_complement_matches_the_set_difference(minId, maxId):
+    idSet = IdRangeSet([(3, 5), (10, 14), (20, 20), (30, 45)])
+    assert _ids(idSet.Complement(minId, maxId)) == sorted(set(range(minId, maxId + 1)) - set(_ids(idSet)))
+
+def test_complement_of_an_empty_set_is_the_whole_range():
+    assert IdRangeSet().Complement(10, 20).Intervals == [(10, 20)]
+    assert IdRangeSet([(1, 30)]).Complement(10, 20).Intervals == []
+
+@pytest.mark.parametrize("intervals", [[], [(1, 1)], [(1, 5), (7, 7), (9, 12)], [(2**40, 2**40 + 1000000)]])
+def test_string_round_trip(intervals):
+    idSet = IdRangeSet(intervals)
+    assert IdRangeSet.FromString(idSet.ToString()).Intervals == idSet.Intervals
@@ -0,0 +1,33 @@
+# Standard module imports
+import logging
+
+import pytest
+
+# Local module imports
+import schemas.JsonValidator
+from schemas.JsonValidator import JsonValidator
+from utils import Logger
+
+@pytest.mark.parametrize("mode", ["FULL", "FAST"])
+def test_invalid_documents_are_counted(mode):
+    validator = JsonValidator(mode)
+    assert validator.IsValid('{"a":[1,2,{"b":null}]}')
+    assert not validator.IsValid('{"a":')
+    assert (validator.numParsed, validator.numInvalid) == (2, 1)
+
+def test_sampling_only_parses_every_nth_document():
+    validator = JsonValidator("FULL", sampleRate=3)
+    assert [validator.IsValid("not json") for _ in range(6)] == [True, True, False, True, True, False]
+    assert validator.numParsed == 2
+
+def test_fast_without_orjson_warns_once_and_validates_fully(monkeypatch):
+    warnings = []
+    monkeypatch.setattr(schemas.JsonValidator, "orjson", None)
+    monkeypatch.setattr(JsonValidator, "_warnedNoOrjson", False)
+    monkeypatch.setattr(Logger, "Log", lambda message, level=logging.INFO, depth=0: warnings.append(message) if level == logging.WARNING else None)
+
+    validators = [JsonValidator("FAST") for _ in range(5)]
+
+    assert len(warnings) == 1 and "orjson" in warnings[0]
+    assert all(validator.mode == "FULL" for validator in validators)
+    assert not validators[0].IsValid("[1,")
@@ -0,0 +1,58 @@
+# Standard module imports
+from typing import List, Tuple
+
+# Local module imports
+from interfaces.MySQLInterface import LogEntryStream
+
+class FakeConnection:
+    """Stands in for a MySQL connection with an unbuffered result being read through a cursor"""
+
+    def __init__(self, rows:List[Tuple]):
+        self.rows = list(rows)
+
+    @property
+    def unread_result(self) -> bool:
+        return len(self.rows) > 0
+
+    def consume_results(self) -> None:
+        self.rows = []
+
+class FakeCursor:
+    """Stands in for an unbuffered cursor, which can't be closed while its connection has rows left unread"""
+
+    column_names = ("id", "event_name")
+
+    def __init__(self, db_conn:FakeConnection):
+        self._db_conn = db_conn
+        self.closed = False
+
+    def fetchmany(self, size:int) -> List[Tuple]:
+        rows, self._db_conn.rows = self._db_conn.rows[:size], self._db_conn.rows[size:]
+        return rows
+
+    def close(self) -> None:
+        if self._db_conn.unread_result:
+            raise Exception("Unread result found")
+        self.closed = True
+
+def _rows(numRows:int) -> List[Tuple]:
+    return [(i, "click") for i in range(numRows)]
+
+def test_closing_part_way_through_discards_the_rest_of_the_result():
+    db_conn = FakeConnection(_rows(100))
+    db_cursor = FakeCursor(db_conn)
+    logEntries = LogEntryStream(db_cursor, batch_size=10, db_conn=db_conn)
+    assert len(next(logEntries)) == 10
+
+    logEntries.Close()
+    # The connection is ready for the next query
+    assert not db_conn.unread_result
+    assert db_cursor.closed
+
+def test_a_fully_read_stream_closes_as_before():
+    db_conn = FakeConnection(_rows(25))
+    db_cursor = FakeCursor(db_conn)
+    logEntries = LogEntryStream(db_cursor, batch_size=10, db_conn=db_conn)
+    assert [len(batch) for batch in logEntries] == [10, 10, 5]
+    logEntries.Close()
+    assert db_cursor.closed
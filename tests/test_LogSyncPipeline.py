@@ -0,0 +1,166 @@
+# Standard module imports
+import threading
+from concurrent.futures import Future
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+from google.cloud.bigquery_storage_v1 import types
+
+# Local module imports
+from benchmarks.SyntheticLogSource import SyntheticLogGenerator
+from interfaces.BigQueryInterface import BigQueryWriteInterface, SourceDataRowFormatType
+from interfaces.MySQLInterface import MySQLInterface
+from interfaces.SyncJournal import SyncJournal
+from schemas.JsonValidator import JsonValidator
+from services.LogSyncPipeline import LogSyncPipeline
+from services.SerializerProcessPool import SerializerProcessPool
+
+COLUMN_INDEX = {name : i for i, name in enumerate(MySQLInterface.GetLogEntryColumns(SourceDataRowFormatType.OPEN_GAME_DATA))}
+
+class FakeWriteInterface:
+    """Stands in for BigQueryWriteInterface, recording every request and acknowledging it at the offset it was sent with"""
+
+    def __init__(self, num_streams:int, failFromRequest:Optional[int] = None):
+        self.num_streams   = num_streams
+        self.numReconnects = 0
+        self.write_streams = [types.WriteStream(name=f"stream{streamIndex}") for streamIndex in range(num_streams)]
+        self.requests      : List[Tuple[int, int, List[bytes]]] = [] # (stream index, offset, serialized rows), in the order sent
+        self._failFromRequest = failFromRequest # Requests from this one on fail, as if the connection dropped
+        self._lock = threading.Lock()
+
+    def SendAppendRowsRequest(self, numPreviousRequests:int, appendRowsRequest:types.AppendRowsRequest, streamIndex:int = 0) -> Future:
+        with self._lock:
+            self.requests.append((streamIndex, appendRowsRequest.offset, list(appendRowsRequest.proto_rows.rows.serialized_rows)))
+            failed = self._failFromRequest is not None and len(self.requests) > self._failFromRequest
+        future = Future()
+        if failed:
+            future.set_exception(ConnectionError("Connection dropped"))
+        else:
+            future.set_result(types.AppendRowsResponse(append_result=types.AppendRowsResponse.AppendResult(offset=appendRowsRequest.offset)))
+        return future
+
+class FakeLogEntryStream:
+    """Stands in for LogEntryStream, handing out the given rows in batches"""
+
+    def __init__(self, rows:List[Tuple], batch_size:int):
+        self.columnIndex = COLUMN_INDEX
+        self.batch_size  = batch_size
+        self._rows       = rows
+
+    def __iter__(self):
+        for start in range(0, len(self._rows), self.batch_size):
+            yield self._rows[start:start + self.batch_size]
+
+def _config(**syncConfig) -> Dict:
+    return {"MYSQL_CONFIG" : {"DB_TABLE" : "test"}, "SYNC_CONFIG" : {"JSON_VALIDATION" : "FULL", **syncConfig}}
+
+def _rows(numRows:int) -> List[Tuple]:
+    return list(SyntheticLogGenerator(seed=1).GenerateDay(date(2024, 1, 15), numRows, firstId=1000))
+
+def _encode(rows:List[Tuple]) -> List[bytes]:
+    return BigQueryWriteInterface.GetRowBatchEncoder(COLUMN_INDEX, SourceDataRowFormatType.OPEN_GAME_DATA, JsonValidator()).EncodeBatch(rows)
+
+def test_rows_are_sent_in_read_order_across_serializers_and_streams():
+    rows = _rows(2000)
+    writeInterface = FakeWriteInterface(num_streams=3)
+    pipeline = LogSyncPipeline(_config(SERIALIZER_WORKERS=4, QUEUE_DEPTH=2, MAX_REQUEST_SIZE_BYTES=40000, MAX_IN_FLIGHT_REQUESTS=2),
+                               writeInterface, SourceDataRowFormatType.OPEN_GAME_DATA)
+
+    numExportedRows, numRequests = pipeline.Run(FakeLogEntryStream(rows, batch_size=37))
+
+    assert numExportedRows == len(rows)
+    assert numRequests == len(writeInterface.requests) > 3
+    # Batches serialized out of order are put back in order before they're packed into requests
+    assert [row for _, _, requestRows in writeInterface.requests for row in requestRows] == _encode(rows)
+    assert pipeline.exportedIds.Intervals == [(1000, 1000 + len(rows) - 1)]
+    assert pipeline.NumRowsAppended == len(rows)
+
+def test_requests_are_dealt_round_robin_with_contiguous_offsets_per_stream():
+    rows = _rows(1500)
+    writeInterface = FakeWriteInterface(num_streams=2)
+    pipeline = LogSyncPipeline(_config(SERIALIZER_WORKERS=3, MAX_REQUEST_SIZE_BYTES=30000), writeInterface, SourceDataRowFormatType.OPEN_GAME_DATA)
+
+    pipeline.Run(FakeLogEntryStream(rows, batch_size=100))
+
+    nextOffsets = [0, 0]
+    for requestNumber, (streamIndex, offset, requestRows) in enumerate(writeInterface.requests):
+        assert streamIndex == requestNumber % 2
+        assert offset == nextOffsets[streamIndex]
+        nextOffsets[streamIndex] += len(requestRows)
+    assert sum(nextOffsets) == len(rows)
+    assert pipeline.sendWindow.numRowsAcknowledged == len(rows)
+
+def test_serializer_failure_is_raised_from_run():
+    rows = _rows(200)
+    # A row whose session_id can't be encoded fails its batch's serializer
+    rows[150] = rows[150][:COLUMN_INDEX['session_id']] + (object(),) + rows[150][COLUMN_INDEX['session_id'] + 1:]
+    pipeline = LogSyncPipeline(_config(SERIALIZER_WORKERS=2), FakeWriteInterface(num_streams=1), SourceDataRowFormatType.OPEN_GAME_DATA)
+
+    with pytest.raises(TypeError):
+        pipeline.Run(FakeLogEntryStream(rows, batch_size=50))
+
+def test_serializer_processes_need_a_pool_started_up_front():
+    config = _config(SERIALIZER_PROCESSES=2, MAX_REQUEST_SIZE_BYTES=30000)
+    # The pipeline won't fork the workers itself, since its caller may already be running threads
+    with pytest.raises(Exception, match="ForConfig"):
+        LogSyncPipeline(config, FakeWriteInterface(num_streams=1), SourceDataRowFormatType.OPEN_GAME_DATA)
+
+    SerializerProcessPool.ForConfig(config)
+    try:
+        rows = _rows(1000)
+        writeInterface = FakeWriteInterface(num_streams=2)
+        LogSyncPipeline(config, writeInterface, SourceDataRowFormatType.OPEN_GAME_DATA).Run(FakeLogEntryStream(rows, batch_size=90))
+    finally:
+        SerializerProcessPool.CloseAll()
+    assert [row for _, _, requestRows in writeInterface.requests for row in requestRows] == _encode(rows)
+
+def test_resume_resends_only_what_was_not_acknowledged(tmp_path):
+    rows = _rows(3000)
+    rowsById = {row[COLUMN_INDEX['id']] : row for row in rows}
+    config = _config(SERIALIZER_WORKERS=2, MAX_REQUEST_SIZE_BYTES=30000, MAX_IN_FLIGHT_REQUESTS=3)
+    journalPath = str(tmp_path / "journal.sqlite")
+
+    # The first run dies part way through the day, with a few requests sent but never acknowledged
+    journal = SyncJournal(journalPath)
+    firstInterface = FakeWriteInterface(num_streams=2, failFromRequest=10)
+    pipeline = LogSyncPipeline(config, firstInterface, SourceDataRowFormatType.OPEN_GAME_DATA, journal.StartDay(date(2024, 1, 15), "project.dataset.table", 2, 0))
+    with pytest.raises(ConnectionError):
+        pipeline.Run(FakeLogEntryStream(rows, batch_size=100))
+    journal.Close()
+
+    # The second run picks the day up from the journal. Stream 0 is resumed, but stream 1 has to be created again.
+    journal = SyncJournal(journalPath)
+    checkpoint = journal.GetDay(date(2024, 1, 15))
+    journaledRequests = checkpoint.GetRequests()
+    unacknowledged = [request for request in journaledRequests if not request.acknowledged]
+    assert len(journaledRequests) == len(firstInterface.requests) and len(unacknowledged) > 0
+    assert {request.streamIndex for request in journaledRequests if request.acknowledged} == {0, 1}
+
+    secondInterface = FakeWriteInterface(num_streams=2)
+    pipeline = LogSyncPipeline(config, secondInterface, SourceDataRowFormatType.OPEN_GAME_DATA, checkpoint)
+    readRequestRows = lambda request: [rowsById[entryId] for startId, endId in request.ids.Intervals for entryId in range(startId, endId + 1)]
+    assert pipeline.Resume(journaledRequests, {0}, readRequestRows)
+
+    resent = [(streamIndex, offset) for streamIndex, offset, _ in secondInterface.requests]
+    assert resent == [(request.streamIndex, request.offset) for request in journaledRequests if request.streamIndex == 1 or not request.acknowledged]
+
+    # The reader only fetches the log entries the recorded requests didn't cover
+    remainingIds = pipeline.exportedIds.Complement(1000, 1000 + len(rows) - 1)
+    remainingRows = [rowsById[entryId] for startId, endId in remainingIds.Intervals for entryId in range(startId, endId + 1)]
+    assert 0 < len(remainingRows) < len(rows)
+    pipeline.Run(FakeLogEntryStream(remainingRows, batch_size=100))
+    journal.Close()
+
+    # Each stream carries on from the end of its last recorded request, and ends up holding every row exactly once
+    streams = {streamIndex : {} for streamIndex in range(2)}
+    for streamIndex, offset, requestRows in firstInterface.requests[:10] + secondInterface.requests:
+        streams[streamIndex][offset] = requestRows
+    for streamIndex, requests in streams.items():
+        nextOffset = 0
+        for offset in sorted(requests):
+            assert offset == nextOffset
+            nextOffset += len(requests[offset])
+    assert sorted(row for requests in streams.values() for requestRows in requests.values() for row in requestRows) == sorted(_encode(rows))
+    assert pipeline.exportedIds.Intervals == [(1000, 1000 + len(rows) - 1)]
+    assert all(request.acknowledged for request in SyncJournal(journalPath).GetDay(date(2024, 1, 15)).GetRequests())
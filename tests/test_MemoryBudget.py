@@ -0,0 +1,70 @@
+# Standard module imports
+import threading
+import time
+
+import pytest
+
+# Local module imports
+from services.MemoryBudget import MemoryBudget
+
+@pytest.mark.parametrize("size, numBytes", [(1000, 1000), ("1000", 1000), ("512K", 512 * 1024), ("512M", 512 * 1024 ** 2), ("2g", 2 * 1024 ** 3),
+                                            ("1.5G", int(1.5 * 1024 ** 3)), (" 64MB ", 64 * 1024 ** 2)])
+def test_parse_size(size, numBytes):
+    assert MemoryBudget.ParseSize(size) == numBytes
+
+@pytest.mark.parametrize("size", ["", "lots", "12X"])
+def test_parse_size_rejects_other_sizes(size):
+    with pytest.raises(Exception):
+        MemoryBudget.ParseSize(size)
+
+def test_for_config_shares_one_budget_per_size():
+    assert MemoryBudget.ForConfig({"SYNC_CONFIG" : {"MAX_MEMORY" : ""}}) is None
+    assert MemoryBudget.ForConfig({}) is None
+    budget = MemoryBudget.ForConfig({"SYNC_CONFIG" : {"MAX_MEMORY" : "3M"}})
+    assert budget is MemoryBudget.ForConfig({"SYNC_CONFIG" : {"MAX_MEMORY" : 3 * 1024 ** 2}})
+    assert budget.maxBytes == 3 * 1024 ** 2
+
+def test_acquire_and_release():
+    budget = MemoryBudget(100)
+    assert budget.Acquire(60)
+    assert budget.Acquire(40)
+    assert budget.UsedBytes == 100
+    # Full, so this times out
+    assert not budget.Acquire(1, timeout=0.05)
+    budget.Release(50)
+    assert budget.Acquire(50)
+    assert budget.peakBytes == 100
+    # Releasing more than is held can't take the budget below zero
+    budget.Release(500)
+    assert budget.UsedBytes == 0
+
+def test_a_batch_larger_than_the_budget_is_let_through_when_nothing_else_holds_it():
+    budget = MemoryBudget(100)
+    assert budget.Acquire(250)
+    assert budget.peakBytes == 250
+    assert not budget.Acquire(250, timeout=0.05)
+    budget.Release(250)
+    assert budget.Acquire(250, timeout=0.05)
+
+def test_waiting_readers_are_counted_and_woken_by_release():
+    budget = MemoryBudget(100)
+    budget.Acquire(100)
+    results = []
+    reader = threading.Thread(target=lambda: results.append(budget.Acquire(30, timeout=5)))
+    reader.start()
+
+    deadline = time.monotonic() + 5
+    while budget.NumWaiting == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert budget.NumWaiting == 1
+
+    budget.Release(30)
+    reader.join(5)
+    assert results == [True]
+    assert budget.NumWaiting == 0
+    assert budget.UsedBytes == 100
+
+def test_estimate_batch_bytes_counts_strings_and_overheads():
+    batch = [(1, "abcd", None, b"xy"), (2, "", None, b"")]
+    perRow = MemoryBudget.ROW_OVERHEAD_BYTES + 4 * MemoryBudget.VALUE_OVERHEAD_BYTES + 8 + 8
+    assert MemoryBudget.EstimateBatchBytes(batch) == 2 * perRow + 4 + 2
@@ -0,0 +1,104 @@
+# Standard module imports
+import threading
+import time
+
+import pytest
+from mysql.connector import errors
+
+# Local module imports
+from interfaces.MySQLInterface import MySQLConnectionPool, MySQLInterface
+
+DB_SETTINGS = {"DB_HOST" : "127.0.0.1", "DB_PORT" : 3306, "DB_NAME" : "db", "DB_USER" : "user", "DB_PW" : "pw"}
+
+class FakeConnection:
+    """Stands in for a MySQL connection, with no query left unread and no transaction open"""
+
+    def __init__(self):
+        self.unread_result  = False
+        self.in_transaction = False
+        self.healthy = True
+        self.closed  = False
+
+    def ping(self, reconnect:bool = False) -> None:
+        if not self.healthy:
+            raise OSError("Lost connection to MySQL server")
+
+    def close(self) -> None:
+        self.closed = True
+
+def _pool(poolSize:int, timeout:float = 5) -> MySQLConnectionPool:
+    pool = MySQLConnectionPool(DB_SETTINGS, None, poolSize, timeout)
+    pool.opened = []
+    def _connect():
+        pool.opened.append(FakeConnection())
+        return pool.opened[-1]
+    pool._connect = _connect
+    return pool
+
+def test_released_connections_are_reused():
+    pool = _pool(2)
+    first = pool.Acquire()
+    pool.Release(first)
+    assert pool.Acquire() is first
+    assert len(pool.opened) == 1
+
+def test_no_more_than_pool_size_connections_are_open():
+    pool = _pool(2, timeout=5)
+    first, second = pool.Acquire(), pool.Acquire()
+    acquired = []
+    waiter = threading.Thread(target=lambda: acquired.append(pool.Acquire()))
+    waiter.start()
+
+    time.sleep(0.2)
+    # The third borrower waits rather than opening a third connection
+    assert acquired == [] and len(pool.opened) == 2
+    pool.Release(second)
+    waiter.join(5)
+    assert acquired == [second]
+    assert len(pool.opened) == 2
+
+def test_acquire_gives_up_after_the_timeout():
+    pool = _pool(1, timeout=0.1)
+    pool.Acquire()
+    assert pool.Acquire() is None
+    assert len(pool.opened) == 1
+
+def test_discarded_connections_make_room_for_new_ones():
+    pool = _pool(1, timeout=0.1)
+    first = pool.Acquire()
+    # A connection left part way through a result can't be reused, so it's closed and a new one can be opened in its place
+    first.unread_result = True
+    pool.Release(first)
+    second = pool.Acquire()
+    assert first.closed and second is not first
+
+    # The same goes for an idle connection that has dropped
+    pool.Release(second)
+    second.healthy = False
+    third = pool.Acquire()
+    assert second.closed and third is not None and third is not second
+    assert pool.Acquire() is None
+
+def test_a_failed_connect_gives_its_place_back():
+    pool = _pool(1, timeout=0.1)
+    pool._connect = lambda: None
+    assert pool.Acquire() is None
+    pool._connect = lambda: FakeConnection()
+    assert pool.Acquire() is not None
+
+def test_an_interface_raises_when_the_pool_has_no_connection_for_it(monkeypatch):
+    config = {"MYSQL_CONFIG" : {**DB_SETTINGS, "DB_NAME" : "exhausted", "DB_TABLE" : "logs", "POOL_SIZE" : 1, "POOL_TIMEOUT_SECONDS" : 0.1}}
+    pool = MySQLConnectionPool.ForConfig(config)
+    monkeypatch.setattr(pool, "_connect", lambda: FakeConnection())
+    try:
+        pool.Acquire()
+        # Rather than opening without a connection, and failing later on a NoneType
+        with pytest.raises(errors.InterfaceError, match="POOL_SIZE"):
+            MySQLInterface(config)
+    finally:
+        MySQLConnectionPool.CloseAll()
+
+@pytest.mark.parametrize("syncConfig, numParallelDays, numNeeded", [({}, 4, 4), ({"READ_CHUNK_ID_SPAN" : 100000}, 4, 12),
+                                                                    ({"READ_CHUNK_ID_SPAN" : 100000, "READER_CONNECTIONS" : 3}, 1, 4)])
+def test_connections_needed(syncConfig, numParallelDays, numNeeded):
+    assert MySQLConnectionPool.ConnectionsNeeded({"SYNC_CONFIG" : syncConfig}, numParallelDays) == numNeeded
@@ -0,0 +1,106 @@
+# Standard module imports
+import time
+from datetime import date, datetime, timedelta
+from typing import Tuple
+
+import pytest
+
+# Local module imports
+from benchmarks.SyntheticLogSource import SyntheticLogGenerator
+from interfaces.BigQueryInterface import BigQueryWriteInterface, SourceDataRowFormatType
+from interfaces.MySQLInterface import MySQLInterface
+from schemas.BigQueryLogTableArrowEncoder import OgdArrowBatchEncoder
+from schemas.BigQueryOgdLogRecord_pb2 import LogRecord
+from schemas.BigQueryOgdLogRecordEncoder import OgdLogRecordEncoder
+from schemas.JsonValidator import JsonValidator
+from services.OpenGameDataLogSyncer import OpenGameDataLogSyncer
+
+COLUMNS      = MySQLInterface.GetLogEntryColumns(SourceDataRowFormatType.OPEN_GAME_DATA)
+COLUMN_INDEX = {name : i for i, name in enumerate(COLUMNS)}
+
+def _row(**values) -> Tuple:
+    row = {"id" : 1, "session_id" : "24011500000001", "user_id" : "Player1", "user_data" : None,
+           "client_time" : datetime(2024, 1, 15, 9, 30, 0), "client_time_ms" : 250, "client_offset" : timedelta(hours=-6),
+           "server_time" : datetime(2024, 1, 15, 9, 30, 2), "event_name" : "click_button", "event_data" : '{"x":1}',
+           "event_source" : "GAME", "game_state" : "", "app_version" : 12, "app_branch" : "main", "log_version" : 3,
+           "event_sequence_index" : 7, "remote_addr" : "127.0.0.1", "http_user_agent" : "Mozilla/5.0"}
+    row.update(values)
+    return tuple(row[column] for column in COLUMNS)
+
+EDGE_CASE_ROWS = [
+    _row(),
+    # Every nullable column NULL
+    _row(user_data=None, client_time=None, client_offset=None, event_data=None, game_state=None, app_branch=None, http_user_agent=None),
+    # Non-ASCII text, including in the JSON columns
+    _row(user_id="Jugador ñandú 🦤", user_data='{"nombre":"Zoë"}', event_data='{"texto":"日本語"}', game_state='{"état":"fini"}',
+         http_user_agent="Agënt/1.0"),
+    # Positive, zero, negative and fractional client offsets, and a long string needing a two byte length prefix
+    _row(client_offset=timedelta(hours=5, minutes=30), event_data='{"pad":"' + "x" * 300 + '"}'),
+    _row(client_offset=timedelta(0)),
+    _row(client_offset=timedelta(hours=-9, minutes=-30)),
+    _row(client_offset=timedelta(seconds=-1.6)),
+    # Large and negative integer columns, which take the longest varints
+    _row(app_version=-1, log_version=2**31 - 1, event_sequence_index=2**40),
+    # Invalid JSON is replaced or dropped the same way
+    _row(user_data="{not json", event_data="[1,", game_state="nope"),
+    # The same server_time and client_offset repeated, which the encoder reuses
+    _row(id=2, event_sequence_index=8),
+    _row(id=3, event_sequence_index=9),
+]
+
+def _expected(row:Tuple) -> bytes:
+    return BigQueryWriteInterface.AssembleSerializedRowData(row, COLUMN_INDEX, SourceDataRowFormatType.OPEN_GAME_DATA)
+
+def test_edge_case_rows_match_the_protobuf_message():
+    encoded = OgdLogRecordEncoder(COLUMN_INDEX, JsonValidator()).EncodeBatch(EDGE_CASE_ROWS)
+    assert encoded == [_expected(row) for row in EDGE_CASE_ROWS]
+
+def test_synthetic_day_matches_the_protobuf_message():
+    rows = list(SyntheticLogGenerator(seed=3).GenerateDay(date(2024, 3, 10), 3000))
+    encoder = OgdLogRecordEncoder(COLUMN_INDEX, JsonValidator())
+    # Encoded across several batches, as the pipeline does, with the encoder's cached values carried between them
+    encoded = [serializedRow for start in range(0, len(rows), 250) for serializedRow in encoder.EncodeBatch(rows[start:start + 250])]
+    assert encoded == [_expected(row) for row in rows]
+
+@pytest.mark.parametrize("column", ["session_id", "server_time", "event_name", "event_source", "app_version", "log_version", "remote_addr"])
+def test_null_required_column_raises(column):
+    with pytest.raises(TypeError):
+        OgdLogRecordEncoder(COLUMN_INDEX).EncodeBatch([_row(**{column : None})])
+
+@pytest.mark.parametrize("value", [5, 3.5, object()])
+def test_non_string_value_in_string_column_raises(value):
+    with pytest.raises(TypeError):
+        OgdLogRecordEncoder(COLUMN_INDEX).EncodeBatch([_row(user_id=value)])
+
+@pytest.fixture
+def chicagoTime(monkeypatch):
+    """Run the test with the process in a time zone behind UTC, where a late evening's timestamps fall on the next day in UTC"""
+    if not hasattr(time, "tzset"):
+        pytest.skip("Changing the process's time zone needs time.tzset")
+    monkeypatch.setenv("TZ", "America/Chicago")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def _utcDatetime(microseconds:int) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(microseconds=microseconds)
+
+def test_timestamps_do_not_depend_on_the_local_time_zone(chicagoTime):
+    serverTime, clientTime = datetime(2024, 1, 15, 23, 30, 5), datetime(2024, 1, 15, 23, 30, 1)
+    row = _row(server_time=serverTime, client_time=clientTime)
+    config = {"BIGQUERY_CONFIG" : {"PROJECT_ID" : "project", "DATASET_ID" : "dataset", "TABLE_BASENAME" : "logs", "PARTITIONED_TABLE" : True}}
+    _, partitionId = OpenGameDataLogSyncer.GetTableIds(config, serverTime.date())
+
+    for serializedRow in OgdLogRecordEncoder(COLUMN_INDEX).EncodeBatch([row]) + [_expected(row)]:
+        record = LogRecord.FromString(serializedRow)
+        # The naive MySQL values are sent as if they were UTC, so the row lands in the partition named for its date
+        assert _utcDatetime(record.server_time) == serverTime
+        assert partitionId.endswith("$" + _utcDatetime(record.server_time).strftime("%Y%m%d"))
+        assert _utcDatetime(record.client_time) == clientTime + timedelta(milliseconds=250)
+
+def test_arrow_timestamps_do_not_depend_on_the_local_time_zone(chicagoTime):
+    pytest.importorskip("pyarrow")
+    serverTime = datetime(2024, 1, 15, 23, 30, 5)
+    batch = OgdArrowBatchEncoder(COLUMN_INDEX).EncodeBatch([_row(server_time=serverTime)])
+    assert batch.column("server_time")[0].as_py().replace(tzinfo=None) == serverTime
@@ -0,0 +1,68 @@
+# Standard module imports
+import os
+import random
+
+import pytest
+
+# Local module imports
+from interfaces.IdRangeSet import IdRangeSet
+from interfaces.StagedLogFile import StagedLogFile
+
+def _batches(seed:int, numBatches:int):
+    generator = random.Random(seed)
+    nextId = 1
+    batches = []
+    for _ in range(numBatches):
+        numRows = generator.randrange(1, 200)
+        rows = [bytes(generator.randrange(256) for _ in range(generator.randrange(0, 400))) for _ in range(numRows)]
+        batches.append((rows, list(range(nextId, nextId + numRows))))
+        # Leave a gap in the ids between some batches
+        nextId += numRows + generator.choice([0, 0, 5])
+    return batches
+
+def test_batches_read_back_as_written(tmp_path):
+    stagedFile = StagedLogFile.Create(str(tmp_path / "staging"))
+    batches = _batches(seed=5, numBatches=20)
+    for rows, ids in batches:
+        stagedFile.WriteBatch(rows, ids)
+    # An empty batch doesn't add a block
+    stagedFile.WriteBatch([], [])
+
+    assert stagedFile.numBlocks == len(batches)
+    assert stagedFile.numRows == sum(len(rows) for rows, _ in batches)
+    assert list(stagedFile.ReadBatches()) == batches
+    # The file can be read again, e.g. for a second upload attempt
+    assert list(stagedFile.ReadBatches()) == batches
+    assert stagedFile.exportedIds.Intervals == IdRangeSet.FromIds(entryId for _, ids in batches for entryId in ids).Intervals
+    stagedFile.Delete()
+
+def test_exported_ids_cover_every_row(tmp_path):
+    stagedFile = StagedLogFile(str(tmp_path / "day.staged"))
+    stagedFile.WriteBatch([b"a", b"b", b"c"], [10, 11, 12])
+    stagedFile.WriteBatch([b"d", b"e"], [14, 13])
+    stagedFile.WriteBatch([b"f"], [20])
+    assert stagedFile.exportedIds.Intervals == [(10, 14), (20, 20)]
+    assert list(stagedFile.ReadBatches())[1] == ([b"d", b"e"], [14, 13])
+
+def test_a_file_with_no_batches_reads_back_empty(tmp_path):
+    stagedFile = StagedLogFile(str(tmp_path / "empty.staged"))
+    assert list(stagedFile.ReadBatches()) == []
+    assert stagedFile.SizeInBytes == len(StagedLogFile._MAGIC)
+
+def test_a_file_that_is_not_staged_raises(tmp_path):
+    path = str(tmp_path / "other.staged")
+    stagedFile = StagedLogFile(path)
+    stagedFile.WriteBatch([b"row"], [1])
+    stagedFile.FinishWriting()
+    with open(path, "r+b") as fileHandle:
+        fileHandle.write(b"NOTSTAGE")
+    with pytest.raises(Exception, match="not a staged log entry file"):
+        list(stagedFile.ReadBatches())
+
+def test_delete_removes_the_file_and_can_be_repeated(tmp_path):
+    stagedFile = StagedLogFile.Create(str(tmp_path))
+    stagedFile.WriteBatch([b"row"], [1])
+    assert os.path.exists(stagedFile.path) and os.path.dirname(stagedFile.path) == str(tmp_path)
+    stagedFile.Delete()
+    assert not os.path.exists(stagedFile.path)
+    stagedFile.Delete()
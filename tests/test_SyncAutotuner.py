@@ -0,0 +1,103 @@
+# Standard module imports
+import json
+import os
+
+import pytest
+
+# Local module imports
+import services.SyncAutotuner
+from services.SyncAutotuner import SyncAutotuner
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    fakeClock = FakeClock()
+    monkeypatch.setattr(services.SyncAutotuner, "perf_counter", fakeClock)
+    return fakeClock
+
+def _config(**syncConfig) -> dict:
+    return {"SYNC_CONFIG" : {"MAX_REQUEST_SIZE_BYTES" : 10000000, "MAX_IN_FLIGHT_REQUESTS" : 4, "AUTOTUNE_MAX_IN_FLIGHT_REQUESTS" : 8, **syncConfig}}
+
+def _window(tuner:SyncAutotuner, clock:FakeClock, bytesPerSecond:int, waitingFraction:float = 0.5) -> None:
+    """Acknowledge one window of requests over one second, at the given throughput"""
+    clock.now += 1
+    tuner.RecordSendWait(waitingFraction)
+    for _ in range(SyncAutotuner.WINDOW_REQUESTS):
+        tuner.RecordAppend(bytesPerSecond // SyncAutotuner.WINDOW_REQUESTS, 0.1)
+
+def test_moves_are_kept_while_they_help_and_undone_when_they_dont(clock):
+    tuner = SyncAutotuner(_config(), "GAME")
+    _window(tuner, clock, 1000000) # Baseline
+    # The request size is already at its maximum, so the send window is tried first
+    _window(tuner, clock, 1000000)
+    assert (tuner.RequestSizeInBytes, tuner.MaxInFlight, tuner.numAdjustments) == (10000000, 5, 1)
+
+    # A better window keeps the move, and the window grows again
+    _window(tuner, clock, 1200000)
+    assert tuner.MaxInFlight == 6
+
+    # A window that's no better undoes the last move
+    _window(tuner, clock, 1200000)
+    assert tuner.MaxInFlight == 5
+
+    # After measuring a new baseline, the request size is tried next, going down since it can't go up
+    _window(tuner, clock, 1200000)
+    _window(tuner, clock, 1200000)
+    assert (tuner.RequestSizeInBytes, tuner.MaxInFlight) == (int(10000000 / SyncAutotuner.REQUEST_SIZE_STEP), 5)
+
+def test_nothing_moves_while_appends_are_not_the_bottleneck(clock):
+    tuner = SyncAutotuner(_config(), "GAME")
+    for bytesPerSecond in [1000000, 2000000, 500000, 3000000]:
+        _window(tuner, clock, bytesPerSecond, waitingFraction=0.0)
+    assert (tuner.RequestSizeInBytes, tuner.MaxInFlight, tuner.numAdjustments) == (10000000, 4, 0)
+
+def test_settings_stay_within_their_limits(clock):
+    tuner = SyncAutotuner(_config(MAX_IN_FLIGHT_REQUESTS=7), "GAME")
+    _window(tuner, clock, 1000000)
+    throughput = 1000000
+    for _ in range(20):
+        throughput = int(throughput * 1.2)
+        _window(tuner, clock, throughput)
+    assert 1 <= tuner.MaxInFlight <= 8
+    assert SyncAutotuner.MIN_REQUEST_SIZE_BYTES <= tuner.RequestSizeInBytes <= 10000000
+
+@pytest.mark.parametrize("bytesPerRow, fetchBatchSize", [(400, 10000), (1000000, SyncAutotuner.MIN_FETCH_BATCH_SIZE), (1, SyncAutotuner.MAX_FETCH_BATCH_SIZE)])
+def test_fetch_batch_size_follows_the_row_size(bytesPerRow, fetchBatchSize):
+    tuner = SyncAutotuner(_config(AUTOTUNE_FETCH_BATCH_BYTES=4000000), "GAME")
+    tuner.RecordSerialized(1000, 1000 * bytesPerRow, 0.1)
+    assert tuner.FetchBatchSize == fetchBatchSize
+    # Nothing is learned from an empty batch
+    tuner.RecordSerialized(0, 0, 0.1)
+    assert tuner.FetchBatchSize == fetchBatchSize
+
+def test_saved_settings_are_loaded_by_the_next_day(clock, tmp_path):
+    config = _config(AUTOTUNE_STATE_DIR=str(tmp_path))
+    tuner = SyncAutotuner(config, "GAME")
+    tuner.RecordSerialized(1000, 800000, 0.1)
+    _window(tuner, clock, 1000000)
+    _window(tuner, clock, 1000000)
+    _window(tuner, clock, 1200000)
+    assert tuner.MaxInFlight == 6
+    # The move to 6 is still being tried, so the settings before it are saved
+    tuner.Save()
+
+    nextDay = SyncAutotuner(config, "GAME")
+    assert (nextDay.RequestSizeInBytes, nextDay.MaxInFlight, nextDay.FetchBatchSize) == (10000000, 5, 5000)
+    # Another game starts from the config
+    assert SyncAutotuner(config, "OTHER").MaxInFlight == 4
+
+def test_saved_settings_are_clamped_to_the_config_and_bad_files_ignored(tmp_path):
+    with open(os.path.join(tmp_path, "autotune_GAME.json"), "w") as file:
+        json.dump({"request_size_in_bytes" : 50000000, "max_in_flight" : 100, "fetch_batch_size" : 10, "bytes_per_row" : None}, file)
+    tuner = SyncAutotuner(_config(AUTOTUNE_STATE_DIR=str(tmp_path), MAX_REQUEST_SIZE_BYTES=5000000), "GAME")
+    assert (tuner.RequestSizeInBytes, tuner.MaxInFlight, tuner.FetchBatchSize) == (5000000, 8, 1000)
+
+    with open(os.path.join(tmp_path, "autotune_GAME.json"), "w") as file:
+        file.write("{not json")
+    assert SyncAutotuner(_config(AUTOTUNE_STATE_DIR=str(tmp_path)), "GAME").MaxInFlight == 4
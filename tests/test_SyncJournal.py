@@ -0,0 +1,60 @@
+# Standard module imports
+from datetime import date
+
+# Local module imports
+from interfaces.IdRangeSet import IdRangeSet
+from interfaces.SyncJournal import SyncJournal
+
+DAY = date(2024, 1, 15)
+
+def test_a_day_survives_reopening_the_journal(tmp_path):
+    path = str(tmp_path / "journal.sqlite")
+    journal = SyncJournal(path)
+    checkpoint = journal.StartDay(DAY, "project.dataset.table_20240115", 2, 1234)
+    checkpoint.RecordStream(0, "stream0")
+    checkpoint.RecordStream(1, "stream1")
+    checkpoint.RecordRequest(1, 0, 3, IdRangeSet([(20, 22)]))
+    checkpoint.RecordRequest(0, 0, 5, IdRangeSet([(1, 5)]))
+    checkpoint.RecordRequest(0, 5, 4, IdRangeSet([(6, 7), (10, 11)]))
+    checkpoint.AcknowledgeRequest(0, 0)
+    checkpoint.AcknowledgeRequest(1, 0)
+    checkpoint.SetStage(SyncJournal.FINALIZING)
+    journal.Close()
+
+    journal = SyncJournal(path)
+    checkpoint = journal.GetDay(DAY)
+    assert (checkpoint.tableId, checkpoint.numStreams, checkpoint.numRowsBefore, checkpoint.stage) == ("project.dataset.table_20240115", 2, 1234, SyncJournal.FINALIZING)
+    assert checkpoint.GetStreamNames() == {0 : "stream0", 1 : "stream1"}
+    # Ordered by stream and then offset, whatever order they were recorded in
+    assert [(request.streamIndex, request.offset, request.numRows, request.ids.Intervals, request.acknowledged) for request in checkpoint.GetRequests()] == \
+           [(0, 0, 5, [(1, 5)], True), (0, 5, 4, [(6, 7), (10, 11)], False), (1, 0, 3, [(20, 22)], True)]
+    journal.Close()
+
+def test_rerecording_a_request_replaces_it(tmp_path):
+    journal = SyncJournal(str(tmp_path / "journal.sqlite"))
+    checkpoint = journal.StartDay(DAY, "table", 1, 0)
+    checkpoint.RecordRequest(0, 0, 5, IdRangeSet([(1, 5)]))
+    checkpoint.AcknowledgeRequest(0, 0)
+    checkpoint.RecordRequest(0, 0, 2, IdRangeSet([(1, 2)]))
+
+    [request] = checkpoint.GetRequests()
+    assert (request.numRows, request.ids.Intervals, request.acknowledged) == (2, [(1, 2)], False)
+    journal.Close()
+
+def test_starting_or_clearing_a_day_leaves_other_days_alone(tmp_path):
+    journal = SyncJournal(str(tmp_path / "journal.sqlite"))
+    otherDay = date(2024, 1, 16)
+    journal.StartDay(otherDay, "other", 1, 0).RecordRequest(0, 0, 1, IdRangeSet([(100, 100)]))
+
+    checkpoint = journal.StartDay(DAY, "table", 1, 0)
+    checkpoint.RecordStream(0, "stream0")
+    checkpoint.RecordRequest(0, 0, 1, IdRangeSet([(1, 1)]))
+    # Starting the day again throws away what was recorded for it
+    checkpoint = journal.StartDay(DAY, "table", 1, 10)
+    assert checkpoint.GetRequests() == [] and checkpoint.GetStreamNames() == {}
+    assert journal.GetDay(DAY).numRowsBefore == 10
+
+    checkpoint.Clear()
+    assert journal.GetDay(DAY) is None
+    assert len(journal.GetDay(otherDay).GetRequests()) == 1
+    journal.Close()